@@ -2,6 +2,7 @@
 import numpy
 import ConfigParser
 from math import sqrt, log
+from instrumentation import span, timed
 
 
 def stripLeadingDigits( word ):
@@ -15,20 +16,26 @@ class AverageDataParser:
     # C-tor, read inputs and calculate covariances:
     def __init__( self, filename, llogNormal=False ):
         self.__correlations= None
+        self.__hcov= None
         self.__filename= filename
         self.__readInput( filename, llogNormal )
         return
 
-    # Read inputs using ConfigParser:
+    # Read inputs using ConfigParser, from a file name or an open
+    # file-like object, e.g. StringIO with generated inputs:
     def __readInput( self, filename, llogNormal ):
-        parser= ConfigParser.ConfigParser()
-        parser.read( filename )
-        self.__readData( parser )
-        self.__readGlobals( parser )
-        self.__readCovariances( parser )
+        with span( "AverageDataParser.read" ):
+            parser= ConfigParser.ConfigParser()
+            if hasattr( filename, "readline" ):
+                parser.readfp( filename )
+            else:
+                parser.read( filename )
+            self.__readData( parser )
+            self.__readGlobals( parser )
+            self.__readCovariances( parser )
         if llogNormal:
             self.__transformLogNormal()
-        self.__makeCovariances()
+        self.__makeFactoredCovariance()
         return
 
     def __transformLogNormal( self ):
@@ -139,6 +146,59 @@ class AverageDataParser:
             else:
                 cov= 0.0
         return cov
+    # Covariances of uncorrelated ("u") and fully or globally
+    # correlated ("f", "gp", "gpr") error sources are diagonal plus rank
+    # one, cov= diag(d) + s*s^T.  Keep the diagonal and the column (None
+    # for "u") of each such source, d is negative for zero errors in
+    # "gp" and "gpr" sources as in the dense matrices.  With only these
+    # options the total is diagonal plus low rank, cov= D + S*S^T with
+    # a column of S for each correlated source, None if any other
+    # option is used or D is not positive:
+    def __makeFactoredCovariance( self ):
+        self.__factored= None
+        self.__sourcefactors= {}
+        if self.__hglobals.has_key( "correlationfactor" ):
+            return
+        inputs= numpy.array( self.__inputs )
+        for errorkey in self.__errors.keys():
+            covoption= self.__covopts[errorkey].replace( "%", "" )
+            errors= numpy.array( self.__errors[errorkey] )
+            if covoption == "u":
+                diagonal, factor= errors**2, None
+            elif covoption == "f":
+                diagonal, factor= numpy.zeros( len( errors ) ), errors
+            elif covoption == "gp":
+                minerr= min( [ error for error in errors if error > 0.0 ] )
+                diagonal= errors**2 - minerr**2
+                factor= minerr*numpy.ones( len( errors ) )
+            elif covoption == "gpr":
+                minrelerr= min( [ err/value for err, value in 
+                                  zip( errors, inputs ) if err > 0.0 ] )
+                factor= minrelerr*inputs
+                diagonal= errors**2 - factor**2
+            else:
+                continue
+            self.__sourcefactors[errorkey]= ( diagonal, factor )
+        if len( self.__sourcefactors ) < len( self.__errors ):
+            return
+        hdiagonals= {}
+        hfactors= {}
+        for errorkey, ( diagonal, factor ) in self.__sourcefactors.items():
+            hdiagonals[errorkey]= diagonal
+            if factor is not None:
+                hfactors[errorkey]= factor
+        if not ( sum( hdiagonals.values() ) > 0.0 ).all():
+            return
+        self.__factored= ( hdiagonals, hfactors )
+        return
+
+    # Dense covariance matrices are only calculated when needed:
+    def __getCovarianceData( self ):
+        if self.__hcov is None:
+            self.__makeCovariances()
+        return
+
+    @timed( "AverageDataParser.makeCovariances" )
     def __makeCovariances( self ):
         # The covariance matrices for each error source
         hcov= {}
@@ -357,19 +417,36 @@ class AverageDataParser:
         else:
             return dict( self.__correlations )
     def getCovariances( self ):
+        self.__getCovarianceData()
         return dict( self.__hcov )
     def getTotalCovariance( self ):
+        self.__getCovarianceData()
         return self.__cov.copy()
+    # Factored covariances ( { key: diagonal }, { key: column } ) as numpy
+    # arrays or None, see __makeFactoredCovariance:
+    def getFactoredCovariance( self ):
+        if self.__factored is None:
+            return None
+        hdiagonals, hfactors= self.__factored
+        return dict( hdiagonals ), dict( hfactors )
+    # Error sources with covariance diag(d) + s*s^T as
+    # { key: ( d, s ) }, s is None for uncorrelated sources:
+    def getSourceFactorisations( self ):
+        return dict( self.__sourcefactors )
     def getGroups( self ):
         return list( self.__groups )
     def getGroupMatrix( self ):
         return list( self.__groupmatrix )
     def getSysterrorMatrix( self ):
+        self.__getCovarianceData()
         return dict( self.__systerrormatrix )
     def getReducedCovariances( self ):
+        self.__getCovarianceData()
         return dict( self.__hredcov )
     def getTotalReducedCovariance( self ):
+        self.__getCovarianceData()
         return self.__redcov.copy()
     def getTotalReducedCovarianceAslist( self ):
+        self.__getCovarianceData()
         return self.__redcov.tolist()
 
@@ -0,0 +1,102 @@
+# Averaging problem shared by averaging objects: the parsed inputs,
+# covariance matrices, inverse or Woodbury factorisation of the total
+# covariance and the solutions of the methods.  Everything is
+# calculated once when first used, such that e.g. BLUE and the fits on
+# the same inputs need only one parse and one covariance build, and
+# fits can start from the BLUE solution.
+#
+# Example: problem= AverageProblem( "test.txt" )
+#          Blue( problem ).printResults()
+#          clsqAverage( problem ).printResults()
+
+
+import numpy
+from AverageDataParser import AverageDataParser
+
+
+class AverageProblem:
+
+    # C-tor from an input file name or file-like object, or from a
+    # parser (then llogNormal is taken from the parser):
+    def __init__( self, filename, llogNormal=False ):
+        if isinstance( filename, AverageDataParser ):
+            self.__parser= filename
+        else:
+            self.__parser= AverageDataParser( filename, llogNormal )
+        self.__cache= {}
+        self.__solutions= {}
+        return
+
+    def getParser( self ):
+        return self.__parser
+
+    def __getCached( self, key, function ):
+        if not key in self.__cache:
+            self.__cache[key]= function()
+        return self.__cache[key]
+
+    # Covariance matrices from the parser, matrices are shared and
+    # must not be changed:
+    def getCovariances( self ):
+        return dict( self.__getCached( "hcov", self.__parser.getCovariances ) )
+    def getTotalCovariance( self ):
+        return self.__getCached( "cov", self.__parser.getTotalCovariance )
+
+    # Independent sub-problems, see decomposition.py:
+    def getComponents( self ):
+        def find():
+            from decomposition import findComponents
+            return findComponents( self.getCovariances(),
+                                   self.__parser.getGroups() )
+        return self.__getCached( "components", find )
+
+    # Inverse of the total covariance, inverted blockwise for
+    # independent sub-problems, with nprocs > 1 in parallel:
+    def getInverseCovariance( self, nprocs=1 ):
+        def invert():
+            cov= self.getTotalCovariance()
+            components= self.getComponents()
+            if len( components ) > 1:
+                from decomposition import invertBlockDiagonal
+                return numpy.matrix( invertBlockDiagonal( cov, components,
+                                                          nprocs ) )
+            return cov.getI()
+        return self.__getCached( "inv", invert )
+
+    # Inverse of the total covariance calculated elsewhere, e.g. for
+    # many problems together, see blue.makeBlueBatch:
+    def setInverseCovariance( self, inv ):
+        self.__cache["inv"]= numpy.matrix( inv )
+        return
+
+    # Woodbury factorisation of a factored total covariance D + S*S^T,
+    # V^-1 = D^-1 - D^-1*S*( I + S^T*D^-1*S )^-1*S^T*D^-1, or None:
+    def getWoodbury( self ):
+        def factorise():
+            factored= self.__parser.getFactoredCovariance()
+            if factored is None:
+                return None
+            hdiagonals, hfactors= factored
+            diagonal= sum( hdiagonals.values() )
+            ndim= len( diagonal )
+            factorkeys= sorted( hfactors.keys() )
+            factors= numpy.zeros( shape=(ndim,len( factorkeys )) )
+            for ikey, key in enumerate( factorkeys ):
+                factors[:,ikey]= hfactors[key]
+            dinvfactors= factors/diagonal[:,None]
+            capacitance= ( numpy.identity( len( factorkeys ) ) +
+                           factors.T.dot( dinvfactors ) )
+            return { "diagonal": diagonal, "dinvfactors": dinvfactors,
+                     "capacitanceinv": numpy.linalg.inv( capacitance ) }
+        return self.__getCached( "woodbury", factorise )
+
+    # Averages of a method ("blue", "clsq", ...) as column vector, None
+    # if the method did not run on the problem:
+    def setSolution( self, method, averages ):
+        self.__solutions[method]= numpy.matrix( averages, dtype=float ).copy()
+        return
+    def getSolution( self, method ):
+        if not method in self.__solutions:
+            return None
+        return self.__solutions[method].copy()
+
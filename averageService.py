@@ -0,0 +1,352 @@
+# Averaging service for on-demand requests, e.g. from dashboards.
+# Requests are input file names or problem specs { "text": <input file
+# contents> } with a method and options, they return futures.
+# Concurrent requests for the same problem (same input contents, method
+# and options) are coalesced into one computation.  BLUE requests are
+# collected for a short time window and problems of the same shape are
+# solved by Blue with their covariance matrices inverted together with
+# stacked numpy linear algebra, fit methods run in a pool of worker
+# processes.  Latency and throughput are available as metrics.  Python
+# 2 has no asyncio, the service uses a batching thread and
+# multiprocessing, AverageClient is an in-process client.
+#
+# Example: service= AverageService( nprocs=4 )
+#          client= AverageClient( service )
+#          results= client.average( "test.txt", "blue" )
+#          service.close()
+
+
+import threading
+import Queue
+import hashlib
+import multiprocessing
+import time
+import sys
+import traceback
+from StringIO import StringIO
+from AverageDataParser import AverageDataParser
+from averageProblem import AverageProblem
+from blue import Blue, invertBatch
+
+
+class ServiceError( Exception ):
+    def __init__( self, value ):
+         self.__value= value
+    def __str__( self ):
+         return repr( self.__value )
+
+
+# Exceptions from callbacks are printed, they must not stop the
+# service threads running the callbacks:
+def _runCallback( callback, future ):
+    try:
+        callback( future )
+    except Exception:
+        print >> sys.stderr, "AverageFuture: exception in done callback"
+        traceback.print_exc()
+    return
+
+
+# Result of a request, set by the service:
+class AverageFuture:
+
+    def __init__( self ):
+        self.__event= threading.Event()
+        self.__result= None
+        self.__error= None
+        self.__callbacks= []
+        self.__lock= threading.Lock()
+        return
+
+    def _setResult( self, result, error=None ):
+        with self.__lock:
+            self.__result= result
+            self.__error= error
+            self.__event.set()
+            callbacks= self.__callbacks
+            self.__callbacks= []
+        for callback in callbacks:
+            _runCallback( callback, self )
+        return
+
+    def addDoneCallback( self, callback ):
+        with self.__lock:
+            if not self.__event.is_set():
+                self.__callbacks.append( callback )
+                return
+        _runCallback( callback, self )
+        return
+
+    def done( self ):
+        return self.__event.is_set()
+
+    def result( self, timeout=None ):
+        if not self.__event.wait( timeout ):
+            raise ServiceError( "Timeout waiting for result" )
+        if self.__error is not None:
+            raise ServiceError( self.__error )
+        return self.__result
+
+
+# Averages of one problem with any method in a worker process, errors
+# are returned as results since the pool has no error callback:
+def _averageText( text, method, llognormal, lBlobel ):
+    from batchAverage import makeAverage
+    try:
+        average= makeAverage( StringIO( text ), method, llognormal, lBlobel )
+        if hasattr( average, "runSolver" ):
+            average.runSolver()
+        return average.getResults(), None
+    except Exception as error:
+        return None, error.__class__.__name__ + ": " + str( error )
+
+# BLUE for problems of the same shape (same number of measurements,
+# groups and error sources) with the inverse covariance matrices
+# calculated together, see blue.invertBatch, returns ( results, error )
+# per problem with results like Average.getResults, such that a bad
+# problem fails alone:
+def solveBlueBatch( parsers ):
+    problems= [ AverageProblem( parser ) for parser in parsers ]
+    invertBatch( problems )
+    resultserrors= []
+    for problem in problems:
+        try:
+            resultserrors.append( ( Blue( problem ).getResults(), None ) )
+        except Exception as error:
+            resultserrors.append( ( None, error.__class__.__name__ + ": " + 
+                                    str( error ) ) )
+    return resultserrors
+
+
+class AverageService:
+
+    # Latencies kept for the metrics:
+    __nlatencies= 1000
+
+    # Requests to the worker pool fail after tasktimeout s, e.g. when a
+    # worker process died, failures of the pool are checked every
+    # pollinterval s:
+    def __init__( self, nprocs=None, batchwindow=0.005, maxbatch=64,
+                  tasktimeout=600.0, pollinterval=0.05 ):
+        if nprocs is None:
+            nprocs= multiprocessing.cpu_count()
+        self.__pool= multiprocessing.Pool( nprocs )
+        self.__tasktimeout= tasktimeout
+        self.__pollinterval= pollinterval
+        self.__batchwindow= batchwindow
+        self.__maxbatch= maxbatch
+        self.__lock= threading.Lock()
+        self.__inflight= {}
+        self.__queue= Queue.Queue()
+        self.__pending= []
+        self.__closing= threading.Event()
+        self.__starttime= time.time()
+        self.__metrics= { "requests": 0, "coalesced": 0, "completed": 0,
+                          "failed": 0, "batches": 0, "batchedproblems": 0,
+                          "maxbatchsize": 0 }
+        self.__latencies= []
+        self.__batcher= threading.Thread( target=self.__runBatcher )
+        self.__batcher.daemon= True
+        self.__batcher.start()
+        self.__collector= threading.Thread( target=self.__runCollector )
+        self.__collector.daemon= True
+        self.__collector.start()
+        return
+
+    def close( self ):
+        self.__queue.put( None )
+        self.__batcher.join()
+        self.__closing.set()
+        self.__collector.join()
+        self.__pool.close()
+        self.__pool.join()
+        return
+
+    def __readSpec( self, spec ):
+        if isinstance( spec, dict ):
+            return spec["text"]
+        with open( spec ) as infile:
+            return infile.read()
+
+    # Submit a request, returns an AverageFuture:
+    def submit( self, spec, method="blue", llognormal=False, lBlobel=False ):
+        text= self.__readSpec( spec )
+        sha= hashlib.sha256()
+        sha.update( repr( ( method, bool( llognormal ), bool( lBlobel ) ) ) )
+        sha.update( text )
+        key= sha.hexdigest()
+        with self.__lock:
+            self.__metrics["requests"]+= 1
+            if key in self.__inflight:
+                self.__metrics["coalesced"]+= 1
+                return self.__inflight[key]
+            future= AverageFuture()
+            self.__inflight[key]= future
+        starttime= time.time()
+        # Only the first result counts, e.g. a late result from the pool
+        # after a timeout is dropped:
+        def finish( result, error=None ):
+            with self.__lock:
+                if self.__inflight.get( key ) is not future:
+                    return
+                del self.__inflight[key]
+                if error is None:
+                    self.__metrics["completed"]+= 1
+                else:
+                    self.__metrics["failed"]+= 1
+                self.__latencies.append( time.time() - starttime )
+                del self.__latencies[:-self.__nlatencies]
+            future._setResult( result, error )
+            return
+        if method == "blue":
+            self.__queue.put( ( text, llognormal, finish ) )
+        else:
+            def callback( resulterror ):
+                finish( *resulterror )
+                return
+            try:
+                asyncresult= self.__pool.apply_async( _averageText,
+                                                      ( text, method, 
+                                                        llognormal, lBlobel ),
+                                                      callback=callback )
+            except Exception as error:
+                finish( None, error.__class__.__name__ + ": " + str( error ) )
+                return future
+            with self.__lock:
+                self.__pending.append( ( asyncresult, finish, 
+                                         starttime + self.__tasktimeout ) )
+        return future
+
+    # Results from the worker pool arrive with the pool callback,
+    # failures of the pool itself, e.g. pickling errors or a lost worker
+    # seen as timeout, are errors of the request found by one collector
+    # thread:
+    def __runCollector( self ):
+        while not self.__closing.wait( self.__pollinterval ):
+            try:
+                self.__collectFailures()
+            except Exception:
+                print >> sys.stderr, "AverageService: exception in collector"
+                traceback.print_exc()
+        return
+
+    def __collectFailures( self ):
+        with self.__lock:
+            pending= list( self.__pending )
+        now= time.time()
+        done= []
+        for item in pending:
+            asyncresult, finish, deadline= item
+            if asyncresult.ready():
+                if not asyncresult.successful():
+                    try:
+                        asyncresult.get( 0 )
+                    except Exception as exception:
+                        finish( None, exception.__class__.__name__ + ": " + 
+                                str( exception ) )
+                done.append( item )
+            elif now > deadline:
+                finish( None, ( "Timeout after " + str( self.__tasktimeout ) +
+                                " s in worker pool" ) )
+                done.append( item )
+        if done:
+            with self.__lock:
+                self.__pending= [ item for item in self.__pending 
+                                  if not item in done ]
+        return
+
+    # Collect BLUE requests for the batch window, solve problems of
+    # the same shape together:
+    def __runBatcher( self ):
+        lrunning= True
+        while lrunning:
+            item= self.__queue.get()
+            if item is None:
+                break
+            batch= [ item ]
+            deadline= time.time() + self.__batchwindow
+            while len( batch ) < self.__maxbatch:
+                remaining= deadline - time.time()
+                if remaining <= 0.0:
+                    break
+                try:
+                    item= self.__queue.get( timeout=remaining )
+                except Queue.Empty:
+                    break
+                if item is None:
+                    lrunning= False
+                    break
+                batch.append( item )
+            try:
+                self.__solveBatch( batch )
+            except Exception as error:
+                message= error.__class__.__name__ + ": " + str( error )
+                for text, llognormal, finish in batch:
+                    finish( None, message )
+        return
+
+    def __solveBatch( self, batch ):
+        hshapes= {}
+        for text, llognormal, finish in batch:
+            try:
+                parser= AverageDataParser( StringIO( text ), llognormal )
+            except Exception as error:
+                finish( None, error.__class__.__name__ + ": " + str( error ) )
+                continue
+            shape= ( tuple( map( tuple, parser.getGroupMatrix() ) ),
+                     tuple( sorted( parser.getErrors().keys() ) ) )
+            hshapes.setdefault( shape, [] ).append( ( parser, finish ) )
+        for items in hshapes.values():
+            with self.__lock:
+                self.__metrics["batches"]+= 1
+                self.__metrics["batchedproblems"]+= len( items )
+                self.__metrics["maxbatchsize"]= max( self.__metrics["maxbatchsize"],
+                                                     len( items ) )
+            try:
+                resultslist= solveBlueBatch( [ parser for parser, finish in items ] )
+            except Exception as error:
+                message= error.__class__.__name__ + ": " + str( error )
+                for parser, finish in items:
+                    finish( None, message )
+                continue
+            for ( parser, finish ), ( results, error ) in zip( items, resultslist ):
+                finish( results, error )
+        return
+
+    # Counters, latency (mean, median, 95% quantile and maximum of the
+    # latest requests) in s and throughput in completed requests per s:
+    def getMetrics( self ):
+        with self.__lock:
+            metrics= dict( self.__metrics )
+            latencies= sorted( self.__latencies )
+            metrics["inflight"]= len( self.__inflight )
+        uptime= time.time() - self.__starttime
+        metrics["uptime"]= uptime
+        metrics["throughput"]= metrics["completed"]/uptime
+        if latencies:
+            nlatencies= len( latencies )
+            metrics["latency"]= { "mean": sum( latencies )/nlatencies,
+                                  "p50": latencies[nlatencies//2],
+                                  "p95": latencies[min( int( 0.95*nlatencies ),
+                                                        nlatencies-1 )],
+                                  "max": latencies[-1] }
+        return metrics
+
+
+# In-process client, blocking calls:
+class AverageClient:
+
+    def __init__( self, service ):
+        self.__service= service
+        return
+
+    def average( self, spec, method="blue", timeout=None, **options ):
+        return self.__service.submit( spec, method, **options ).result( timeout )
+
+    # All requests are submitted before waiting, such that they can be
+    # coalesced and batched:
+    def averageMany( self, specs, method="blue", timeout=None, **options ):
+        futures= [ self.__service.submit( spec, method, **options )
+                   for spec in specs ]
+        return [ future.result( timeout ) for future in futures ]
+
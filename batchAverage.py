@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+
+# Batch runner for averages of many input files with one or several
+# methods in a pool of worker processes.  One record per input file
+# and method is written as JSON lines or CSV, records hold averages,
+# errors by source, weights, chi^2 and timing, or the error message
+# if the average failed.  All methods for an input file share one
+# parse of the input and the fits start from the BLUE solution.
+#
+# With --cache results are taken from or stored in a result cache (see 
+# resultCache.py) shared by all workers.
+#
+# Example: ./batchAverage.py --method all --nprocs 8 --output results.jsonl *.txt
+
+
+import sys
+import json
+import csv
+import time
+import multiprocessing
+
+
+methods= [ "blue", "clsq", "minuit", "lsq" ]
+
+
+# Create the averaging object for method, imported only when used
+# such that missing dependencies only affect their method.  filename
+# may be an AverageProblem shared by several methods:
+def makeAverage( filename, method, llognormal=False, lBlobel=False ):
+    if method == "blue":
+        from blue import Blue
+        return Blue( filename, llognormal )
+    elif method == "clsq":
+        from clsqAverage import clsqAverage
+        return clsqAverage( filename, lBlobel, llognormal )
+    elif method == "minuit":
+        from minuitAverage import minuitAverage
+        return minuitAverage( filename, llognormal )
+    elif method == "lsq":
+        from lsqAverage import lsqAverage
+        return lsqAverage( filename, llognormal )
+    else:
+        raise ValueError( "Unknown method " + method )
+
+# Average one input file with one method and return the record, 
+# with cachedir results are taken from the cache if possible.  With
+# problem the parsed input is taken from it:
+def averageFile( filename, method, llognormal=False, lBlobel=False,
+                 cachedir=None, cachesize=None, problem=None ):
+    record= { "file": filename, "method": method }
+    tstart= time.time()
+    try:
+        cache= None
+        if cachedir is not None:
+            from resultCache import ResultCache
+            if cachesize is None:
+                cache= ResultCache( cachedir )
+            else:
+                cache= ResultCache( cachedir, cachesize )
+            key= cache.makeKey( filename, method, 
+                                { "llognormal": llognormal, 
+                                  "lBlobel": lBlobel } )
+            results= cache.get( key )
+            record["cached"]= results is not None
+            if results is not None:
+                record.update( results )
+                record["time"]= time.time() - tstart
+                return record
+        if problem is None:
+            average= makeAverage( filename, method, llognormal, lBlobel )
+        else:
+            average= makeAverage( problem, method, llognormal, lBlobel )
+        tsetup= time.time()
+        if hasattr( average, "runSolver" ):
+            average.runSolver()
+        tsolve= time.time()
+        results= average.getResults()
+        tend= time.time()
+        if cache is not None:
+            cache.put( key, results )
+        record.update( results )
+        record["timing"]= { "setup": tsetup - tstart,
+                            "solve": tsolve - tsetup,
+                            "analysis": tend - tsolve }
+    except Exception as error:
+        record["error"]= error.__class__.__name__ + ": " + str( error )
+    record["time"]= time.time() - tstart
+    return record
+def averageFileArgs( args ):
+    return averageFile( *args )
+
+# Records for one input file with all methods in methodlist from one
+# parse of the input (see averageProblem.py).  BLUE runs first such
+# that the fits start from its solution, records are in methodlist
+# order:
+def averageAllMethods( filename, methodlist=methods, llognormal=False,
+                       lBlobel=False, cachedir=None, cachesize=None ):
+    from averageProblem import AverageProblem
+    tstart= time.time()
+    try:
+        problem= AverageProblem( filename, llognormal )
+    except Exception as error:
+        message= error.__class__.__name__ + ": " + str( error )
+        return [ { "file": filename, "method": method, "error": message,
+                   "time": time.time() - tstart } for method in methodlist ]
+    hrecords= {}
+    for method in sorted( methodlist, key=lambda method: method != "blue" ):
+        hrecords[method]= averageFile( filename, method, llognormal, lBlobel,
+                                       cachedir, cachesize, problem )
+    return [ hrecords[method] for method in methodlist ]
+def averageAllMethodsArgs( args ):
+    return averageAllMethods( *args )
+
+# Records for all files and methods in input order, with nprocs > 1
+# from a pool of worker processes.  All methods for a file run in the
+# same process on one parse of the input.  Records are returned as
+# they become available such that they can be written immediately:
+def runBatch( filenames, methodlist, nprocs=1, llognormal=False,
+              lBlobel=False, cachedir=None, cachesize=None ):
+    arglist= [ ( filename, methodlist, llognormal, lBlobel, cachedir, 
+                 cachesize ) for filename in filenames ]
+    if nprocs <= 1:
+        for args in arglist:
+            for record in averageAllMethodsArgs( args ):
+                yield record
+        return
+    pool= multiprocessing.Pool( nprocs )
+    try:
+        for records in pool.imap( averageAllMethodsArgs, arglist ):
+            for record in records:
+                yield record
+    finally:
+        pool.close()
+        pool.join()
+    return
+
+
+def writeJsonLine( record, outfile ):
+    outfile.write( json.dumps( record, sort_keys=True ) + "\n" )
+    return
+
+# CSV has one row per average of each record, errors by source and
+# weights are JSON encoded columns:
+csvfields= [ "file", "method", "group", "average", "error", "chisq",
+             "ndof", "time", "weights", "errors", "message" ]
+def writeCsvRows( record, writer ):
+    row= { "file": record["file"], "method": record["method"],
+           "time": record["time"] }
+    if "error" in record:
+        row["message"]= record["error"]
+        writer.writerow( row )
+        return
+    for igroup, group in enumerate( record["groups"] ):
+        row["group"]= group
+        row["average"]= record["averages"][igroup]
+        row["error"]= record["errors"]["total"][igroup]
+        row["chisq"]= record["chisq"]
+        row["ndof"]= record["ndof"]
+        row["weights"]= json.dumps( record["weights"][igroup] )
+        row["errors"]= json.dumps( dict( [ ( key, errors[igroup] ) for key, errors
+                                           in record["errors"].items() ] ),
+                                   sort_keys=True )
+        writer.writerow( row )
+    return
+
+def writeRecords( records, outfile, outformat="jsonl" ):
+    nrecords= 0
+    nerrors= 0
+    if outformat == "csv":
+        writer= csv.DictWriter( outfile, csvfields )
+        writer.writeheader()
+    for record in records:
+        if outformat == "csv":
+            writeCsvRows( record, writer )
+        else:
+            writeJsonLine( record, outfile )
+        outfile.flush()
+        nrecords+= 1
+        if "error" in record:
+            nerrors+= 1
+    return nrecords, nerrors
+
+
+def main( argv=None ):
+    import argparse
+    argparser= argparse.ArgumentParser( description="Batch averaging of input files" )
+    argparser.add_argument( "files", nargs="+", help="input files" )
+    argparser.add_argument( "--method", default="blue",
+                            choices=methods + [ "all" ] )
+    argparser.add_argument( "--nprocs", type=int, default=1,
+                            help="number of worker processes" )
+    argparser.add_argument( "--format", default="jsonl",
+                            choices=[ "jsonl", "csv" ] )
+    argparser.add_argument( "--output", help="output file, default stdout" )
+    argparser.add_argument( "--lognormal", action="store_true",
+                            help="log-normal transformation of inputs" )
+    argparser.add_argument( "--blobel", action="store_true",
+                            help="clsq with Blobel's method" )
+    argparser.add_argument( "--cache", help="result cache directory" )
+    argparser.add_argument( "--cachesize", type=float, default=100.0,
+                            help="result cache size in MB" )
+    args= argparser.parse_args( argv )
+    if args.method == "all":
+        methodlist= methods
+    else:
+        methodlist= [ args.method ]
+    cachesize= int( args.cachesize*1024*1024 )
+    records= runBatch( args.files, methodlist, args.nprocs, args.lognormal,
+                       args.blobel, args.cache, cachesize )
+    if args.output:
+        outfile= open( args.output, "w" )
+    else:
+        outfile= sys.stdout
+    try:
+        nrecords, nerrors= writeRecords( records, outfile, args.format )
+    finally:
+        if args.output:
+            outfile.close()
+    print >> sys.stderr, nrecords, "records,", nerrors, "failed"
+    if nerrors > 0:
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit( main() )
+
@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+
+# Benchmarks of the averaging backends with synthetic inputs.
+# makeInput generates valid input files with N measurements, K error
+# sources and G groups for a mix of covariance options.  runBenchmark
+# times the stages of each backend and records the peak memory,
+# results can be stored as JSON baseline and compared to it later.
+# Covariance build and inversion are timed with the spans of the
+# instrumentation (instrumentation.py) whenever they run.
+#
+# Example: ./benchmark.py --ndata 5,10,20,40 --save baseline.json
+#          ./benchmark.py --ndata 5,10,20,40 --baseline baseline.json
+
+
+import random
+import json
+import time
+import resource
+import multiprocessing
+from StringIO import StringIO
+from averageProblem import AverageProblem
+import instrumentation
+
+
+# Covariance options used in turn for the systematic error sources,
+# the first error source is always uncorrelated ("u") statistics:
+covoptionmix= [ "c", "m", "f", "p", "gp", "gpr", "%u", "fq" ]
+
+# Stages timed for each backend:
+stages= [ "setup", "covariance", "inversion", "solve", "errors", "weights" ]
+
+# Stages timed by instrumentation spans, their time is not counted in
+# the stage during which they run:
+spanstages= { "covariance": [ "AverageDataParser.makeCovariances" ],
+              "inversion": [ "Blue.inversion", "Blue.woodbury",
+                             "AverageResiduals.whitening" ] }
+
+
+# Generate input file contents for ndata measurements in ngroups
+# groups with nsources error sources, the same seed gives the same
+# inputs:
+def makeInput( ndata, nsources=4, ngroups=1, covoptions=None, seed=1 ):
+    generator= random.Random( seed )
+    if covoptions is None:
+        covoptions= [ covoptionmix[isource % len( covoptionmix )]
+                      for isource in range( nsources-1 ) ]
+    groups= [ "g" + str( idata % ngroups ) for idata in range( ndata ) ]
+    values= [ 100.0 + 10.0*( idata % ngroups ) + generator.gauss( 0.0, 2.0 )
+              for idata in range( ndata ) ]
+    lines= [ "# Synthetic input with " + str( ndata ) + " measurements",
+             "[Data]",
+             "Names: " + " ".join( [ "Val" + str( idata )
+                                     for idata in range( ndata ) ] ),
+             "Values: " + " ".join( [ "{0:.4f}".format( value )
+                                      for value in values ] ),
+             "Groups: " + " ".join( groups ) ]
+    errorlines= []
+    covlines= []
+    errorkeys= [ "{0:02d}stat".format( 0 ) ]
+    errors= [ generator.uniform( 1.0, 2.0 ) for idata in range( ndata ) ]
+    errorlines.append( makeErrorLine( errorkeys[0], errors, "u" ) )
+    for isource, covoption in enumerate( covoptions ):
+        errorkey= "{0:02d}syst{1:d}".format( isource+1, isource+1 )
+        # Percent errors of values around 100 are of the same size:
+        errors= [ generator.uniform( 0.5, 1.5 ) for idata in range( ndata ) ]
+        errorlines.append( makeErrorLine( errorkey, errors, covoption ) )
+        if covoption == "c":
+            elements= [ "1.0" if idata1 == idata2 else "0.2"
+                        for idata1 in range( ndata )
+                        for idata2 in range( ndata ) ]
+            covlines.append( makeMatrixLines( errorkey, elements, ndata ) )
+        elif covoption == "m":
+            elements= [ "f" if idata1 % 2 == idata2 % 2 else "u"
+                        for idata1 in range( ndata )
+                        for idata2 in range( ndata ) ]
+            covlines.append( makeMatrixLines( errorkey, elements, ndata ) )
+    lines+= errorlines
+    if covlines:
+        lines.append( "[Covariances]" )
+        lines+= covlines
+    return "\n".join( lines ) + "\n"
+
+def makeErrorLine( errorkey, errors, covoption ):
+    return ( errorkey + ": " +
+             " ".join( [ "{0:.4f}".format( error ) for error in errors ] ) +
+             " " + covoption )
+
+def makeMatrixLines( errorkey, elements, ndim ):
+    rows= [ " ".join( elements[ndim*irow:ndim*(irow+1)] )
+            for irow in range( ndim ) ]
+    indent= "\n" + ( len( errorkey ) + 2 )*" "
+    return errorkey + ": " + indent.join( rows )
+
+# In-memory problem for the backends, a file-like object:
+def makeProblem( ndata, nsources=4, ngroups=1, covoptions=None, seed=1 ):
+    return StringIO( makeInput( ndata, nsources, ngroups, covoptions, seed ) )
+
+
+# Backends by name, imported only when used such that a missing
+# dependency skips the backend:
+def getBackend( name ):
+    if name == "blue":
+        from blue import Blue
+        return Blue
+    elif name == "clsq":
+        from clsqAverage import clsqAverage
+        return clsqAverage
+    elif name == "minuit":
+        from minuitAverage import minuitAverage
+        return minuitAverage
+    elif name == "lsq":
+        from lsqAverage import lsqAverage
+        return lsqAverage
+    else:
+        raise ValueError( "Unknown backend " + name )
+backendnames= [ "blue", "clsq", "minuit", "lsq" ]
+
+def getMaxrss():
+    return resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss
+
+# Cumulated times of the instrumentation spans of the span stages:
+def getSpanTimes():
+    hstats= instrumentation.getStats()
+    spantimes= {}
+    for stage, names in spanstages.items():
+        spantimes[stage]= sum( [ hstats[name]["time"] for name in names
+                                 if name in hstats ] )
+    return spantimes
+
+# Time the stages of one backend on one problem.  The input is parsed
+# once and the backend set up from the parsed problem.  Fit backends
+# start each stage with an empty solve cache.  The peak memory is the
+# increase of the maximum resident set size in kB, meaningful when
+# the case runs in its own process:
+def runCase( name, text ):
+    lenabled= instrumentation.isEnabled()
+    instrumentation.enable()
+    try:
+        return _runStages( name, text )
+    finally:
+        if not lenabled:
+            instrumentation.disable()
+def _runStages( name, text ):
+    record= { "backend": name }
+    for stage in spanstages:
+        record[stage]= 0.0
+    def timeStage( stage, function ):
+        spantimes= getSpanTimes()
+        tstart= time.time()
+        result= function()
+        elapsed= time.time() - tstart
+        for spanstage, spantime in getSpanTimes().items():
+            record[spanstage]+= spantime - spantimes[spanstage]
+            elapsed-= spantime - spantimes[spanstage]
+        record[stage]= elapsed
+        return result
+    startrss= getMaxrss()
+    problem= timeStage( "parse", lambda: AverageProblem( StringIO( text ) ) )
+    try:
+        backend= getBackend( name )
+        average= timeStage( "setup", lambda: backend( problem ) )
+    except ImportError as error:
+        record["skipped"]= str( error )
+        return record
+    lfit= hasattr( average, "runSolver" )
+    if lfit:
+        timeStage( "solve", average.runSolver )
+    else:
+        timeStage( "solve", average.calcAverage )
+    for stage, method in [ ( "errors", average.errorAnalysis ),
+                           ( "weights", average.calcWeightsMatrix ) ]:
+        if lfit:
+            average.clearSolveCache()
+        timeStage( stage, method )
+    record["maxrss"]= getMaxrss() - startrss
+    return record
+def runCaseArgs( args ):
+    return runCase( *args )
+
+# Run all backends for all problem sizes, each case in a fresh
+# process with lisolate:
+def runBenchmark( ndatalist, nsources=4, ngroups=1, backends=None,
+                  seed=1, lisolate=True ):
+    if backends is None:
+        backends= backendnames
+    records= []
+    for ndata in ndatalist:
+        text= makeInput( ndata, nsources, ngroups, seed=seed )
+        for name in backends:
+            if lisolate:
+                pool= multiprocessing.Pool( 1 )
+                try:
+                    record= pool.apply( runCaseArgs, ( ( name, text ), ) )
+                finally:
+                    pool.close()
+                    pool.join()
+            else:
+                record= runCase( name, text )
+            record["ndata"]= ndata
+            record["nsources"]= nsources
+            record["ngroups"]= ngroups
+            records.append( record )
+    return records
+
+def printRecords( records ):
+    print "\nBenchmark timings in ms, peak memory in kB"
+    header= "{0:>8s} {1:>6s} {2:>5s}".format( "backend", "ndata", "nsrc" )
+    for stage in [ "parse" ] + stages:
+        header+= " {0:>10s}".format( stage )
+    header+= " {0:>10s}".format( "maxrss" )
+    print header
+    for record in records:
+        line= "{0:>8s} {1:6d} {2:5d}".format( record["backend"],
+                                              record["ndata"],
+                                              record["nsources"] )
+        if "skipped" in record:
+            print line, "skipped:", record["skipped"]
+            continue
+        for stage in [ "parse" ] + stages:
+            line+= " {0:10.2f}".format( record[stage]*1000.0 )
+        line+= " {0:10d}".format( record["maxrss"] )
+        print line
+    return
+
+
+# Baselines are JSON files with the records of a previous run:
+def saveBaseline( records, filename ):
+    with open( filename, "w" ) as outfile:
+        json.dump( records, outfile, indent=1, sort_keys=True )
+    return
+def loadBaseline( filename ):
+    with open( filename ) as infile:
+        return json.load( infile )
+
+# Stages slower than the baseline by more than the relative tolerance
+# and mintime seconds are regressions:
+def compareBaseline( records, baseline, tolerance=0.25, mintime=1.0e-3 ):
+    def caseKey( record ):
+        return ( record["backend"], record["ndata"], record["nsources"],
+                 record["ngroups"] )
+    baselines= dict( [ ( caseKey( record ), record ) for record in baseline ] )
+    regressions= []
+    for record in records:
+        key= caseKey( record )
+        if not key in baselines or "skipped" in record:
+            continue
+        reference= baselines[key]
+        for stage in [ "parse" ] + stages:
+            if not stage in reference:
+                continue
+            if( record[stage] > reference[stage]*( 1.0 + tolerance ) and
+                record[stage] - reference[stage] > mintime ):
+                regressions.append( { "backend": key[0], "ndata": key[1],
+                                      "nsources": key[2], "ngroups": key[3],
+                                      "stage": stage,
+                                      "time": record[stage],
+                                      "baseline": reference[stage] } )
+    return regressions
+
+def printRegressions( regressions ):
+    if not regressions:
+        print "\nNo regressions w.r.t. baseline"
+        return
+    print "\nRegressions w.r.t. baseline, times in ms:"
+    for regression in regressions:
+        fmtstr= "{0:>8s} ndata {1:d} {2:>8s}: {3:9.2f} baseline {4:9.2f}"
+        print fmtstr.format( regression["backend"], regression["ndata"],
+                             regression["stage"], regression["time"]*1000.0,
+                             regression["baseline"]*1000.0 )
+    return
+
+
+def main():
+    import argparse
+    argparser= argparse.ArgumentParser( description="Benchmark averaging backends" )
+    argparser.add_argument( "--ndata", default="5,10,20,40",
+                            help="comma separated numbers of measurements" )
+    argparser.add_argument( "--nsources", type=int, default=4 )
+    argparser.add_argument( "--ngroups", type=int, default=1 )
+    argparser.add_argument( "--backends", default=",".join( backendnames ) )
+    argparser.add_argument( "--baseline", help="compare with JSON baseline" )
+    argparser.add_argument( "--save", help="save results as JSON baseline" )
+    argparser.add_argument( "--tolerance", type=float, default=0.25 )
+    args= argparser.parse_args()
+    ndatalist= [ int( ndata ) for ndata in args.ndata.split( "," ) ]
+    records= runBenchmark( ndatalist, args.nsources, args.ngroups,
+                           args.backends.split( "," ) )
+    printRecords( records )
+    if args.save:
+        saveBaseline( records, args.save )
+    if args.baseline:
+        regressions= compareBaseline( records, loadBaseline( args.baseline ),
+                                      args.tolerance )
+        printRegressions( regressions )
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    import sys
+    sys.exit( main() )
+
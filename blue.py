@@ -8,41 +8,88 @@ import numpy
 from AverageDataParser import AverageDataParser, stripLeadingDigits
 from clsqAverage import Average
 from math import sqrt
-from ROOT import TMath
+from chisqProb import chisqProb
+from instrumentation import span, timed
 
 
 class Blue( Average ):
 
-    # C-tor, setup parser, covariances and weights:
-    def __init__( self, filename, llogNormal=False ):
+    # C-tor, setup parser, covariances and weights.  With a factored
+    # covariance D + S*S^T from the parser the inverse is applied with
+    # the Woodbury identity in O(N*K^2), the dense covariance matrices 
+    # and inverse are then only calculated when they are used.  Dense 
+    # covariances are inverted blockwise for independent sub-problems,
+    # with nprocs > 1 in parallel.  Covariances and their inverse or
+    # factorisation are taken from the problem (see averageProblem.py)
+    # if they were calculated before:
+    def __init__( self, filename, llogNormal=False, nprocs=1 ):
         Average.__init__( self, filename, llogNormal )
+        self.__nprocs= nprocs
         self.dataparser= self._getDataparser()
         self.errors= self.dataparser.getErrors()
         self.names= self.dataparser.getNames()
         self.covopts= self.dataparser.getCovoption()
         self.correlations= self.dataparser.getCorrelations()
-        self.hcov= self.dataparser.getCovariances()
-        self.cov= self.dataparser.getTotalCovariance()
-        self.inv= self.cov.getI()
+        if self.dataparser.getFactoredCovariance() is None:
+            self.__woodbury= None
+            self.__makeCovariances()
+        else:
+            with span( "Blue.woodbury" ):
+                self.__woodbury= self.getProblem().getWoodbury()
         self.groupmatrix= numpy.matrix( self.dataparser.getGroupMatrix() )
         self.data= self._columnVector( self.dataparser.getValues() )
         self.totalerrors= self._columnVector( self.dataparser.getTotalErrors() )
         return
 
+    def __makeCovariances( self ):
+        problem= self.getProblem()
+        self.hcov= problem.getCovariances()
+        self.cov= problem.getTotalCovariance()
+        self.components= problem.getComponents()
+        with span( "Blue.inversion" ):
+            self.inv= problem.getInverseCovariance( self.__nprocs )
+        return
+    def __getattr__( self, name ):
+        if name in [ "hcov", "cov", "inv", "components" ]:
+            self.__makeCovariances()
+            return getattr( self, name )
+        raise AttributeError( name )
+
+    # Independent sub-problems as lists of measurement indices:
+    def getComponents( self ):
+        return [ list( component ) for component in self.components ]
+
+    # V^-1*m with the Woodbury factorisation from the problem:
+    def __applyInverse( self, m ):
+        woodbury= self.__woodbury
+        m= numpy.asarray( m )
+        dinvm= m/woodbury["diagonal"][:,None]
+        dinvfactors= woodbury["dinvfactors"]
+        correction= dinvfactors.dot( woodbury["capacitanceinv"].dot( 
+                dinvfactors.T.dot( m ) ) )
+        return numpy.matrix( dinvm - correction )
+
     # Calculate weights from inverse covariance matrix:
+    @timed( "Blue.calcWeightsMatrix" )
     def calcWeightsMatrix( self ):
         gm= self.groupmatrix
+        if self.__woodbury is not None:
+            vinvgm= self.__applyInverse( gm )
+            utvinvu= gm.getT()*vinvgm
+            return utvinvu.getI()*vinvgm.getT()
         inv= self.inv
         utvinvu= gm.getT()*inv*gm
         utvinvuinv= utvinvu.getI()
         wm= utvinvuinv*gm.getT()*inv
         return wm
 
-    # Calculate average from weights and input values:
+    # Calculate average from weights and input values, keep it with
+    # the problem e.g. as start values for fits:
     def calcAverage( self ):
         wm= self.calcWeightsMatrix()
         v= self.data
         avg= wm*v
+        self.getProblem().setSolution( "blue", avg )
         return avg
     def _getAverage( self ):
         return self.calcAverage()
@@ -52,11 +99,56 @@ class Blue( Average ):
         avg= self.calcAverage()
         v= self.data
         gm= self.groupmatrix
-        inv= self.inv
         delta= v - gm*avg
+        if self.__woodbury is not None:
+            return delta.getT()*self.__applyInverse( delta )
+        inv= self.inv
         chisq= delta.getT()*inv*delta
         return chisq
 
+    # Full solution for leave-one-out, see Average.leaveOneOut:
+    def _getLeaveOneOutProblem( self ):
+        avg= self.calcAverage()
+        residuals= self.data - self.groupmatrix*avg
+        return self.inv, self.groupmatrix, residuals, avg, float( self.calcChisq() )
+
+    # Impacts of the error sources when removed or made uncorrelated,
+    # from low-rank updates of the inverse or of the Woodbury
+    # factorisation, see impacts.py.  List of ( key, impacts ) sorted
+    # by the impact of the removal:
+    @timed( "Blue.rankImpacts" )
+    def rankImpacts( self ):
+        import impacts
+        gm= numpy.asarray( self.groupmatrix )
+        if self.__woodbury is not None:
+            hdiagonals, hfactors= self.dataparser.getFactoredCovariance()
+            reference, himpacts= impacts.calcFactoredImpacts( self.data, gm,
+                                                              hdiagonals,
+                                                              hfactors )
+        else:
+            factorisations= self.dataparser.getSourceFactorisations()
+            reference, himpacts= impacts.calcDenseImpacts( self.data, gm,
+                                                           self.cov, self.inv,
+                                                           self.hcov,
+                                                           factorisations )
+        return impacts.sortImpacts( himpacts )
+
+    def printImpacts( self ):
+        print "\n Impacts of error sources, shifts and error changes:"
+        print "{0:>10s} {1:>21s} {2:>21s}".format( "", "Removed", "Uncorrelated" )
+        for key, himpacts in self.rankImpacts():
+            print "{0:>10s}:".format( stripLeadingDigits( key ) ),
+            for mode in [ "removal", "decorrelation" ]:
+                impact= himpacts[mode]
+                if impact is None:
+                    print len( self.groupmatrix.T )*"{0:>21s}".format( "singular" ),
+                    continue
+                for shift, errorchange in zip( impact["shifts"], 
+                                               impact["errorchanges"] ):
+                    print "{0:+10.4f} {1:+10.4f}".format( shift, errorchange ),
+            print
+        return
+
     # Print the input data:
     def __printMatrix( self, m, fmt="8.4f" ):
         for i in range( m.shape[0] ):
@@ -92,7 +184,7 @@ class Blue( Average ):
         nvar= wm.shape[1]
         ndof= nvar - navg
         chisqdof= chisq/float(ndof)
-        pvalue= TMath.Prob( chisq, ndof )
+        pvalue= chisqProb( chisq, ndof )
         print "\n Chi^2= {0:.2f} for {1:d} d.o.f, chi^2/d.o.f= {2:.2f}, P(chi^2)= {3:.4f}".format( chisq, ndof, chisqdof, pvalue )
         avg= self.calcAverage()
         print "\n   Average:",
@@ -156,3 +248,34 @@ class Blue( Average ):
         return 
 
 
+# Inverse covariance matrices of problems (see averageProblem.py) of
+# the same shape without factored covariance calculated together with
+# stacked numpy linear algebra.  When the stacked inversion fails the
+# problems are inverted one by one, singular problems are left alone
+# such that only they fail in Blue:
+def invertBatch( problems ):
+    denseproblems= [ problem for problem in problems
+                     if problem.getParser().getFactoredCovariance() is None ]
+    if len( denseproblems ) > 1:
+        with span( "Blue.inversion" ):
+            covs= numpy.array( [ problem.getTotalCovariance() 
+                                 for problem in denseproblems ] )
+            try:
+                invs= numpy.linalg.inv( covs )
+            except numpy.linalg.LinAlgError:
+                invs= []
+                for cov in covs:
+                    try:
+                        invs.append( numpy.linalg.inv( cov ) )
+                    except numpy.linalg.LinAlgError:
+                        invs.append( None )
+        for problem, inv in zip( denseproblems, invs ):
+            if inv is not None:
+                problem.setInverseCovariance( inv )
+    return
+
+# Blue objects for problems of the same shape with the inverse
+# covariance matrices from invertBatch, everything else by Blue:
+def makeBlueBatch( problems ):
+    invertBatch( problems )
+    return [ Blue( problem ) for problem in problems ]
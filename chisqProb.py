@@ -0,0 +1,64 @@
+# Chi^2 probability (p-value) without ROOT, same conventions as
+# TMath::Prob.  Regularised upper incomplete gamma function
+# Q(ndof/2,chisq/2) from series or continued fraction expansion,
+# see Numerical Recipes 6.2
+
+
+from math import exp, log, lgamma
+
+
+_maxiter= 500
+_epsilon= 1.0e-15
+_tiny= 1.0e-300
+
+
+# Series expansion of P(a,x), converges for x < a+1:
+def _gammaSeries( a, x ):
+    term= 1.0/a
+    total= term
+    ap= a
+    for iteration in range( _maxiter ):
+        ap+= 1.0
+        term*= x/ap
+        total+= term
+        if abs( term ) < abs( total )*_epsilon:
+            break
+    return total*exp( -x + a*log( x ) - lgamma( a ) )
+
+# Continued fraction for Q(a,x), modified Lentz method, converges
+# for x >= a+1:
+def _gammaContinuedFraction( a, x ):
+    b= x + 1.0 - a
+    c= 1.0/_tiny
+    d= 1.0/b
+    h= d
+    for iteration in range( 1, _maxiter ):
+        an= -iteration*( iteration - a )
+        b+= 2.0
+        d= an*d + b
+        if abs( d ) < _tiny:
+            d= _tiny
+        c= b + an/c
+        if abs( c ) < _tiny:
+            c= _tiny
+        d= 1.0/d
+        delta= d*c
+        h*= delta
+        if abs( delta - 1.0 ) < _epsilon:
+            break
+    return exp( -x + a*log( x ) - lgamma( a ) )*h
+
+# Probability to find chi^2 larger than chisq for ndof degrees
+# of freedom:
+def chisqProb( chisq, ndof ):
+    if ndof <= 0 or chisq < 0.0:
+        return 0.0
+    if chisq == 0.0:
+        return 1.0
+    a= 0.5*ndof
+    x= 0.5*chisq
+    if x < a + 1.0:
+        return 1.0 - _gammaSeries( a, x )
+    else:
+        return _gammaContinuedFraction( a, x )
+
@@ -1,16 +1,30 @@
 
-from AverageDataParser import AverageDataParser, stripLeadingDigits
-from minuitSolver import minuitSolver
-from ConstrainedFit import clsq
+# The fit backends (ROOT for minuitAverage, ConstrainedFit for clsqAverage)
+# are imported when a solver is created, importing this module and
+# blue does not load them
+
+from AverageDataParser import stripLeadingDigits
+from averageProblem import AverageProblem
 from math import sqrt, exp
-from numpy import matrix, zeros
+from time import time
+from numpy import ( matrix, zeros, ones, identity, array, asarray, cumprod,
+                    hstack, vstack, concatenate, argmin )
+from numpy.linalg import cholesky, inv
+from instrumentation import span, timed, EvaluationCounter
 
 
 class Average:
 
-    # C-tor, setup parser, covariances and weights:
+    # C-tor, setup parser, covariances and weights.  The input is a
+    # file name, a file-like object, a parser or an AverageProblem
+    # shared with other averages, llogNormal is only used when the
+    # input is read:
     def __init__( self, filename, llogNormal=False ):
-        self.__dataparser= AverageDataParser( filename, llogNormal )
+        if isinstance( filename, AverageProblem ):
+            self.__problem= filename
+        else:
+            self.__problem= AverageProblem( filename, llogNormal )
+        self.__dataparser= self.__problem.getParser()
         return
 
     def printInputs( self ):
@@ -25,10 +39,35 @@ class Average:
 
     def _getDataparser( self ):
         return self.__dataparser
+    def getProblem( self ):
+        return self.__problem
+
+    # Results with plain python types, e.g. for machine-readable output:
+    def getResults( self ):
+        averages= [ float( a ) for a in self._getAverage().flat ]
+        herrors, wm= self.errorAnalysis()
+        navg= wm.shape[0]
+        nvar= wm.shape[1]
+        errors= {}
+        for errorkey in herrors.keys():
+            errors[errorkey]= [ sqrt( herrors[errorkey][iavg,iavg] ) 
+                                for iavg in range( navg ) ]
+        results= { "names": self.__dataparser.getNames(),
+                   "groups": sorted( set( self.__dataparser.getGroups() ) ),
+                   "averages": averages,
+                   "errors": errors,
+                   "covariance": herrors["total"].tolist(),
+                   "weights": wm.tolist(),
+                   "chisq": float( self.calcChisq() ),
+                   "ndof": nvar - navg }
+        return results
 
     def __makeZeroMatrix( self, ndim ):
         return matrix( zeros(shape=(ndim,ndim)) )
+    @timed( "Average.errorAnalysis" )
     def errorAnalysis( self ):
+        if self.__dataparser.getFactoredCovariance() is not None:
+            return self.__factoredErrorAnalysis()
         hcov= self.__dataparser.getCovariances()
         totcov= self.__dataparser.getTotalCovariance()
         weightsmatrix= self.calcWeightsMatrix()
@@ -54,6 +93,34 @@ class Average:
         errors["systcov"]= systerr
         return errors, weightsmatrix
 
+    # Same with the factored covariances, per error source 
+    # W*cov*W^T= W*diag(d)*W^T + (W*s)*(W*s)^T in O(N*navg^2).  Without
+    # "q" options total and systematic errors from the total and the 
+    # sum of the covariance matrices are the same:
+    def __factoredErrorAnalysis( self ):
+        hdiagonals, hfactors= self.__dataparser.getFactoredCovariance()
+        weightsmatrix= self.calcWeightsMatrix()
+        wmarray= asarray( weightsmatrix )
+        navg= weightsmatrix.shape[0]
+        systerr= self.__makeZeroMatrix( navg )
+        toterr= self.__makeZeroMatrix( navg )
+        errors= {}
+        for errorkey in sorted( hdiagonals.keys() ):
+            error= matrix( ( wmarray*hdiagonals[errorkey] ).dot( wmarray.T ) )
+            if errorkey in hfactors:
+                wmfactor= matrix( wmarray.dot( hfactors[errorkey] ) ).getT()
+                error+= wmfactor*wmfactor.getT()
+            errors[errorkey]= error
+            toterr+= error
+            if not "stat" in errorkey:
+                systerr+= error
+        errors["totalcov"]= toterr
+        errors["syst"]= systerr
+        errors["total"]= toterr.copy()
+        errors["systcov"]= systerr.copy()
+        return errors, weightsmatrix
+
+    @timed( "Average.informationAnalysis" )
     def informationAnalysis( self, wm=None ):
         if wm is None:
             wm= self.calcWeightsMatrix()
@@ -183,27 +250,313 @@ class Average:
         pulls= delta/errors
         return pulls
 
+    # Averages without each measurement in turn from rank-one downdates
+    # of the full solution (see downdates.py), subclasses provide the
+    # generalised least squares problem with _getLeaveOneOutProblem.
+    # List of ( name, results ) per measurement, results are None if a
+    # group would have no measurement left:
+    @timed( "Average.leaveOneOut" )
+    def leaveOneOut( self ):
+        import downdates
+        pinv, gm, residuals, averages, chisq= self._getLeaveOneOutProblem()
+        resultslist= downdates.leaveOneOut( pinv, gm, residuals, averages,
+                                            chisq )
+        return zip( self.__dataparser.getNames(), resultslist )
+
+    def printLeaveOneOut( self ):
+        averages= [ a for a in self._getAverage().flat ]
+        print "\n Leave-one-out averages, shifts and chi^2/ndof:"
+        for name, results in self.leaveOneOut():
+            print "{0:>10s}:".format( name ),
+            if results is None:
+                print "only measurement of its group"
+                continue
+            for average, newaverage, error in zip( averages,
+                                                   results["averages"],
+                                                   results["errors"] ):
+                print "{0:10.4f} +/- {1:.4f} ({2:+.4f})".format( newaverage,
+                                                                error,
+                                                                newaverage -
+                                                                average ),
+            print "{0:8.2f}/{1:d}".format( results["chisq"], results["ndof"] )
+        return
+
+
+# Dense form of the mapping from nuisance parameters to measurements
+# for the fit backends.  Column j of the loadings holds the errors of
+# the correlated systematic represented by extra parameter j, split in
+# additive and multiplicative ("r" option) loadings.  Extra parameters
+# are numbered in error source order, and each measurement depends on
+# at most one extra parameter per error source. 
+class NuisanceLoadings:
+
+    def __init__( self, parindxmaps, errorkeys, hcovopt, systerrormatrix, 
+                  ndata, nextrapar ):
+        self.__addloadings= zeros( shape=(ndata,nextrapar) )
+        self.__mulloadings= zeros( shape=(ndata,nextrapar) )
+        for ierr in sorted( parindxmaps.keys() ):
+            if "r" in hcovopt[errorkeys[ierr]]:
+                loadings= self.__mulloadings
+            else:
+                loadings= self.__addloadings
+            for ival, parindx in parindxmaps[ierr].items():
+                loadings[ival,parindx]= systerrormatrix[ierr][ival]
+        self.__lmultiplicative= bool( self.__mulloadings.any() )
+        return
+
+    def getAdditiveLoadings( self ):
+        return self.__addloadings.copy()
+    def getMultiplicativeLoadings( self ):
+        return self.__mulloadings.copy()
+    def isLinear( self ):
+        return not self.__lmultiplicative
+
+    # The model values for the measurements are scale*G*upar - shifts.
+    # Multiplicative terms are linearised exponentials a la Blobel for
+    # multiplicative rel. errors, they divide by ( 1 + term/reference ) 
+    # the terms of all error sources before them:
+    def calcScaleAndShifts( self, extrapar, reference ):
+        if not self.__lmultiplicative:
+            return 1.0, self.__addloadings.dot( extrapar )
+        terms= self.__addloadings*extrapar
+        factors= 1.0 + self.__mulloadings*extrapar/reference[:,None]
+        laterfactors= cumprod( factors[:,::-1], axis=1 )[:,::-1]
+        scale= 1.0/laterfactors[:,0]
+        laterfactors= hstack( ( laterfactors[:,1:], ones( shape=(len(scale),1) ) ) )
+        shifts= ( terms/laterfactors ).sum( axis=1 )
+        return scale, shifts
+
+    # Derivatives of scale and shifts w.r.t. the extra parameters,
+    # a multiplicative term k acts on the sum of all earlier terms:
+    def calcDerivatives( self, extrapar, reference ):
+        addloadings= self.__addloadings
+        if not self.__lmultiplicative:
+            return zeros( shape=addloadings.shape ), addloadings.copy()
+        scale, shifts= self.calcScaleAndShifts( extrapar, reference )
+        mulloadings= self.__mulloadings/reference[:,None]
+        factors= 1.0 + mulloadings*extrapar
+        laterfactors= cumprod( factors[:,::-1], axis=1 )[:,::-1]
+        laterfactors= hstack( ( laterfactors[:,1:], 
+                                ones( shape=(len(scale),1) ) ) )
+        scaledterms= addloadings*extrapar/laterfactors
+        earlierterms= scaledterms.cumsum( axis=1 ) - scaledterms
+        logderivs= mulloadings/factors
+        dscale= -scale[:,None]*logderivs
+        dshifts= addloadings/laterfactors - logderivs*earlierterms
+        return dscale, dshifts
+
+
+# Whitened residuals of the least squares averages with nuisance
+# parameters, chi^2 = |L^-1*delta|^2 + |extrapar|^2 with the Cholesky 
+# factor L of the reduced covariance matrix.  The residuals are 
+# [ L^-1*delta, extrapar ] with delta= data - scale*G*upar + shifts,
+# multiplicative terms use the current data as reference.  datav is
+# kept as reference, changes of the data are seen by later calls: 
+class AverageResiduals:
+
+    def __init__( self, gm, loadings, reducedcov, datav, npar ):
+        self.__gm= asarray( gm )
+        self.__loadings= loadings
+        with span( "AverageResiduals.whitening" ):
+            self.__whitening= inv( cholesky( asarray( reducedcov ) ) )
+        self.__datav= datav
+        self.__npar= npar
+        return
+
+    def __calcDelta( self, pars ):
+        extrapar= pars[self.__npar:]
+        data= asarray( self.__datav ).ravel()
+        scale, shifts= self.__loadings.calcScaleAndShifts( extrapar, data )
+        umpar= self.__gm.dot( pars[:self.__npar] )
+        delta= data - scale*umpar + shifts
+        return delta, umpar, scale, data
+
+    def calcResiduals( self, pars ):
+        delta, umpar, scale, data= self.__calcDelta( pars )
+        return concatenate( ( self.__whitening.dot( delta ), 
+                              pars[self.__npar:] ) )
+
+    def calcChisq( self, pars ):
+        residuals= self.calcResiduals( pars )
+        return residuals.dot( residuals )
+
+    # Derivatives of delta w.r.t. upar and extrapar:
+    def __calcDeltaDerivatives( self, pars, umpar, scale, data ):
+        dscale, dshifts= self.__loadings.calcDerivatives( pars[self.__npar:],
+                                                          data )
+        ddeltadupar= -self.__gm*( scale*ones( len( data ) ) )[:,None]
+        ddeltadextrapar= dshifts - umpar[:,None]*dscale
+        return ddeltadupar, ddeltadextrapar
+
+    def calcChisqAndGradient( self, pars ):
+        delta, umpar, scale, data= self.__calcDelta( pars )
+        extrapar= pars[self.__npar:]
+        whitened= self.__whitening.dot( delta )
+        chisq= whitened.dot( whitened ) + extrapar.dot( extrapar )
+        ddeltadupar, ddeltadextrapar= self.__calcDeltaDerivatives( pars, umpar,
+                                                                   scale, data )
+        dchisqddelta= 2.0*self.__whitening.T.dot( whitened )
+        gradient= concatenate( ( ddeltadupar.T.dot( dchisqddelta ),
+                                 ddeltadextrapar.T.dot( dchisqddelta ) + 
+                                 2.0*extrapar ) )
+        return chisq, gradient
+
+    def calcJacobian( self, pars ):
+        delta, umpar, scale, data= self.__calcDelta( pars )
+        ddeltadupar, ddeltadextrapar= self.__calcDeltaDerivatives( pars, umpar,
+                                                                   scale, data )
+        nextrapar= len( pars ) - self.__npar
+        upper= self.__whitening.dot( hstack( ( ddeltadupar, 
+                                               ddeltadextrapar ) ) )
+        lower= hstack( ( zeros( shape=(nextrapar,self.__npar) ),
+                         identity( nextrapar ) ) )
+        return vstack( ( upper, lower ) )
+
+    # Derivatives of the residuals w.r.t. the data for problems without
+    # multiplicative terms:
+    def calcDataJacobian( self ):
+        nextrapar= self.__loadings.getAdditiveLoadings().shape[1]
+        return vstack( ( self.__whitening,
+                         zeros( shape=(nextrapar,self.__whitening.shape[1]) ) ) )
+
+
+# Errors of the fit averages, e.g. an analysis the solver of the 
+# backend does not support:
+class FitAverageError( Exception ):
+    def __init__( self, value ):
+         self.__value= value
+    def __str__( self ):
+         return repr( self.__value )
+
 
 class FitAverage( Average ):
 
-    def __init__( self, filename, llognormal=False ):
+    # Problems without multiplicative ("r") errors are solved in closed
+    # form with linearSolver, with lfastlinear=False by the iterative
+    # solver of the subclass as well.  With lbluestart the solver starts from
+    # the BLUE solution and the nuisance parameters for it, BLUE is
+    # solved first if it did not run on the problem:
+    def __init__( self, filename, llognormal=False, lfastlinear=True,
+                  lbluestart=False ):
         Average.__init__( self, filename, llognormal )
+        self.__lfastlinear= lfastlinear
+        self.__lbluestart= lbluestart
         self.__data= self._getDataparser().getValues()
+        self.__counter= EvaluationCounter()
         self.__solver= self.__setupSolver()
+        self.__minoserrors= {}
+        self.__lwarmstart= True
+        self.clearSolveCache()
         return
 
-    def runSolver( self ):
-        self.__solver.solve()
+    def runSolver( self, **solveargs ):
+        self.__solve( self.__solveKey(), **solveargs )
         return
 
     def _getSolverData( self ):
         return self.__solver.getDatav()
 
+    # Solutions are cached with the current solver data as key,
+    # repeated solves on unchanged data are avoided.  Solves for
+    # new data start from the previous converged solution if the 
+    # solver supports it:
     def _getAverage( self ):
-        self.__solver.solve()
-        return self.__solver.getUparv()
+        key= self.__solveKey()
+        if key in self.__solvecache:
+            self.__solvestats["cachehits"]+= 1
+            return self.__solvecache[key].copy()
+        self.__solve( key )
+        return self.__solvecache[key].copy()
+    @timed( "FitAverage.solve" )
+    def __solve( self, key, **solveargs ):
+        solver= self.__solver
+        lwarmstart= ( self.__lwarmstart and self.__lastsolution is not None and
+                      hasattr( solver, "setStartValues" ) )
+        if lwarmstart:
+            solver.setStartValues( *self.__lastsolution )
+            self.__solvestats["warmstarts"]+= 1
+        counter= self.__counter
+        ncallsstart= counter.getNcalls()
+        evaltimestart= counter.getTime()
+        tstart= time()
+        solver.solve( **solveargs )
+        record= { "time": time() - tstart,
+                  "nevaluations": counter.getNcalls() - ncallsstart,
+                  "evaluationtime": counter.getTime() - evaltimestart,
+                  "warmstart": lwarmstart }
+        for recordkey, method in [ ( "niterations", "getNiterations" ),
+                                   ( "nfcn", "getNfcn" ),
+                                   ( "status", "getStatus" ),
+                                   ( "converged", "hasConverged" ) ]:
+            if hasattr( solver, method ):
+                record[recordkey]= getattr( solver, method )()
+        self.__solvehistory.append( record )
+        self.__solvestats["solves"]+= 1
+        self.__solvecache[key]= solver.getUparv()
+        self.__solvedkey= key
+        if( hasattr( solver, "setStartValues" ) and 
+            ( not hasattr( solver, "hasConverged" ) or solver.hasConverged() ) ):
+            self.__lastsolution= ( solver.getPars(), solver.getParErrors() )
+        return
+    # The solver state may be from a solve with other data, e.g. after
+    # calcWeightsMatrix, solve again for the current data:
+    def _ensureSolved( self ):
+        key= self.__solveKey()
+        if key != self.__solvedkey:
+            self.__solve( key )
+        return
+    def __solveKey( self ):
+        solverdata= self._getSolverData()
+        return tuple( float( value ) for value in solverdata.flat )
+
+    def setWarmStart( self, lwarmstart ):
+        self.__lwarmstart= lwarmstart
+        if not lwarmstart and hasattr( self.__solver, "resetStartValues" ):
+            self.__solver.resetStartValues()
+        return
+    def clearSolveCache( self ):
+        self.__solvecache= {}
+        self.__solvedkey= None
+        self.__lastsolution= None
+        self.__solvestats= { "solves": 0, "cachehits": 0, "warmstarts": 0 }
+        self.__solvehistory= []
+        if hasattr( self.__solver, "resetStartValues" ):
+            self.__solver.resetStartValues()
+        return
+    def getSolveStats( self ):
+        return dict( self.__solvestats )
+
+    # Per solve: time, number and time of objective function 
+    # evaluations and, if the solver has them, iterations, minuit fcn
+    # calls, status and convergence:
+    def getSolveHistory( self ):
+        return [ dict( record ) for record in self.__solvehistory ]
+
+    # Counter of objective function evaluations (minuit fcn, clsq 
+    # constraints or least squares residuals), subclasses record
+    # the evaluations of their objective function with it:
+    def getEvaluationCounter( self ):
+        return self.__counter
+
+    def printEvaluationStats( self ):
+        self.__counter.printSummary( "Objective function evaluations" )
+        history= self.__solvehistory
+        if history:
+            print "Solves: {0:d}, evaluations per solve: {1:.1f}".format(
+                len( history ),
+                sum( [ record["nevaluations"] for record in history ] )/
+                float( len( history ) ) )
+            print "Last solve:", ", ".join( [ key + "= " + str( history[-1][key] ) 
+                                              for key in sorted( history[-1] ) ] )
+        return
     
+    # Weights from numerical derivatives of the solution w.r.t. the
+    # data, or analytic if the solver has them:
+    @timed( "FitAverage.calcWeightsMatrix" )
     def calcWeightsMatrix( self, scf=10.0 ):
+        if hasattr( self.__solver, "getWeightsMatrix" ):
+            self._ensureSolved()
+            return matrix( self.__solver.getWeightsMatrix()[:self.__nupar] )
         dataparser= self._getDataparser()
         totalerrors= dataparser.getTotalErrors()
         data= self.__data
@@ -222,21 +575,156 @@ class FitAverage( Average ):
         wm= wm.getT()
         return wm
 
+    def calcChisq( self ):
+        self._ensureSolved()
+        return self.__solver.getChisq()
+
     def printResults( self, ffmt=".4f", cov=False, corr=False ):
-        if isinstance( self.__solver, minuitSolver ):
+        self._ensureSolved()
+        if hasattr( self.__solver, "printResults" ):
             self.__solver.printResults( ffmt=ffmt, cov=cov, corr=corr )
-        elif isinstance( self.__solver, clsq.clsqSolver ):
+        else:
+            from ConstrainedFit import clsq
             ca= clsq.clsqAnalysis( self.__solver )
             ca.printResults( ffmt=ffmt, cov=cov, corr=corr )
+        if self.__minoserrors:
+            print "\nMinos errors"
+            print "           Name      Lower      Upper"
+            fmtstr= "{0:>15s}: {1:10" + ffmt + "} {2:10" + ffmt + "}"
+            for ipar in sorted( self.__minoserrors.keys() ):
+                eminus, eplus= self.__minoserrors[ipar]
+                print fmtstr.format( self.__parnames[ipar], eminus, eplus )
         print
         return
 
     def getAveragesAndErrors( self ):
+        self._ensureSolved()
         return self.__solver.getPars(), self.__solver.getParErrors()
 
+    # Asymmetric errors from the chi^2 profile a la MINOS, the parameters
+    # are the averages followed by the nuisance parameters.  Each 
+    # parameter is analysed independently, with nprocs > 1 in parallel
+    # in worker processes.  The clsq solver has no MINOS errors,
+    # clsqAverage raises FitAverageError unless it runs with linearSolver:
+    def calcMinosErrors( self, ipars=None, nprocs=1 ):
+        solver= self.__solver
+        if not hasattr( solver, "getMinosErrors" ):
+            raise FitAverageError( self.__class__.__name__ + 
+                                   ": solver has no MINOS errors" )
+        if ipars is None:
+            ipars= range( self.__nupar )
+        self._ensureSolved()
+        from parallel import parallelMap
+        minoserrors= parallelMap( solver.getMinosErrors, ipars, nprocs )
+        for ipar, errors in zip( ipars, minoserrors ):
+            self.__minoserrors[ipar]= errors
+        return dict( zip( ipars, minoserrors ) )
+    def getMinosErrors( self ):
+        return dict( self.__minoserrors )
+
+    # Profile chi^2 as function of parameter ipar, e.g. the average, fixed
+    # at values with all other parameters minimised.  Points are solved
+    # in order starting from their neighbour's solution, with nprocs > 1
+    # contiguous chunks of points are solved in worker processes.  The
+    # clsq solver can not fix parameters, clsqAverage raises 
+    # FitAverageError unless it runs with linearSolver:
+    def profileScan( self, ipar, values, nprocs=1 ):
+        values= array( values, dtype=float )
+        points= [ ( value, ) for value in values ]
+        chisqs= self.__scanPoints( [ ipar ], points, nprocs )
+        return values, array( chisqs )
+
+    # Profile chi^2 on the grid values1 x values2 of parameters ipar1 and
+    # ipar2, e.g. for contours.  The grid is traversed row by row with
+    # alternating direction such that consecutive points are neighbours:
+    def profileScan2D( self, ipar1, values1, ipar2, values2, nprocs=1 ):
+        values1= array( values1, dtype=float )
+        values2= array( values2, dtype=float )
+        indices= []
+        for i1 in range( len( values1 ) ):
+            row= [ ( i1, i2 ) for i2 in range( len( values2 ) ) ]
+            if i1 % 2 == 1:
+                row.reverse()
+            indices+= row
+        points= [ ( values1[i1], values2[i2] ) for i1, i2 in indices ]
+        chisqs= self.__scanPoints( [ ipar1, ipar2 ], points, nprocs )
+        chisqm= zeros( shape=(len( values1 ),len( values2 )) )
+        for ( i1, i2 ), chisq in zip( indices, chisqs ):
+            chisqm[i1,i2]= chisq
+        return values1, values2, chisqm
+
+    def __scanPoints( self, ipars, points, nprocs ):
+        solver= self.__solver
+        if not hasattr( solver, "fixPar" ):
+            raise FitAverageError( self.__class__.__name__ + 
+                                   ": solver can not fix parameters" )
+        self._ensureSolved()
+        solution= ( solver.getPars(), solver.getParErrors() )
+        def scanChunk( chunk ):
+            pars, parerrors= solution
+            chisqs= []
+            for point in chunk:
+                solver.setStartValues( pars, parerrors )
+                for ipar, value in zip( ipars, point ):
+                    solver.fixPar( ipar, value )
+                solver.solve()
+                chisqs.append( solver.getChisq() )
+                pars, parerrors= solver.getPars(), solver.getParErrors()
+            return chisqs
+        from parallel import parallelMap, splitContiguous
+        try:
+            chunks= splitContiguous( points, nprocs )
+            chunkchisqs= parallelMap( scanChunk, chunks, nprocs )
+        finally:
+            for ipar in ipars:
+                solver.releasePar( ipar )
+            solver.resetStartValues()
+            self.__solvedkey= None
+        chisqs= []
+        for chunk in chunkchisqs:
+            chisqs+= chunk
+        return chisqs
+
+    def getResults( self ):
+        results= Average.getResults( self )
+        minoserrors= {}
+        for ipar, errors in self.__minoserrors.items():
+            minoserrors[self.__parnames[ipar]]= list( errors )
+        results["minoserrors"]= minoserrors
+        results["solvestats"]= self.getSolveStats()
+        return results
+
     def getSolver( self ):
         return self.__solver
 
+    # Extra parameters of the current solution:
+    def _getExtrapars( self ):
+        return asarray( self.__solver.getUparv() ).ravel()[self.__nupar:]
+
+    # Leave-one-out from the linear response of the fit: with the model
+    # linearised at the solution and the extra parameters marginalised
+    # the averages solve a generalised least squares problem with group
+    # matrix scale*G and covariance R + D*D^T, R the reduced covariance
+    # and D the derivatives of the shifts w.r.t. the extra parameters.
+    # Exact for fits without multiplicative ("r") errors:
+    def _getLeaveOneOutProblem( self ):
+        self._ensureSolved()
+        dataparser= self._getDataparser()
+        data= array( dataparser.getValues() )
+        gm= asarray( dataparser.getGroupMatrix(), dtype=float )
+        averages= asarray( self.__solver.getUparv() ).ravel()[:self.__nupar]
+        extrapar= asarray( self._getExtrapars(), dtype=float )
+        loadings= self.__loadings
+        scale, shifts= loadings.calcScaleAndShifts( extrapar, data )
+        dscale, dshifts= loadings.calcDerivatives( extrapar, data )
+        umpar= gm.dot( averages )
+        derivatives= dshifts - umpar[:,None]*dscale
+        residuals= data - scale*umpar + shifts - derivatives.dot( extrapar )
+        cov= ( asarray( dataparser.getTotalReducedCovariance() ) + 
+               derivatives.dot( derivatives.T ) )
+        gmscaled= gm*( scale*ones( len( data ) ) )[:,None]
+        return inv( cov ), gmscaled, residuals, averages, self.calcChisq()
+
     # Setup extra measured parameters for correlated systematics:
     def __addParameter( self, extrapars, extraparerrors, parnames,
                         ndata, ncorrsyst, errorkey, parindxmaps, ierr ):
@@ -303,10 +791,102 @@ class FitAverage( Average ):
 
         return extrapars, extraparerrors, extraparnames, parindxmaps, errorkeys
 
+    # Whitened residuals for the chi^2 of the least squares backends:
+    def _makeResiduals( self, gm, parindxmaps, errorkeys, systerrormatrix, 
+                        datav, npar, nextrapar ):
+        dataparser= self._getDataparser()
+        loadings= NuisanceLoadings( parindxmaps, errorkeys, 
+                                    dataparser.getCovoption(),
+                                    systerrormatrix, datav.shape[0], 
+                                    nextrapar )
+        reducedcov= dataparser.getTotalReducedCovariance()
+        return AverageResiduals( gm, loadings, reducedcov, datav, npar )
+
+    # Subclasses create a linearSolver if this is true:
+    def _useLinearSolver( self ):
+        return self.__lfastlinear and self.__loadings.isLinear()
+
+    # Closed-form solver from the residuals, with mparnames it has the
+    # clsqSolver accessors with the measured parameters G*upar - A*extrapar
+    # followed by the extra parameters, A the additive loadings:
+    def _makeLinearSolver( self, residuals, pars, parerrors, parnames, ndof,
+                           datav, mparnames=None ):
+        from linearSolver import linearSolver
+        nupar= None
+        mparmatrix= None
+        if mparnames is not None:
+            nupar= self.__nupar
+            gm= asarray( self._getDataparser().getGroupMatrix(), dtype=float )
+            loadings= self.__loadings.getAdditiveLoadings()
+            nextrapar= loadings.shape[1]
+            mparmatrix= vstack( ( hstack( ( gm, -loadings ) ),
+                                  hstack( ( zeros( shape=(nextrapar,nupar) ),
+                                            identity( nextrapar ) ) ) ) )
+        counter= self.getEvaluationCounter()
+        return linearSolver( counter.count( residuals.calcResiduals ),
+                             residuals.calcJacobian,
+                             residuals.calcDataJacobian(),
+                             pars, parerrors, parnames, ndof, datav,
+                             nupar, mparmatrix, mparnames )
+
+    # Nuisance parameters minimising the chi^2 for fixed averages upar
+    # with the model linearised at extrapar= 0, with R the reduced
+    # covariance and D the derivatives of the shifts:
+    # extrapar= -( I + D^T*R^-1*D )^-1*D^T*R^-1*( data - G*upar )
+    def __calcNuisanceStart( self, upar ):
+        dataparser= self._getDataparser()
+        data= array( self.__data, dtype=float )
+        gm= asarray( dataparser.getGroupMatrix(), dtype=float )
+        umpar= gm.dot( array( upar, dtype=float ) )
+        nextrapar= self.__loadings.getAdditiveLoadings().shape[1]
+        dscale, dshifts= self.__loadings.calcDerivatives( zeros( nextrapar ),
+                                                          data )
+        derivatives= dshifts - umpar[:,None]*dscale
+        rinvd= inv( asarray( dataparser.getTotalReducedCovariance() ) ).dot( 
+            derivatives )
+        extrapar= -inv( identity( nextrapar ) + derivatives.T.dot( rinvd ) ).dot(
+            rinvd.T.dot( data - umpar ) )
+        return list( extrapar )
+
+    # Subclasses return False if their solver can not start the nuisance
+    # parameters at other values than zero:
+    def _hasNuisanceStartValues( self ):
+        return True
+
+    # Parameter values the solver was started with:
+    def getStartValues( self ):
+        return list( self.__startvalues )
+
+    # Solve with BLUE and with straight average start values on a new 
+    # problem with the same inputs, the number of iterations for both
+    # and the number saved by the BLUE start.  Solvers without
+    # iteration count report minuit fcn calls or objective function 
+    # evaluations instead, see "measure".  Only the start values in
+    # getStartValues are used, e.g. clsq starts only the averages from
+    # BLUE:
+    def compareStartValues( self ):
+        problem= AverageProblem( self._getDataparser() )
+        plain= self.__class__( problem, lfastlinear=self.__lfastlinear )
+        plain.runSolver()
+        bluestart= self.__class__( problem, lfastlinear=self.__lfastlinear,
+                                   lbluestart=True )
+        bluestart.runSolver()
+        plainrecord= plain.getSolveHistory()[-1]
+        bluerecord= bluestart.getSolveHistory()[-1]
+        for measure in [ "niterations", "nfcn", "nevaluations" ]:
+            if measure in plainrecord:
+                break
+        return { "measure": measure, "plain": plainrecord[measure],
+                 "blue": bluerecord[measure],
+                 "saved": plainrecord[measure] - bluerecord[measure] }
+
     # Prepare inputs and initialise the solver:
+    @timed( "FitAverage.setupSolver" )
     def __setupSolver( self ):
 
-        # Initialise (unmeasured) fit parameter(s) with straight average(s):
+        # Initialise (unmeasured) fit parameter(s) with the BLUE
+        # solution if it is known for the problem or requested, else 
+        # with straight average(s):
         data= self.__data
         ndata= len( data )
         datav= matrix( data )
@@ -314,7 +894,12 @@ class FitAverage( Average ):
         dataparser= self._getDataparser()
         groupmatrix= dataparser.getGroupMatrix()
         gm= matrix( groupmatrix )
-        uparv= gm.getT()*datav/(float(gm.shape[0])/float(gm.shape[1]))
+        uparv= self.getProblem().getSolution( "blue" )
+        if uparv is None and self.__lbluestart:
+            from blue import Blue
+            uparv= Blue( self.getProblem() ).calcAverage()
+        if uparv is None:
+            uparv= gm.getT()*datav/(float(gm.shape[0])/float(gm.shape[1]))
         upar= [ par for par in uparv.flat ]
 
         # Set the name(s) of the unmeasured (average) fit parameters:
@@ -337,6 +922,16 @@ class FitAverage( Average ):
         systerrormatrix= dataparser.getSysterrorMatrix()
 
         # Now make the solver:
+        self.__nupar= len( upar )
+        self.__loadings= NuisanceLoadings( parindexmaps, errorkeys,
+                                           dataparser.getCovoption(),
+                                           systerrormatrix, ndata,
+                                           len( extrapars ) )
+        if( self.__lbluestart and len( extrapars ) > 0 and
+            self._hasNuisanceStartValues() ):
+            extrapars= self.__calcNuisanceStart( upar )
+        self.__startvalues= upar + extrapars
+        self.__parnames= upnames + extraparnames
         solver= self._createSolver( gm, parindexmaps, errorkeys, 
                                     systerrormatrix, data,
                                     extrapars, extraparerrors, upar, 
@@ -346,10 +941,56 @@ class FitAverage( Average ):
         return solver
 
 
+# Interval from a profile scan where chi^2 rises by deltachisq above the
+# minimum on the grid, with linear interpolation between grid points.
+# A limit is None if the scan does not reach the threshold on that side:
+def profileInterval( values, chisqs, deltachisq=1.0 ):
+    values= asarray( values, dtype=float )
+    chisqs= asarray( chisqs, dtype=float )
+    imin= argmin( chisqs )
+    threshold= chisqs[imin] + deltachisq
+    def crossing( indices ):
+        previous= imin
+        for index in indices:
+            if chisqs[index] >= threshold:
+                fraction= ( ( threshold - chisqs[previous] )/
+                            ( chisqs[index] - chisqs[previous] ) )
+                return values[previous] + fraction*( values[index] - 
+                                                     values[previous] )
+            previous= index
+        return None
+    lower= crossing( range( imin-1, -1, -1 ) )
+    upper= crossing( range( imin+1, len( values ) ) )
+    return lower, upper
+
+
+# Constraints of the clsq solver (ConstrainedFit.clsq.Constraints)
+# with analytic derivatives, jacobians( mpar, upar ) returns the
+# Jacobians w.r.t. measured and unmeasured parameters.  The clsq
+# solver calls derivatives in each iteration, everything else is
+# taken from the original constraints:
+class AnalyticConstraints:
+
+    def __init__( self, constraints, jacobians ):
+        self.__constraints= constraints
+        self.__jacobians= jacobians
+        return
+
+    def __getattr__( self, name ):
+        return getattr( self.__constraints, name )
+
+    def derivatives( self, mpar, upar ):
+        mparjacobian, uparjacobian= self.__jacobians( mpar, upar )
+        return ( self.__constraints.calculate( mpar, upar ), mparjacobian,
+                 uparjacobian )
+
+
 class clsqAverage( FitAverage ):
 
-    def __init__( self, filename, lBlobel=False, llognormal=False ):
-        FitAverage.__init__( self, filename, llognormal )
+    def __init__( self, filename, lBlobel=False, llognormal=False,
+                  lfastlinear=True, lbluestart=False ):
+        FitAverage.__init__( self, filename, llognormal, lfastlinear, 
+                             lbluestart )
         self.__lBlobel= lBlobel
         return
 
@@ -359,46 +1000,72 @@ class clsqAverage( FitAverage ):
                        extrapars, extraparerrors, upar, 
                        upnames, mpnames, extraparnames ):
 
+        # Linear problems in closed form with the same accessors:
+        ndata= len( data )
+        if self._useLinearSolver():
+            datav= matrix( data )
+            datav.shape= (ndata,1)
+            residuals= self._makeResiduals( gm, parindxmaps, errorkeys,
+                                            systerrormatrix, datav, len( upar ),
+                                            len( extrapars ) )
+            return self._makeLinearSolver( residuals, upar+extrapars,
+                                           upar+extraparerrors,
+                                           upnames+extraparnames,
+                                           ndata-len(upar), datav,
+                                           mpnames+extraparnames )
+
+        from ConstrainedFit import clsq
+
         # Get reduced covariance matrix and add "measured parameter"
         # errors to diagonal:
         dataparser= self._getDataparser()
         covm= dataparser.getTotalReducedCovarianceAslist()
         self.__addExtraparErrors( covm, extraparerrors )
         hcovopt= dataparser.getCovoption()
-        originaldata= dataparser.getValues()
-        ndata= len( data )
+        originaldata= array( dataparser.getValues() )
+        loadings= NuisanceLoadings( parindxmaps, errorkeys, hcovopt,
+                                    systerrormatrix, ndata, len( extrapars ) )
+        gmarray= asarray( gm )
 
-        # Constraints function for average:
+        # Constraints function for average, the extra parameters
+        # follow the data in mpar, calls are counted:
+        counter= self.getEvaluationCounter()
         def avgConstrFun( mpar, upar ):
-            umpar= gm*upar
-            constraints= []
-            for ival in range( ndata ):
-                constraint= - umpar[ival]
-                for ierr in parindxmaps.keys():
-                    covopt= hcovopt[errorkeys[ierr]]
-                    indxmap= parindxmaps[ierr]
-                    if ival in indxmap.keys():
-                        parindx= indxmap[ival] + ndata
-                        term= mpar[parindx]*systerrormatrix[ierr][ival]
-                        if "r" in covopt:
-                            # linearised exponential a la Blobel for 
-                            # multiplicative rel. error
-                            # constraint*= ( 1.0 + term/originaldata[ival] )
-                            constraint/= ( 1.0 + term/originaldata[ival] )
-                        else:
-                            # Additive error:
-                            constraint+= term
-                constraint+= mpar[ival]
-                constraints.append( constraint )
+            tstart= time()
+            mpararray= asarray( mpar, dtype=float ).ravel()
+            upararray= asarray( upar, dtype=float ).ravel()
+            scale, shifts= loadings.calcScaleAndShifts( mpararray[ndata:],
+                                                        originaldata )
+            constraints= mpararray[:ndata] - scale*gmarray.dot( upararray ) + shifts
+            counter.record( time() - tstart )
             return constraints
 
-        # Create solver and return it:
+        # Analytic Jacobians of the constraints w.r.t. measured and
+        # unmeasured parameters:
+        def avgConstrJacobians( mpar, upar ):
+            mpararray= asarray( mpar, dtype=float ).ravel()
+            upararray= asarray( upar, dtype=float ).ravel()
+            extrapar= mpararray[ndata:]
+            scale, shifts= loadings.calcScaleAndShifts( extrapar, originaldata )
+            dscale, dshifts= loadings.calcDerivatives( extrapar, originaldata )
+            umpar= gmarray.dot( upararray )
+            mparjacobian= hstack( ( identity( ndata ), 
+                                    dshifts - umpar[:,None]*dscale ) )
+            uparjacobian= -gmarray*( ones( ndata )*scale )[:,None]
+            return matrix( mparjacobian ), matrix( uparjacobian )
+        self.__avgConstrFun= avgConstrFun
+        self.__avgConstrJacobians= avgConstrJacobians
+
+        # Create solver with the analytic Jacobians replacing the
+        # numerical derivatives of its constraints and return it:
         upnames= dict( (upnames.index(name),name) for name in upnames )
         names= mpnames + extraparnames
         names= dict( (names.index(name),name) for name in names )
         solver= clsq.clsqSolver( data+extrapars, covm, upar, avgConstrFun,
                                  uparnames=upnames, mparnames=names,
                                  ndof=ndata-len(upar) )
+        solver.constraints= AnalyticConstraints( solver.constraints,
+                                                 avgConstrJacobians )
 
         return solver
 
@@ -415,14 +1082,29 @@ class clsqAverage( FitAverage ):
             covm.append( row )
         return covm
 
+    # clsq starts the measured parameters at their measurements, for
+    # the extra parameters the pseudo-measurements zero:
+    def _hasNuisanceStartValues( self ):
+        return False
+
+    # Extra parameters follow the data in the measured parameters:
+    def _getExtrapars( self ):
+        ndata= len( self._getDataparser().getValues() )
+        return self.getSolver().getMpars()[ndata:]
+
+    def calcConstraints( self, mpar, upar ):
+        return self.__avgConstrFun( mpar, upar )
+    def getConstraintJacobians( self, mpar, upar ):
+        return self.__avgConstrJacobians( mpar, upar )
+
     def printInputs( self ):
         FitAverage.printInputs( self )
-        print "\nConstraints before solution:"
         solver= self.getSolver()
-        print solver.getConstraints()
+        if hasattr( solver, "getConstraints" ):
+            print "\nConstraints before solution:"
+            print solver.getConstraints()
         return
 
     def runSolver( self ):
-        solver= self.getSolver()
-        solver.solve( lBlobel=self.__lBlobel )
+        FitAverage.runSolver( self, lBlobel=self.__lBlobel )
         return
@@ -0,0 +1,61 @@
+# Decomposition of an averaging problem into independent sub-problems.
+# Measurements are linked when any error source correlates them or
+# when they measure the same quantity (group).  The connected
+# components of this graph can be averaged separately, the total
+# covariance matrix is block diagonal w.r.t. the components.
+
+
+from numpy import asarray, nonzero, triu, linalg
+
+
+# Union-find with path halving:
+def _findRoot( parents, i ):
+    while parents[i] != i:
+        parents[i]= parents[parents[i]]
+        i= parents[i]
+    return i
+def _union( parents, i, j ):
+    rooti= _findRoot( parents, i )
+    rootj= _findRoot( parents, j )
+    if rooti != rootj:
+        parents[max( rooti, rootj )]= min( rooti, rootj )
+    return
+
+# Connected components from the covariance matrices of all error
+# sources and the group of each measurement, a list of sorted lists
+# of measurement indices ordered by their first index:
+def findComponents( hcov, groups ):
+    ndata= len( groups )
+    parents= range( ndata )
+    for cov in hcov.values():
+        rows, columns= nonzero( triu( asarray( cov ), 1 ) )
+        for i, j in zip( rows, columns ):
+            _union( parents, i, j )
+    firstingroup= {}
+    for i, group in enumerate( groups ):
+        if group in firstingroup:
+            _union( parents, firstingroup[group], i )
+        else:
+            firstingroup[group]= i
+    hcomponents= {}
+    for i in range( ndata ):
+        hcomponents.setdefault( _findRoot( parents, i ), [] ).append( i )
+    return [ hcomponents[root] for root in sorted( hcomponents.keys() ) ]
+
+# Inverse of a block diagonal matrix from the inverses of the blocks
+# given by the components, with nprocs > 1 blocks are inverted in
+# worker processes:
+def invertBlockDiagonal( m, components, nprocs=1 ):
+    marray= asarray( m )
+    blocks= [ marray[component][:,component] for component in components ]
+    if nprocs > 1:
+        from parallel import parallelMap
+        inverses= parallelMap( linalg.inv, blocks, nprocs )
+    else:
+        inverses= [ linalg.inv( block ) for block in blocks ]
+    minv= 0.0*marray
+    for component, inverse in zip( components, inverses ):
+        for irow, i in enumerate( component ):
+            minv[i,component]= inverse[irow]
+    return minv
+
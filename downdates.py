@@ -0,0 +1,51 @@
+# Leave-one-out analysis of generalised least squares averages with
+# rank-one downdates of the full solution.  For the averages
+# A^-1*G^T*P*x with P= V^-1 and A= G^T*P*G the inverse covariance of the
+# measurements without measurement k is P' = P_{-k,-k} - P_{-k,k}*P_{k,-k}/P_kk
+# (Schur complement), such that with q= (G^T*P)[:,k]
+#   A' = A - q*q^T/P_kk,  G'^T*P' = (G^T*P)_{-k} - q*P_{k,-k}/P_kk
+# and A'^-1 follows from A^-1 with the Sherman-Morrison formula.  With
+# the residuals r= x - G*avg of the full solution and s= P*r:
+#   avg' = avg - A^-1*q*s_k/d,  chi^2' = chi^2 - s_k^2/d,
+# d= P_kk - q^T*A^-1*q.  After the inverse of V all measurements are
+# done in O(N^2*M) for M averages instead of O(N^4) with a refit each.
+
+
+from numpy import asarray, outer, sqrt, diagonal, linalg
+
+
+# List of results without each measurement in turn with averages,
+# errors, chi^2, ndof and weights matrix (with zero column for the
+# removed measurement), None if a group would have no measurement left.
+# The full solution is given by the inverse covariance pinv, the group
+# matrix gm, the residuals, the averages and chi^2:
+def leaveOneOut( pinv, gm, residuals, averages, chisq, tolerance=1.0e-10 ):
+    p= asarray( pinv, dtype=float )
+    g= asarray( gm, dtype=float )
+    r= asarray( residuals, dtype=float ).ravel()
+    averages= asarray( averages, dtype=float ).ravel()
+    ndata, navg= g.shape
+    pg= p.dot( g )
+    ainv= linalg.inv( g.T.dot( pg ) )
+    s= p.dot( r )
+    resultslist= []
+    for k in range( ndata ):
+        pkk= p[k,k]
+        q= pg[k]
+        ainvq= ainv.dot( q )
+        d= pkk - q.dot( ainvq )
+        if d <= tolerance*pkk:
+            resultslist.append( None )
+            continue
+        ainvk= ainv + outer( ainvq, ainvq )/d
+        weights= ainvk.dot( pg.T - outer( q, p[k] )/pkk )
+        weights[:,k]= 0.0
+        results= { "averages": averages - ainvq*s[k]/d,
+                   "errors": sqrt( diagonal( ainvk ) ),
+                   "covariance": ainvk,
+                   "chisq": float( chisq - s[k]**2/d ),
+                   "ndof": ndata - 1 - navg,
+                   "weights": weights }
+        resultslist.append( results )
+    return resultslist
+
@@ -0,0 +1,174 @@
+# Impacts of error sources on generalised least squares averages: the
+# shifts of the averages and the changes of their errors and of chi^2
+# when a source is removed or made uncorrelated.  The covariance matrix
+# changes by dV= -C_k (removal) or dV= diag(C_k) - C_k (decorrelation).
+# For sources with C_k= diag(d) + s*s^T the change is low rank,
+# dV= L*R^T with a column for each changed diagonal element and one for
+# s, e.g. rank one for the removal of a fully correlated source, and
+# the new inverse follows from the inverse of V with the Woodbury
+# identity in O(N^2*r).  Other changes of high rank are solved
+# directly.  Problems with a total covariance D + S*S^T are solved
+# with the Woodbury identity for the new D and S in O(N*K^2).
+
+
+from numpy import ( asarray, zeros, identity, nonzero, sqrt, diagonal,
+                    linalg )
+
+
+# Averages, errors and chi^2 with the inverse covariance matrix given
+# as function applying it to a matrix:
+def solveGls( applyinverse, gm, values ):
+    gm= asarray( gm, dtype=float )
+    values= asarray( values, dtype=float ).ravel()
+    vinvgm= applyinverse( gm )
+    ainv= linalg.inv( gm.T.dot( vinvgm ) )
+    averages= ainv.dot( vinvgm.T.dot( values ) )
+    residuals= values - gm.dot( averages )
+    chisq= float( residuals.dot( applyinverse( residuals[:,None] ).ravel() ) )
+    return averages, sqrt( diagonal( ainv ) ), chisq
+
+# Inverse of diag(d) + S*S^T with the Woodbury identity:
+def makeWoodburyInverse( diagonal, factors ):
+    diagonal= asarray( diagonal, dtype=float )
+    dinvfactors= factors/diagonal[:,None]
+    capacitanceinv= linalg.inv( identity( factors.shape[1] ) +
+                                factors.T.dot( dinvfactors ) )
+    def applyinverse( m ):
+        return ( m/diagonal[:,None] -
+                 dinvfactors.dot( capacitanceinv.dot( dinvfactors.T.dot( m ) ) ) )
+    return applyinverse
+
+# Inverse of V + L*R^T from the inverse of V with the Woodbury identity:
+def makeUpdatedInverse( vinv, left, right ):
+    if left.shape[1] == 0:
+        return vinv.dot
+    vinvleft= vinv.dot( left )
+    coreinv= linalg.inv( identity( left.shape[1] ) + right.T.dot( vinvleft ) )
+    def applyinverse( m ):
+        vinvm= vinv.dot( m )
+        return vinvm - vinvleft.dot( coreinv.dot( right.T.dot( vinvm ) ) )
+    return applyinverse
+
+# Change diag(diagonalchange) - s*s^T as L*R^T:
+def makeLowRankChange( diagonalchange, factor ):
+    indices= nonzero( diagonalchange )[0]
+    ncolumns= len( indices )
+    if factor is not None:
+        ncolumns+= 1
+    left= zeros( shape=(len( diagonalchange ),ncolumns) )
+    right= zeros( shape=left.shape )
+    for icolumn, index in enumerate( indices ):
+        left[index,icolumn]= diagonalchange[index]
+        right[index,icolumn]= 1.0
+    if factor is not None:
+        left[:,-1]= -factor
+        right[:,-1]= factor
+    return left, right
+
+# Changes of the diagonal and factor for removal and decorrelation of
+# a source with covariance diag(d) + s*s^T:
+def _getFactoredChanges( diagonal, factor ):
+    removal= ( -diagonal, factor )
+    if factor is None:
+        decorrelation= ( 0.0*diagonal, None )
+    else:
+        decorrelation= ( factor**2, factor )
+    return { "removal": removal, "decorrelation": decorrelation }
+
+
+# Impacts of all error sources for the averages of values with group
+# matrix gm and covariance matrices hcov (dense, error source key:
+# matrix) and total cov with inverse vinv.  Changes of sources in
+# hfactorisations ( key: ( d, s ) ) use low-rank updates if their rank
+# is below maxrankfraction*N.  Returns the reference solution and per
+# source for "removal" and "decorrelation" the averages, errors, chi^2,
+# shifts, error changes and method, or None if the changed covariance
+# matrix is singular:
+def calcDenseImpacts( values, gm, cov, vinv, hcov, hfactorisations,
+                      maxrankfraction=0.5 ):
+    cov= asarray( cov, dtype=float )
+    vinv= asarray( vinv, dtype=float )
+    ndata= cov.shape[0]
+    reference= solveGls( vinv.dot, gm, values )
+    himpacts= {}
+    for key in sorted( hcov.keys() ):
+        sourcecov= asarray( hcov[key], dtype=float )
+        changes= {}
+        if key in hfactorisations:
+            changes= _getFactoredChanges( *hfactorisations[key] )
+        impacts= {}
+        for mode in [ "removal", "decorrelation" ]:
+            lowrank= None
+            if mode in changes:
+                lowrank= makeLowRankChange( *changes[mode] )
+                if lowrank[0].shape[1] >= maxrankfraction*ndata:
+                    lowrank= None
+            try:
+                if lowrank is not None:
+                    applyinverse= makeUpdatedInverse( vinv, *lowrank )
+                    method= "lowrank"
+                else:
+                    if mode == "removal":
+                        newcov= cov - sourcecov
+                    else:
+                        newcov= cov - sourcecov + diagonal( sourcecov )*identity( ndata )
+                    applyinverse= linalg.inv( newcov ).dot
+                    method= "direct"
+                impacts[mode]= _makeImpact( solveGls( applyinverse, gm, values ),
+                                            reference, method )
+            except linalg.LinAlgError:
+                impacts[mode]= None
+        himpacts[key]= impacts
+    return reference, himpacts
+
+# Same for a total covariance D + S*S^T given by the diagonals and
+# factor columns of all sources, see AverageDataParser.getFactoredCovariance:
+def calcFactoredImpacts( values, gm, hdiagonals, hfactors ):
+    factorkeys= sorted( hfactors.keys() )
+    def solve( hdiagonals, hfactors ):
+        factors= zeros( shape=(len( values ),len( factorkeys )) )
+        for ikey, key in enumerate( factorkeys ):
+            if key in hfactors:
+                factors[:,ikey]= hfactors[key]
+        applyinverse= makeWoodburyInverse( sum( hdiagonals.values() ), factors )
+        return solveGls( applyinverse, gm, values )
+    reference= solve( hdiagonals, hfactors )
+    himpacts= {}
+    for key in sorted( hdiagonals.keys() ):
+        impacts= {}
+        for mode in [ "removal", "decorrelation" ]:
+            newdiagonals= dict( hdiagonals )
+            newfactors= dict( hfactors )
+            if mode == "removal":
+                newdiagonals[key]= 0.0*hdiagonals[key]
+            elif key in hfactors:
+                newdiagonals[key]= hdiagonals[key] + hfactors[key]**2
+            newfactors.pop( key, None )
+            try:
+                if not ( sum( newdiagonals.values() ) > 0.0 ).all():
+                    raise linalg.LinAlgError( "Singular covariance" )
+                impacts[mode]= _makeImpact( solve( newdiagonals, newfactors ),
+                                            reference, "woodbury" )
+            except linalg.LinAlgError:
+                impacts[mode]= None
+        himpacts[key]= impacts
+    return reference, himpacts
+
+def _makeImpact( solution, reference, method ):
+    averages, errors, chisq= solution
+    refaverages, referrors, refchisq= reference
+    return { "averages": averages, "errors": errors, "chisq": chisq,
+             "shifts": averages - refaverages,
+             "errorchanges": errors - referrors, "method": method }
+
+# Table sorted by the largest error change or shift of any average for
+# the removal of the source, list of ( key, impacts ):
+def sortImpacts( himpacts ):
+    def size( item ):
+        removal= item[1]["removal"]
+        if removal is None:
+            return float( "inf" )
+        return max( abs( removal["errorchanges"] ).max(),
+                    abs( removal["shifts"] ).max() )
+    return sorted( himpacts.items(), key=size, reverse=True )
+
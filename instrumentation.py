@@ -0,0 +1,181 @@
+# Opt-in instrumentation of the averaging pipeline with named spans.
+# Each span records the number of calls, the wall time and the growth
+# of the peak memory while it is active.  Peak memory is taken from
+# tracemalloc if it is available and tracing (python 3), else from the
+# maximum resident set size of the process.  When disabled a span is a
+# shared no-op and timed functions are called directly.
+#
+# Example: instrumentation.enable()
+#          Blue( "test.txt" ).errorAnalysis()
+#          instrumentation.printStats()
+
+
+import time
+import resource
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc= None
+
+
+_lenabled= False
+_stats= {}
+
+
+def enable( lmemory=False ):
+    global _lenabled
+    _lenabled= True
+    if lmemory and tracemalloc is not None and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return
+def disable():
+    global _lenabled
+    _lenabled= False
+    if tracemalloc is not None and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    return
+def isEnabled():
+    return _lenabled
+
+# Peak memory mark in kB:
+def _getMemoryMark():
+    if tracemalloc is not None and tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()[1]//1024
+    return resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss
+
+
+class _Span:
+
+    def __init__( self, name ):
+        self.__name= name
+        return
+
+    def __enter__( self ):
+        self.__memory= _getMemoryMark()
+        self.__tstart= time.time()
+        return self
+
+    def __exit__( self, exctype, excvalue, traceback ):
+        elapsed= time.time() - self.__tstart
+        memory= _getMemoryMark() - self.__memory
+        name= self.__name
+        if not name in _stats:
+            _stats[name]= { "calls": 0, "time": 0.0, "maxtime": 0.0,
+                            "memory": 0 }
+        entry= _stats[name]
+        entry["calls"]+= 1
+        entry["time"]+= elapsed
+        entry["maxtime"]= max( entry["maxtime"], elapsed )
+        entry["memory"]= max( entry["memory"], memory )
+        return False
+
+class _NullSpan:
+    def __enter__( self ):
+        return self
+    def __exit__( self, exctype, excvalue, traceback ):
+        return False
+_nullspan= _NullSpan()
+
+# Span for use in with statements:
+def span( name ):
+    if not _lenabled:
+        return _nullspan
+    return _Span( name )
+
+# Decorator for functions and methods timed as a whole:
+def timed( name ):
+    def decorator( function ):
+        def wrapper( *args, **kwargs ):
+            if not _lenabled:
+                return function( *args, **kwargs )
+            with _Span( name ):
+                return function( *args, **kwargs )
+        wrapper.__name__= function.__name__
+        wrapper.__doc__= function.__doc__
+        return wrapper
+    return decorator
+
+
+# Counter for hot loops like the objective function of a fit, always
+# active.  Counts calls and cumulates their time, with a histogram of
+# the latency per call in decade bins given by their upper edges, the
+# last bin counts the calls above the last edge:
+class EvaluationCounter:
+
+    __binedges= [ 1.0e-6, 1.0e-5, 1.0e-4, 1.0e-3, 1.0e-2, 1.0e-1, 1.0 ]
+
+    def __init__( self ):
+        self.reset()
+        return
+
+    def reset( self ):
+        self.__ncalls= 0
+        self.__time= 0.0
+        self.__histogram= ( len( self.__binedges ) + 1 )*[ 0 ]
+        return
+
+    def record( self, elapsed ):
+        self.__ncalls+= 1
+        self.__time+= elapsed
+        ibin= 0
+        for binedge in self.__binedges:
+            if elapsed < binedge:
+                break
+            ibin+= 1
+        self.__histogram[ibin]+= 1
+        return
+
+    # Wrapper of function which records each call:
+    def count( self, function ):
+        def wrapper( *args ):
+            tstart= time.time()
+            result= function( *args )
+            self.record( time.time() - tstart )
+            return result
+        return wrapper
+
+    def getNcalls( self ):
+        return self.__ncalls
+    def getTime( self ):
+        return self.__time
+    def getMeanTime( self ):
+        if self.__ncalls == 0:
+            return 0.0
+        return self.__time/self.__ncalls
+
+    # List of ( upper bin edge, number of calls ), None for overflow:
+    def getHistogram( self ):
+        return zip( self.__binedges + [ None ], self.__histogram )
+
+    def printSummary( self, name="Evaluations" ):
+        fmtstr= "\n{0}: {1:d} calls, {2:.3f} ms total, {3:.3f} us per call"
+        print fmtstr.format( name, self.__ncalls, self.__time*1000.0,
+                             self.getMeanTime()*1.0e6 )
+        print "Latency per call:",
+        for binedge, ncalls in self.getHistogram():
+            if binedge is None:
+                print "above: {0:d}".format( ncalls )
+            else:
+                print "<{0:.0e}s: {1:d},".format( binedge, ncalls ),
+        return
+
+
+# Copy of the statistics, name: { calls, time, maxtime, memory }:
+def getStats():
+    return dict( [ ( name, dict( entry ) ) for name, entry in _stats.items() ] )
+def resetStats():
+    _stats.clear()
+    return
+
+def printStats():
+    print "\nInstrumentation: time in ms, peak memory growth in kB"
+    print "{0:>35s} {1:>7s} {2:>10s} {3:>10s} {4:>8s}".format( "Span", "Calls",
+                                                             "Total", "Max",
+                                                             "Memory" )
+    entries= sorted( _stats.items(), key=lambda item: -item[1]["time"] )
+    for name, entry in entries:
+        fmtstr= "{0:>35s} {1:7d} {2:10.3f} {3:10.3f} {4:8d}"
+        print fmtstr.format( name, entry["calls"], entry["time"]*1000.0,
+                             entry["maxtime"]*1000.0, entry["memory"] )
+    return
+
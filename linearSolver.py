@@ -0,0 +1,190 @@
+# Closed-form solver for linear least squares problems.  Same interface
+# as lsqSolver (lsqSolver.py) and minuitSolver for use by the averaging
+# classes with python duck-typing.  The residuals r(pars) with
+# chi^2 = r*r are linear in the parameters, the minimum follows from one
+# solve of the normal equations, pars= pars0 - (J^T*J)^-1*J^T*r(pars0),
+# with covariance (J^T*J)^-1.  With the derivatives of the residuals
+# w.r.t. the data the weights of the data in the solution follow as
+# well.  With mparmatrix the solver has the accessors of clsqSolver
+# instead: the parameters are the first nupar (unmeasured) ones and
+# the measured parameters are mparmatrix*pars.
+
+
+from numpy import matrix, array, diag, sqrt, outer, zeros, ix_
+from numpy.linalg import inv, LinAlgError
+from chisqProb import chisqProb
+
+
+class linearError( Exception ):
+    def __init__( self, value ):
+         self.__value= value
+    def __str__( self ):
+         return repr( self.__value )
+
+
+class linearSolver():
+
+    def __init__( self, resfun, jacfun, datajacobian, pars, parerrors,
+                  parnames, ndof, datav=None, nupar=None, mparmatrix=None,
+                  mparnames=None ):
+        self.__resfun= resfun
+        self.__jacfun= jacfun
+        self.__datajacobian= datajacobian
+        self.__parnames= parnames
+        self.__ndof= ndof
+        self.__datav= datav
+        self.__nupar= nupar
+        self.__mparmatrix= mparmatrix
+        self.__mparnames= mparnames
+        self.__fixedpars= {}
+        self.__solution= array( pars, dtype=float )
+        self.__covm= diag( array( parerrors, dtype=float )**2 )
+        self.__weights= zeros( shape=(len( pars ),datajacobian.shape[1]) )
+        residuals= self.__resfun( self.__solution )
+        self.__chisq= residuals.dot( residuals )
+        return
+
+    # The solution does not depend on starting values, accepted for
+    # compatibility with the iterative solvers:
+    def setStartValues( self, pars, parerrors=None ):
+        return
+    def resetStartValues( self ):
+        return
+
+    # Fix a parameter at its current value or at value for the
+    # following solves, or release it again:
+    def fixPar( self, ipar, value=None ):
+        if value is None:
+            value= self.__solution[ipar]
+        self.__fixedpars[ipar]= value
+        return
+    def releasePar( self, ipar ):
+        self.__fixedpars.pop( ipar, None )
+        return
+
+    # One solve of the normal equations for the free parameters, the
+    # weights are d pars/d data= -(J^T*J)^-1*J^T*dr/ddata:
+    def solve( self, lBlobel=True ):
+        npar= len( self.__solution )
+        freepars= [ ipar for ipar in range( npar )
+                    if not ipar in self.__fixedpars ]
+        pars= zeros( npar )
+        for ipar, value in self.__fixedpars.items():
+            pars[ipar]= value
+        jacobian= self.__jacfun( pars )[:,freepars]
+        try:
+            covm= inv( jacobian.T.dot( jacobian ) )
+        except LinAlgError:
+            raise linearError( "Singular normal equations" )
+        pars[freepars]-= covm.dot( jacobian.T.dot( self.__resfun( pars ) ) )
+        residuals= self.__resfun( pars )
+        self.__solution= pars
+        self.__chisq= residuals.dot( residuals )
+        self.__covm= zeros( shape=(npar,npar) )
+        self.__covm[ix_( freepars, freepars )]= covm
+        self.__weights= zeros( shape=self.__weights.shape )
+        self.__weights[freepars]= -covm.dot( jacobian.T.dot( self.__datajacobian ) )
+        return
+
+    # The chi^2 is parabolic, MINOS errors are the parabolic errors:
+    def getMinosErrors( self, ipar ):
+        error= sqrt( self.__covm[ipar,ipar] )
+        return -error, error
+
+    def hasConverged( self ):
+        return True
+
+    def getNiterations( self ):
+        return 1
+
+    def getChisq( self ):
+        return self.__chisq
+
+    def getNdof( self ):
+        return self.__ndof
+
+    def getDatav( self ):
+        return self.__datav
+
+    # Derivatives of all parameters w.r.t. the data:
+    def getWeightsMatrix( self ):
+        return self.__weights.copy()
+
+    def getPars( self ):
+        return list( self.__solution[:self.__nupar] )
+    def getUparv( self ):
+        pars= self.getPars()
+        parv= matrix( pars )
+        parv.shape= (len(pars),1)
+        return parv
+    def getParErrors( self ):
+        return list( sqrt( diag( self.__covm ) )[:self.__nupar] )
+
+    def getMpars( self ):
+        return list( self.__mparmatrix.dot( self.__solution ) )
+    def getMparErrors( self ):
+        mparmatrix= self.__mparmatrix
+        mcovm= mparmatrix.dot( self.__covm ).dot( mparmatrix.T )
+        return list( sqrt( diag( mcovm ) ) )
+
+    def getCovariancematrix( self ):
+        return self.__covm.copy()
+    def getCorrelationmatrix( self ):
+        errors= sqrt( diag( self.__covm ) )
+        errorproducts= outer( errors, errors )
+        errorproducts[errorproducts == 0.0]= 1.0
+        return self.__covm/errorproducts
+
+    def __printPars( self, par, parerrors, parnames, ffmt=".4f" ):
+        for ipar in range( len( par ) ):
+            name= parnames[ipar]
+            print "{0:>15s}:".format( name ),
+            fmtstr= "{0:10" + ffmt + "} +/- {1:10" + ffmt + "}"
+            print fmtstr.format( par[ipar], parerrors[ipar] )
+        return
+
+    def printResults( self, ffmt=".4f", cov=False, corr=False ):
+        print "\nClosed-form linear least squares"
+        print "\nResults after fit"
+        chisq= self.__chisq
+        ndof= self.__ndof
+        fmtstr= "\nChi^2= {0:"+ffmt+"} for {1:d} d.o.f, Chi^2/d.o.f= {2:"+ffmt+"}, P-value= {3:"+ffmt+"}"
+        print fmtstr.format( chisq, ndof, chisq/float(ndof),
+                             chisqProb( chisq, ndof ) )
+        print "\nFitted parameters and errors"
+        print "           Name       Value          Error"
+        self.__printPars( self.__solution, sqrt( diag( self.__covm ) ),
+                          self.__parnames, ffmt=ffmt )
+        if self.__mparmatrix is not None:
+            print "\nFitted measured parameters and errors"
+            print "           Name       Value          Error"
+            self.__printPars( self.getMpars(), self.getMparErrors(),
+                              self.__mparnames, ffmt=ffmt )
+        if cov:
+            self.printCovariances()
+        if corr:
+            self.printCorrelations()
+        return
+
+    def __printMatrix( self, m, ffmt ):
+        mshape= m.shape
+        print "{0:>10s}".format( "" ),
+        for i in range(mshape[0]):
+            print "{0:>10s}".format( self.__parnames[i] ),
+        print
+        for i in range(mshape[0]):
+            print "{0:>10s}".format( self.__parnames[i] ),
+            for j in range(mshape[1]):
+                fmtstr= "{0:10"+ffmt+"}"
+                print fmtstr.format( m[i,j] ),
+            print
+        return
+    def printCovariances( self ):
+        print "\nCovariance matrix:"
+        self.__printMatrix( self.getCovariancematrix(), ".3e" )
+        return
+    def printCorrelations( self ):
+        print "\nCorrelation matrix:"
+        self.__printMatrix( self.getCorrelationmatrix(), ".3f" )
+        return
+
@@ -0,0 +1,57 @@
+# Subclass of FitAverage to implement least squares averaging
+# with the numpy Levenberg-Marquardt solver lsqSolver, no ROOT
+
+
+from clsqAverage import FitAverage
+from lsqSolver import lsqSolver
+from numpy import matrix
+
+
+class lsqAverage( FitAverage ):
+
+    def __init__( self, filename, llognormal=False, lfastlinear=True,
+                  lbluestart=False ):
+        FitAverage.__init__( self, filename, llognormal, lfastlinear,
+                             lbluestart )
+        return
+
+    # Used by base class to create the least squares solver
+    # and run by base class ctor:
+    def _createSolver( self, gm, parindexmaps, errorkeys,
+                       systerrormatrix, data,
+                       extrapars, extraparerrors, upar,
+                       upnames, mpnames, extraparnames ):
+
+        ndata= len( data )
+        npar= len( upar )
+        self.__npar= npar
+        datav= matrix( data )
+        datav.shape= (ndata,1)
+        self.__data= datav
+        residuals= self._makeResiduals( gm, parindexmaps, errorkeys,
+                                        systerrormatrix, datav, npar,
+                                        len( extrapars ) )
+
+        # Prepare and create the solver with residuals and their
+        # analytic Jacobian, residual calls are counted:
+        pars= upar + extrapars
+        parerrors= upar + extraparerrors
+        parnames= upnames + extraparnames
+        ndof= ndata - npar
+        if self._useLinearSolver():
+            return self._makeLinearSolver( residuals, pars, parerrors,
+                                           parnames, ndof, datav )
+        counter= self.getEvaluationCounter()
+        solver= lsqSolver( counter.count( residuals.calcResiduals ),
+                           residuals.calcJacobian,
+                           pars, parerrors, parnames, ndof )
+        return solver
+
+    # Needed for calculation of weights by derivatives of
+    # solution w.r.t. inputs in base class
+    def _getSolverData( self ):
+        return self.__data
+    def _getAverage( self ):
+        uparv= FitAverage._getAverage( self )
+        return uparv[:self.__npar]
+
@@ -0,0 +1,240 @@
+# Least squares solver with Levenberg-Marquardt iterations in numpy.
+# Same interface as minuitSolver (minuitSolver.py) and clsqSolver
+# (clsq.py) for use by the averaging classes with python duck-typing,
+# but no dependency on ROOT.  The problem is given as residual vector
+# r(pars) with chi^2 = r*r and its Jacobian dr/dpars.
+
+
+from numpy import matrix, array, diag, sqrt, outer, zeros, ix_
+from numpy.linalg import solve, inv, LinAlgError
+from chisqProb import chisqProb
+
+
+class lsqError( Exception ):
+    def __init__( self, value ):
+         self.__value= value
+    def __str__( self ):
+         return repr( self.__value )
+
+
+class lsqSolver():
+
+    def __init__( self, resfun, jacfun, pars, parerrors, parnames, ndof,
+                  maxiter=100, epsilon=1.0e-10 ):
+        self.__resfun= resfun
+        self.__jacfun= jacfun
+        self.__pars= list( pars )
+        self.__parerrors= list( parerrors )
+        self.__parnames= parnames
+        self.__ndof= ndof
+        self.__maxiter= maxiter
+        self.__epsilon= epsilon
+        self.__fixedpars= set()
+        self.resetStartValues()
+        self.__solution= array( self.__startpars, dtype=float )
+        self.__covm= diag( array( self.__parerrors, dtype=float )**2 )
+        self.__chisq= self.__calcChisq( self.__solution )
+        self.__niter= 0
+        self.__lconverged= False
+        return
+
+    # Starting values for the next solve, the step sizes are not
+    # needed but accepted for compatibility with minuitSolver:
+    def setStartValues( self, pars, parerrors=None ):
+        if len( pars ) != len( self.__pars ):
+            raise lsqError( "Wrong number of starting values" )
+        self.__startpars= list( pars )
+        return
+    def resetStartValues( self ):
+        self.__startpars= list( self.__pars )
+        return
+
+    # Fix a parameter at its current starting value or at value for
+    # the following solves, or release it again:
+    def fixPar( self, ipar, value=None ):
+        if value is not None:
+            self.__startpars[ipar]= value
+        self.__fixedpars.add( ipar )
+        return
+    def releasePar( self, ipar ):
+        self.__fixedpars.discard( ipar )
+        return
+    def __getFreePars( self ):
+        return [ ipar for ipar in range( len( self.__pars ) )
+                 if not ipar in self.__fixedpars ]
+
+    def __calcChisq( self, pars ):
+        residuals= self.__resfun( pars )
+        return residuals.dot( residuals )
+
+    # Levenberg-Marquardt: Gauss-Newton steps with the diagonal of
+    # J^T*J scaled by lambda added, lambda decreases after successful
+    # and increases after failed steps.  Converged when chi^2 changes
+    # by less than epsilon:
+    def solve( self, lBlobel=True ):
+        freepars= self.__getFreePars()
+        pars= array( self.__startpars, dtype=float )
+        residuals= self.__resfun( pars )
+        chisq= residuals.dot( residuals )
+        lam= 1.0e-3
+        self.__lconverged= False
+        for iteration in range( self.__maxiter ):
+            jacobian= self.__jacfun( pars )[:,freepars]
+            jtj= jacobian.T.dot( jacobian )
+            jtr= jacobian.T.dot( residuals )
+            while True:
+                try:
+                    step= solve( jtj + lam*diag( diag( jtj ) ), -jtr )
+                except LinAlgError:
+                    raise lsqError( "Singular normal equations" )
+                newpars= pars.copy()
+                newpars[freepars]+= step
+                newresiduals= self.__resfun( newpars )
+                newchisq= newresiduals.dot( newresiduals )
+                if newchisq <= chisq or lam > 1.0e10:
+                    break
+                lam*= 10.0
+            # No improvement even for very small steps, at the minimum
+            # within numerical precision:
+            if newchisq > chisq:
+                self.__lconverged= True
+                break
+            lam= max( lam/10.0, 1.0e-12 )
+            deltachisq= chisq - newchisq
+            pars= newpars
+            residuals= newresiduals
+            chisq= newchisq
+            if abs( deltachisq ) < self.__epsilon:
+                self.__lconverged= True
+                break
+        self.__niter= iteration + 1
+        jacobian= self.__jacfun( pars )[:,freepars]
+        npar= len( pars )
+        self.__covm= zeros( shape=(npar,npar) )
+        self.__covm[ix_( freepars, freepars )]= inv( jacobian.T.dot( jacobian ) )
+        self.__solution= pars
+        self.__chisq= chisq
+        return
+
+    # Asymmetric errors (negative, positive) of parameter ipar a la 
+    # MINOS: find where the chi^2 profiled over the other parameters
+    # rises by errordef above the minimum.  Starting with the parabolic
+    # error the offset is rescaled with sqrt(errordef/delta chi^2) until
+    # delta chi^2 is within tolerance of errordef.  The solution is 
+    # restored afterwards:
+    def getMinosErrors( self, ipar, errordef=1.0, maxiter=20, 
+                        tolerance=1.0e-5 ):
+        solution= self.__solution.copy()
+        covm= self.__covm.copy()
+        chisqmin= self.__chisq
+        niter= self.__niter
+        lconverged= self.__lconverged
+        startpars= list( self.__startpars )
+        lfixed= ipar in self.__fixedpars
+        parerror= sqrt( covm[ipar,ipar]*errordef )
+        errors= []
+        try:
+            for sign in [ -1.0, 1.0 ]:
+                offset= sign*parerror
+                for iteration in range( maxiter ):
+                    self.__startpars= list( solution )
+                    self.fixPar( ipar, solution[ipar] + offset )
+                    self.solve()
+                    deltachisq= self.__chisq - chisqmin
+                    if deltachisq <= 0.0:
+                        raise lsqError( "Minos error: no chi^2 increase" )
+                    if abs( deltachisq - errordef ) < tolerance*errordef:
+                        break
+                    offset*= sqrt( errordef/deltachisq )
+                errors.append( offset )
+        finally:
+            if not lfixed:
+                self.releasePar( ipar )
+            self.__startpars= startpars
+            self.__solution= solution
+            self.__covm= covm
+            self.__chisq= chisqmin
+            self.__niter= niter
+            self.__lconverged= lconverged
+        return errors[0], errors[1]
+
+    def hasConverged( self ):
+        return self.__lconverged
+
+    def getNiterations( self ):
+        return self.__niter
+
+    def getChisq( self ):
+        return self.__chisq
+
+    def getNdof( self ):
+        return self.__ndof
+
+    def getPars( self ):
+        return list( self.__solution )
+    def getUparv( self ):
+        pars= self.getPars()
+        parv= matrix( pars )
+        parv.shape= (len(pars),1)
+        return parv
+    def getParErrors( self ):
+        return list( sqrt( diag( self.__covm ) ) )
+
+    def getCovariancematrix( self ):
+        return self.__covm.copy()
+    def getCorrelationmatrix( self ):
+        errors= sqrt( diag( self.__covm ) )
+        errorproducts= outer( errors, errors )
+        errorproducts[errorproducts == 0.0]= 1.0
+        return self.__covm/errorproducts
+
+    def __printPars( self, par, parerrors, parnames, ffmt=".4f" ):
+        for ipar in range( len( par ) ):
+            name= parnames[ipar]
+            print "{0:>15s}:".format( name ),
+            fmtstr= "{0:10" + ffmt + "} +/- {1:10" + ffmt + "}"
+            print fmtstr.format( par[ipar], parerrors[ipar] )
+        return
+
+    def printResults( self, ffmt=".4f", cov=False, corr=False ):
+        print "\nLevenberg-Marquardt least squares"
+        print "\nResults after fit"
+        chisq= self.__chisq
+        ndof= self.__ndof
+        fmtstr= "\nChi^2= {0:"+ffmt+"} for {1:d} d.o.f, Chi^2/d.o.f= {2:"+ffmt+"}, P-value= {3:"+ffmt+"}"
+        print fmtstr.format( chisq, ndof, chisq/float(ndof),
+                             chisqProb( chisq, ndof ) )
+        fmtstr= "Iterations: {0:d}, converged: {1}"
+        print fmtstr.format( self.__niter, self.__lconverged )
+        print "\nFitted parameters and errors"
+        print "           Name       Value          Error"
+        self.__printPars( self.getPars(), self.getParErrors(),
+                          self.__parnames, ffmt=ffmt )
+        if cov:
+            self.printCovariances()
+        if corr:
+            self.printCorrelations()
+        return
+
+    def __printMatrix( self, m, ffmt ):
+        mshape= m.shape
+        print "{0:>10s}".format( "" ),
+        for i in range(mshape[0]):
+            print "{0:>10s}".format( self.__parnames[i] ),
+        print
+        for i in range(mshape[0]):
+            print "{0:>10s}".format( self.__parnames[i] ),
+            for j in range(mshape[1]):
+                fmtstr= "{0:10"+ffmt+"}"
+                print fmtstr.format( m[i,j] ),
+            print
+        return
+    def printCovariances( self ):
+        print "\nCovariance matrix:"
+        self.__printMatrix( self.getCovariancematrix(), ".3e" )
+        return
+    def printCorrelations( self ):
+        print "\nCorrelation matrix:"
+        self.__printMatrix( self.getCorrelationmatrix(), ".3f" )
+        return
+
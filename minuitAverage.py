@@ -6,14 +6,28 @@
 
 
 from clsqAverage import FitAverage
-from minuitSolver import minuitSolver
-from numpy import matrix
+from numpy import matrix, frombuffer
+from time import time
 
 
 class minuitAverage( FitAverage ):
 
-    def __init__( self, filename, llognormal=False ):
-        FitAverage.__init__( self, filename, llognormal )
+    # Print a cost estimate before fits with more parameters:
+    __nparreport= 50
+
+    # With lreuse the solver shares a pooled TMinuit with other
+    # minuitAverage objects of the same shape.  With lgradient minuit
+    # uses the analytic gradient of the chi^2, else numerical
+    # derivatives, with lgradcheck the analytic gradient is checked
+    # against numerical derivatives before the first solve:
+    def __init__( self, filename, llognormal=False, lreuse=False,
+                  lfastlinear=True, lbluestart=False, lgradient=True,
+                  lgradcheck=False ):
+        self.__lreuse= lreuse
+        self.__lgradient= lgradient
+        self.__lgradcheck= lgradcheck
+        FitAverage.__init__( self, filename, llognormal, lfastlinear,
+                             lbluestart )
         return
 
     # Used by base class to create the least squares solver
@@ -23,43 +37,42 @@ class minuitAverage( FitAverage ):
                        extrapars, extraparerrors, upar, 
                        upnames, mpnames, extraparnames ):
 
-        dataparser= self._getDataparser()
-        covoptions= dataparser.getCovoption()
-        covm= dataparser.getTotalReducedCovariance()
-        invm= covm.getI()
+        from minuitSolver import minuitSolver
+
         ndata= len( data )
         npar= len( upar )
         self.__npar= npar
         nextrapar= len( extrapars )
-        uparv= matrix( npar*[ 0.0 ] )
-        uparv.shape= (npar,1)
+        ntotpar= npar + nextrapar
         datav= matrix( data )
         datav.shape= (ndata,1)
         self.__data= datav
+        residuals= self._makeResiduals( gm, parindexmaps, errorkeys,
+                                        systerrormatrix, datav, npar, 
+                                        nextrapar )
+        if self._useLinearSolver():
+            return self._makeLinearSolver( residuals, upar+extrapars,
+                                           upar+extraparerrors,
+                                           upnames+extraparnames,
+                                           ndata-npar, datav )
 
-        # The minuit fcn with chi^2 with constraint terms
-        # for correlated systematics
-        def fcn( n, grad, fval, par, ipar ):
-            for ipar in range( npar ):
-                uparv[ipar]= par[ipar]
-            umpar= gm*uparv
-            for ival in range( ndata ):
-                for ierr in parindexmaps.keys():
-                    covopt= covoptions[errorkeys[ierr]]
-                    indexmap= parindexmaps[ierr]
-                    if ival in indexmap.keys():
-                        parindex= indexmap[ival] + npar
-                        term= par[parindex]*systerrormatrix[ierr][ival]
-                        if "r" in covopt:
-                            # umpar[ival]*= 1.0+term/self.__data[ival]
-                            umpar[ival]/= ( 1.0 + term/self.__data[ival] )
-                        else:
-                            umpar[ival]-= term
-            delta= self.__data - umpar
-            chisq= delta.getT()*invm*delta
-            for ipar in range( npar, npar+nextrapar ):
-                chisq+= par[ipar]**2
+        # The minuit fcn with chi^2 with constraint terms for correlated
+        # systematics, whitened with the Cholesky factor of the reduced
+        # covariance matrix.  The gradient is calculated analytically
+        # when minuit asks for it with iflag == 2.  The parameters are
+        # read without copy from the minuit buffer, the gradient is
+        # written back in one go.  Calls are counted:
+        counter= self.getEvaluationCounter()
+        def fcn( n, grad, fval, par, iflag ):
+            tstart= time()
+            pararray= frombuffer( par, dtype=float, count=ntotpar )
+            if iflag == 2:
+                chisq, gradient= residuals.calcChisqAndGradient( pararray )
+                grad[:ntotpar]= gradient
+            else:
+                chisq= residuals.calcChisq( pararray )
             fval[0]= chisq
+            counter.record( time() - tstart )
             return
 
         # Prepare and create the minuit solver:
@@ -67,7 +80,12 @@ class minuitAverage( FitAverage ):
         parerrors= upar + extraparerrors
         parnames= upnames + extraparnames
         ndof= ndata - npar
-        solver= minuitSolver( fcn, pars, parerrors, parnames, ndof )
+        solver= minuitSolver( fcn, pars, parerrors, parnames, ndof,
+                              lgradient=self.__lgradient,
+                              lgradcheck=self.__lgradcheck,
+                              lreuse=self.__lreuse )
+        if len( pars ) > self.__nparreport:
+            solver.printCostEstimate()
         return solver
 
     # Needed for calculation of weights by derivatives of
@@ -9,9 +9,10 @@
 
 
 from ctypes import c_double, c_int
-from ROOT import TMinuit, TMath
-from numpy import matrix, array
-from math import sqrt
+from chisqProb import chisqProb
+from numpy import matrix, array, diag, outer, sqrt, zeros, ix_
+from weakref import ref
+from time import time
 
 
 class MinuitError( Exception ):
@@ -23,23 +24,130 @@ class MinuitError( Exception ):
           
 class minuitSolver():
 
-    def __init__( self, fcn, pars, parerrors, parnames, ndof, maxpars=50 ):
+    __gradtolerance= 1.0e-4
+
+    # Configured TMinuit instances for reuse, one per problem shape
+    # ( maxpars, number of parameters ):
+    __pool= {}
+
+    # TMinuit is sized to the number of parameters unless maxpars
+    # is given explicitly.  With lgradient fcn provides the gradient
+    # for iflag == 2, it is checked once against numerical derivatives
+    # before the first solve with lgradcheck.  With lreuse the TMinuit
+    # instance is taken from the pool and shared with other solvers of
+    # the same shape, the solver binds its fcn and parameters to it 
+    # when it becomes active:
+    def __init__( self, fcn, pars, parerrors, parnames, ndof, maxpars=None,
+                  lgradient=False, lgradcheck=False, lreuse=False ):
           
-        if len( pars ) > maxpars:
-             raise MinuitError( "More than 50 parameters, increase maxpars" )
-        self.__minuit= TMinuit( maxpars )
-        self.minuitCommand( "SET PRI -1" )
-        self.__minuit.SetFCN( fcn )
+        if maxpars is None:
+             maxpars= len( pars )
+        elif len( pars ) > maxpars:
+             message= ( "More than " + str( maxpars ) + 
+                        " parameters, increase maxpars" )
+             raise MinuitError( message )
+        self.__fcn= fcn
+        self.__lgradient= lgradient
+        self.__lgradcheck= lgradient and lgradcheck
+        if lreuse:
+            self.__poolentry= self.__getPoolEntry( maxpars, len( pars ) )
+            self.__minuit= self.__poolentry["minuit"]
+        else:
+            self.__poolentry= None
+            self.__minuit= self.__makeMinuit( maxpars )
+            self.__minuit.SetFCN( fcn )
+            if lgradient:
+                self.minuitCommand( "SET GRAD 1" )
         self.__pars= pars
         self.__parerrors= parerrors
         self.__parnames= parnames
-        self.__setParameters()
+        self.__snapshot= None
+        self.__nfcn= 0
+        self.__fixedpars= set()
+        self.resetStartValues()
+        if self.__poolentry is None:
+            self.__setParameters()
+        else:
+            self.__activate()
         self.__ndof= ndof
         return
    
+    # Starting values and step sizes for the next solve, e.g. from
+    # a previous converged solution of a nearby problem:
+    def setStartValues( self, pars, parerrors=None ):
+        if len( pars ) != len( self.__pars ):
+            raise MinuitError( "Wrong number of starting values" )
+        self.__startpars= list( pars )
+        if parerrors is not None:
+            self.__startparerrors= [ parerror if parerror > 0.0 else origerror
+                                     for parerror, origerror in 
+                                     zip( parerrors, self.__parerrors ) ]
+        return
+    def resetStartValues( self ):
+        self.__startpars= list( self.__pars )
+        self.__startparerrors= list( self.__parerrors )
+        return
+
+    # ROOT is only loaded when a solver is created:
+    def __makeMinuit( self, maxpars ):
+        from ROOT import TMinuit
+        minuit= TMinuit( maxpars )
+        errorcode= minuit.Command( "SET PRI -1" )
+        if errorcode != 0:
+            raise MinuitError( "Minuit command SET PRI -1 failed" )
+        return minuit
+    def __getPoolEntry( self, maxpars, npar ):
+        key= ( maxpars, npar )
+        if not key in minuitSolver.__pool:
+            minuitSolver.__pool[key]= { "minuit": self.__makeMinuit( maxpars ),
+                                        "owner": None }
+        return minuitSolver.__pool[key]
+
+    # Bind fcn, gradient option and parameters of this solver to a
+    # shared TMinuit, previous parameter definitions, function 
+    # minimum and covariance matrix are cleared:
+    def __activate( self ):
+        entry= self.__poolentry
+        if entry is None:
+            return
+        owner= entry["owner"]
+        if owner is not None and owner() is self:
+            return
+        minuit= self.__minuit
+        minuit.mncler()
+        minuit.mnrset( 1 )
+        minuit.SetFCN( self.__fcn )
+        if self.__lgradient:
+            command= "SET GRAD 1"
+        else:
+            command= "SET NOGRAD"
+        errorcode= minuit.Command( command )
+        if errorcode != 0:
+            raise MinuitError( "Minuit command " + command + " failed" )
+        entry["owner"]= ref( self )
+        self.__setParameters()
+        return
+
+    # Explicit reset between fits: starting values as given to the
+    # c-tor, no function minimum or covariance matrix from earlier fits:
+    def reset( self ):
+        self.__activate()
+        self.resetStartValues()
+        self.__setParameters()
+        self.__minuit.mnrset( 1 )
+        self.__snapshot= None
+        return
+
+    # Remove all pooled TMinuit instances:
+    @staticmethod
+    def clearPool():
+        minuitSolver.__pool.clear()
+        return
+
     def __setParameters( self ):
-        for par, parerror, parname, i in zip( self.__pars,
-                                              self.__parerrors,
+        self.__snapshot= None
+        for par, parerror, parname, i in zip( self.__startpars,
+                                              self.__startparerrors,
                                               self.__parnames, 
                                               range( len( self.__pars ) ) ):
              ierflg= self.__minuit.DefineParameter( i, parname, par, parerror, 
@@ -47,27 +155,175 @@ class minuitSolver():
         if ierflg != 0:
              message= "Minuit define parameter error: " + str( ierflg )
              raise MinuitError( message )
+        for ipar in sorted( self.__fixedpars ):
+            self.__command( "FIX " + str( ipar+1 ) )
         return
 
-    def minuitCommand( self, command ):
+    # Fix a parameter at its current starting value or at value for
+    # the following solves, or release it again:
+    def fixPar( self, ipar, value=None ):
+        if value is not None:
+            self.__startpars[ipar]= value
+        self.__fixedpars.add( ipar )
+        self.__activate()
+        self.__setParameters()
+        return
+    def releasePar( self, ipar ):
+        if ipar in self.__fixedpars:
+            self.__fixedpars.remove( ipar )
+            self.minuitCommand( "RELEASE " + str( ipar+1 ) )
+        return
+
+    def __command( self, command ):
         errorcode= self.__minuit.Command( command )
         if errorcode != 0:
-            message= "Minuit command " + command + " failed: " + str( errorcode )
+            message= ( "Minuit command " + command + " failed: " + 
+                       str( errorcode ) )
             raise MinuitError( message )
         return
+    def minuitCommand( self, command ):
+        self.__activate()
+        self.__snapshot= None
+        self.__command( command )
+        return
 
     def solve( self, lBlobel=True ):
+        if self.__lgradcheck:
+            maxdeviation= self.checkGradient()
+            if maxdeviation > self.__gradtolerance:
+                message= ( "Gradient check failed, max. deviation " + 
+                           str( maxdeviation ) )
+                raise MinuitError( message )
+            self.__lgradcheck= False
+        self.__activate()
         self.__setParameters()
+        if self.__poolentry is not None:
+            self.__minuit.mnrset( 1 )
+        nfcnstart= self.__minuit.fNfcn
         self.minuitCommand( "MIGRAD" )
+        self.__nfcn= self.__minuit.fNfcn - nfcnstart
+        if self.__nfcn < 0:
+            self.__nfcn= self.__minuit.fNfcn
+        self.__takeSnapshot()
         return
 
+    # Number of fcn calls by minuit in the last solve:
+    def getNfcn( self ):
+        return self.__nfcn
+
+    # Results are read from TMinuit once after each solve or command
+    # and kept in an immutable snapshot for the getters:
+    def __takeSnapshot( self ):
+        self.__activate()
+        pars, parerrors= self.__getPars()
+        covm= self.__getCovariancematrix()
+        errors= sqrt( diag( covm ) )
+        errorproducts= outer( errors, errors )
+        errorproducts[errorproducts == 0.0]= 1.0
+        corrm= covm/errorproducts
+        covm.flags.writeable= False
+        corrm.flags.writeable= False
+        self.__snapshot= { "pars": tuple( pars ),
+                           "parerrors": tuple( parerrors ),
+                           "covm": covm,
+                           "corrm": corrm,
+                           "stat": self.__getStat() }
+        return
+    def __getSnapshot( self ):
+        if self.__snapshot is None:
+            self.__takeSnapshot()
+        return self.__snapshot
+
+    # Asymmetric errors (negative, positive) of parameter ipar from
+    # MINOS after a solve:
+    def getMinosErrors( self, ipar ):
+        self.__getSnapshot()
+        self.minuitCommand( "MINOS 1000 " + str( ipar+1 ) )
+        eplus= c_double()
+        eminus= c_double()
+        eparab= c_double()
+        gcc= c_double()
+        self.__minuit.mnerrs( ipar, eplus, eminus, eparab, gcc )
+        self.__takeSnapshot()
+        return eminus.value, eplus.value
+
     def getChisq( self ):
-        hstat= self.__getStat()
+        hstat= self.__getSnapshot()["stat"]
         return hstat["min"]
 
     def getNdof( self ):
         return self.__ndof
 
+    # Compare the gradient from fcn with central differences at the
+    # starting values, return the largest relative deviation:
+    def checkGradient( self, eps=1.0e-5 ):
+        npar= len( self.__pars )
+        fval= array( [ 0.0 ] )
+        grad= array( npar*[ 0.0 ] )
+        pars= array( self.__startpars, dtype="double" )
+        self.__fcn( npar, grad, fval, pars, 2 )
+        maxdeviation= 0.0
+        for ipar in range( npar ):
+            step= eps*max( abs( pars[ipar] ), 1.0 )
+            parshi= pars.copy()
+            parshi[ipar]+= step
+            parslo= pars.copy()
+            parslo[ipar]-= step
+            fhi= array( [ 0.0 ] )
+            flo= array( [ 0.0 ] )
+            self.__fcn( npar, array( npar*[ 0.0 ] ), fhi, parshi, 4 )
+            self.__fcn( npar, array( npar*[ 0.0 ] ), flo, parslo, 4 )
+            numgrad= ( fhi[0] - flo[0] )/( 2.0*step )
+            deviation= abs( grad[ipar] - numgrad )/max( abs( numgrad ), 1.0 )
+            maxdeviation= max( maxdeviation, deviation )
+        return maxdeviation
+
+    # Rough cost of a MIGRAD minimisation: each gradient takes about
+    # 2*npar fcn calls with numerical derivatives or one call with
+    # fcn gradients, and a variable metric minimisation about npar
+    # iterations, followed by a covariance matrix with npar**2 
+    # elements.  The time per fcn call is measured at the starting
+    # values:
+    def estimateCost( self ):
+        npar= len( self.__pars )
+        if self.__lgradient:
+            ncallsgradient= 1
+        else:
+            ncallsgradient= 2*npar
+        niterations= npar + 1
+        ncalls= niterations*( ncallsgradient + 3 ) + npar*( npar + 1 )
+        fval= array( [ 0.0 ] )
+        grad= array( npar*[ 0.0 ] )
+        start= time()
+        self.__fcn( npar, grad, fval, array( self.__startpars ), 4 )
+        tcall= time() - start
+        hcost= { "npar": npar,
+                 "ncallsgradient": ncallsgradient,
+                 "ncalls": ncalls,
+                 "tcall": tcall,
+                 "time": ncalls*tcall,
+                 "memory": 8*npar**2 }
+        return hcost
+    def printCostEstimate( self ):
+        hcost= self.estimateCost()
+        print "\nMinuit cost estimate for {0:d} parameters:".format( 
+            hcost["npar"] )
+        fmtstr= "{0:d} fcn calls per gradient, about {1:d} fcn calls in total"
+        print fmtstr.format( hcost["ncallsgradient"], hcost["ncalls"] )
+        fmtstr= ( "{0:.3e} s per fcn call, about {1:.2f} s, " +
+                  "covariance matrix {2:.1f} kB" )
+        print fmtstr.format( hcost["tcall"], hcost["time"], 
+                             hcost["memory"]/1024.0 )
+        return
+
+    def getStatus( self ):
+        hstat= self.__getSnapshot()["stat"]
+        return hstat["status"]
+
+    # Converged with full accurate covariance matrix:
+    def hasConverged( self ):
+        return self.getStatus() == 3
+
     def __printPars( self, par, parerrors, parnames, ffmt=".4f" ):
         for ipar in range( len( par ) ):
             name= parnames[ipar]
@@ -79,12 +335,13 @@ class minuitSolver():
     def printResults( self, ffmt=".4f", cov=False, corr=False ):
         print "\nMinuit least squares"
         print "\nResults after minuit fit"
-        hstat= self.__getStat()
+        hstat= self.__getSnapshot()["stat"]
         chisq= hstat["min"]
         ndof= self.__ndof
-        fmtstr= "\nChi^2= {0:"+ffmt+"} for {1:d} d.o.f, Chi^2/d.o.f= {2:"+ffmt+"}, P-value= {3:"+ffmt+"}"
+        fmtstr= ( "\nChi^2= {0:"+ffmt+"} for {1:d} d.o.f, " +
+                  "Chi^2/d.o.f= {2:"+ffmt+"}, P-value= {3:"+ffmt+"}" )
         print fmtstr.format( chisq, ndof, chisq/float(ndof), 
-                             TMath.Prob( chisq, ndof ) )
+                             chisqProb( chisq, ndof ) )
         fmtstr= "Est. dist. to min: {0:.3e}, minuit status: {1}"
         print fmtstr.format( hstat["edm"], hstat["status"] )
         print "\nFitted parameters and errors"
@@ -121,16 +378,14 @@ class minuitSolver():
         return
 
     def getPars( self ):
-        pars, parerrors= self.__getPars()
-        return pars
+        return list( self.__getSnapshot()["pars"] )
     def getUparv( self ):
         pars= self.getPars()
         parv= matrix( pars )
         parv.shape= (len(pars),1)
         return parv
     def getParErrors( self ):
-        pars, parerrors= self.__getPars()
-        return parerrors
+        return list( self.__getSnapshot()["parerrors"] )
     def __getPars( self ):
         pars= []
         parerrors= []
@@ -145,21 +400,32 @@ class minuitSolver():
             parerrors.append( pare.value )
         return pars, parerrors
 
-    def getCovariancematrix( self ):
+    # mnemat has the covariance matrix of the npari free parameters
+    # only, ordered by their internal numbers from GetParameter, fixed
+    # parameters get zero rows and columns:
+    def __getCovariancematrix( self ):
         npar= len( self.__pars )
-        covm= array( npar**2*[ 0.0 ], dtype="double" )
-        self.__minuit.mnemat( covm, npar )
-        covm.shape= (npar,npar)
+        npari= self.__getStat()["npari"]
+        covm= zeros( shape=(npar,npar) )
+        if npari == 0:
+            return covm
+        freecovm= array( npari**2*[ 0.0 ], dtype="double" )
+        self.__minuit.mnemat( freecovm, npari )
+        freecovm.shape= (npari,npari)
+        freepars= npari*[ None ]
+        for ipar in range( npar ):
+            par= c_double()
+            pare= c_double()
+            iint= self.__minuit.GetParameter( ipar, par, pare )
+            if iint > 0:
+                freepars[iint-1]= ipar
+        covm[ix_( freepars, freepars )]= freecovm
         return covm
+    def getCovariancematrix( self ):
+        return self.__getSnapshot()["covm"].copy()
 
     def getCorrelationmatrix( self ):
-        covm= self.getCovariancematrix()
-        corrm= covm.copy()
-        npar= len( self.__pars )
-        for i in range( npar ):
-            for j in range( npar ):
-                corrm[i,j]= covm[i,j]/sqrt(covm[i,i]*covm[j,j])
-        return corrm
+        return self.__getSnapshot()["corrm"].copy()
 
     def __getStat( self ):
         fmin= c_double()
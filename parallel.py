@@ -0,0 +1,49 @@
+# Parallel evaluation of a function for a list of arguments in a
+# pool of forked worker processes.  The function reaches the workers
+# by inheritance through fork, so it can be a closure or a bound method
+# of objects which can not be pickled, e.g. solvers with PyROOT 
+# callbacks.  Only arguments and results are pickled.
+
+
+import multiprocessing
+
+
+_function= None
+
+def _call( arg ):
+    return _function( arg )
+
+# With nprocs == 1 or a single argument everything runs in the
+# calling process, nprocs None means one worker per cpu:
+def parallelMap( function, arglist, nprocs=None ):
+    global _function
+    arglist= list( arglist )
+    if nprocs is None:
+        nprocs= multiprocessing.cpu_count()
+    nprocs= min( nprocs, len( arglist ) )
+    if nprocs <= 1:
+        return [ function( arg ) for arg in arglist ]
+    _function= function
+    pool= multiprocessing.Pool( nprocs )
+    try:
+        results= pool.map( _call, arglist )
+    finally:
+        pool.close()
+        pool.join()
+        _function= None
+    return results
+
+# Split into at most nchunks contiguous chunks of nearly equal size,
+# e.g. to keep neighbouring scan points in the same worker:
+def splitContiguous( arglist, nchunks ):
+    arglist= list( arglist )
+    nchunks= max( 1, min( nchunks, len( arglist ) ) )
+    size, remainder= divmod( len( arglist ), nchunks )
+    chunks= []
+    start= 0
+    for ichunk in range( nchunks ):
+        end= start + size + ( 1 if ichunk < remainder else 0 )
+        chunks.append( arglist[start:end] )
+        start= end
+    return chunks
+
@@ -0,0 +1,166 @@
+# Content-addressed on-disk cache of averaging results.  The key is a
+# sha256 hash of the input file bytes, the method, the options and the
+# library version, the value the results (see Average.getResults) as
+# JSON file <key>.json in the cache directory.  Files are written to
+# a temporary file and renamed, such that readers in other processes
+# never see partial results.  The cache size is limited, least
+# recently used entries (by file modification time, updated on hits)
+# are evicted under an exclusive lock on the cache directory.
+#
+# Example: cache= ResultCache( "/tmp/averagecache" )
+#          key= cache.makeKey( "test.txt", "minuit", { "llognormal": False } )
+#          results= cache.get( key )
+
+
+import os
+import json
+import hashlib
+import tempfile
+import fcntl
+
+
+# Increase when the format of cached results changes:
+cacheformat= 1
+
+_libraryversion= None
+
+# Modules which determine the results: all library modules next to
+# this one, test scripts excluded, such that new modules are covered
+# without a list to maintain:
+def getLibraryModules():
+    directory= os.path.dirname( os.path.abspath( __file__ ) )
+    return sorted( [ modulename for modulename in os.listdir( directory )
+                     if modulename.endswith( ".py" ) and 
+                     not modulename.startswith( "test" ) ] )
+
+# The library has no release numbers, its version is the hash of the
+# sources of the library modules and the cache format:
+def getLibraryVersion():
+    global _libraryversion
+    if _libraryversion is None:
+        sha= hashlib.sha256()
+        sha.update( str( cacheformat ) )
+        directory= os.path.dirname( os.path.abspath( __file__ ) )
+        for modulename in getLibraryModules():
+            sha.update( modulename )
+            with open( os.path.join( directory, modulename ), "rb" ) as source:
+                sha.update( source.read() )
+        _libraryversion= sha.hexdigest()
+    return _libraryversion
+
+
+class ResultCache:
+
+    def __init__( self, directory, maxbytes=100*1024*1024 ):
+        self.__directory= directory
+        self.__maxbytes= maxbytes
+        if not os.path.isdir( directory ):
+            try:
+                os.makedirs( directory )
+            except OSError:
+                if not os.path.isdir( directory ):
+                    raise
+        self.__stats= { "hits": 0, "misses": 0, "stores": 0, "evictions": 0 }
+        return
+
+    def makeKey( self, filename, method, options=None ):
+        sha= hashlib.sha256()
+        with open( filename, "rb" ) as infile:
+            sha.update( infile.read() )
+        sha.update( "\0" + method + "\0" )
+        sha.update( json.dumps( options or {}, sort_keys=True ) )
+        sha.update( "\0" + getLibraryVersion() )
+        return sha.hexdigest()
+
+    def __getPath( self, key ):
+        return os.path.join( self.__directory, key + ".json" )
+
+    # Cached results or None, a hit marks the entry as recently used:
+    def get( self, key ):
+        path= self.__getPath( key )
+        try:
+            with open( path ) as infile:
+                results= json.load( infile )
+            os.utime( path, None )
+        except ( IOError, OSError, ValueError ):
+            self.__stats["misses"]+= 1
+            return None
+        self.__stats["hits"]+= 1
+        return results
+
+    def put( self, key, results ):
+        descriptor, tmppath= tempfile.mkstemp( dir=self.__directory,
+                                               suffix=".tmp" )
+        try:
+            with os.fdopen( descriptor, "w" ) as outfile:
+                json.dump( results, outfile, sort_keys=True )
+            os.rename( tmppath, self.__getPath( key ) )
+        except:
+            if os.path.exists( tmppath ):
+                os.remove( tmppath )
+            raise
+        self.__stats["stores"]+= 1
+        self.evict()
+        return
+
+    # Exclusive lock on the cache directory against concurrent
+    # evictions and clears:
+    def __lock( self ):
+        lockfile= open( os.path.join( self.__directory, ".lock" ), "a" )
+        fcntl.flock( lockfile, fcntl.LOCK_EX )
+        return lockfile
+    def __unlock( self, lockfile ):
+        fcntl.flock( lockfile, fcntl.LOCK_UN )
+        lockfile.close()
+        return
+
+    def __getEntries( self ):
+        entries= []
+        for filename in os.listdir( self.__directory ):
+            if not filename.endswith( ".json" ):
+                continue
+            path= os.path.join( self.__directory, filename )
+            try:
+                status= os.stat( path )
+            except OSError:
+                continue
+            entries.append( ( status.st_mtime, status.st_size, path ) )
+        return entries
+
+    # Remove least recently used entries until the cache fits:
+    def evict( self ):
+        lockfile= self.__lock()
+        try:
+            entries= sorted( self.__getEntries() )
+            totalbytes= sum( [ size for mtime, size, path in entries ] )
+            for mtime, size, path in entries:
+                if totalbytes <= self.__maxbytes:
+                    break
+                try:
+                    os.remove( path )
+                except OSError:
+                    pass
+                totalbytes-= size
+                self.__stats["evictions"]+= 1
+        finally:
+            self.__unlock( lockfile )
+        return
+
+    def clear( self ):
+        lockfile= self.__lock()
+        try:
+            for mtime, size, path in self.__getEntries():
+                try:
+                    os.remove( path )
+                except OSError:
+                    pass
+        finally:
+            self.__unlock( lockfile )
+        return
+
+    def getSize( self ):
+        return sum( [ size for mtime, size, path in self.__getEntries() ] )
+
+    def getStats( self ):
+        return dict( self.__stats )
+
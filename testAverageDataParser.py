@@ -7,9 +7,20 @@ import unittest
 
 from AverageDataParser import AverageDataParser, stripLeadingDigits
 from numpy import matrix
+import numpy
 from math import log
 
 
+# Input with a zero error in a "gpr" source:
+zeroerrorinput= """[Data]
+Names:  Val1  Val2  Val3
+Values: 171.5 173.1 174.5
+00stat:   2.0   2.2   3.0 u
+01erra:   1.1   1.3   1.5 gp
+02errc:   0.4   0.0   0.5 gpr
+"""
+
+
 class AverageDataParserLogNormalTest( unittest.TestCase ):
 
     def setUp( self ):
@@ -55,6 +66,13 @@ class AverageDataParserTest( unittest.TestCase ):
         self.assertEqual( names, expectednames )
         return
 
+    def test_readFileObject( self ):
+        parser= AverageDataParser( open( "test.txt" ) )
+        self.assertEqual( parser.getValues(), self.__parser.getValues() )
+        self.assertTrue( ( parser.getTotalCovariance() == 
+                           self.__parser.getTotalCovariance() ).all() )
+        return
+
     def test_getValues( self ):
         values= self.__parser.getValues()
         expectedvalues= [ 171.5, 173.1, 174.5 ]
@@ -262,6 +280,47 @@ class AverageDataParserOptionsTest( unittest.TestCase ):
         self.__parser= AverageDataParser( "testOptions.txt" )
         return
 
+    def test_getFactoredCovariance( self ):
+        self.assertTrue( self.__parser._AverageDataParser__hcov is None )
+        hdiagonals, hfactors= self.__parser.getFactoredCovariance()
+        self.assertEqual( sorted( hfactors.keys() ), 
+                          [ '01erra', '02errb', '03errc' ] )
+        hcov= self.__parser.getCovariances()
+        for key in hdiagonals.keys():
+            cov= numpy.diag( hdiagonals[key] )
+            if key in hfactors:
+                cov+= numpy.outer( hfactors[key], hfactors[key] )
+            for i in range( 3 ):
+                for j in range( 3 ):
+                    self.assertAlmostEqual( cov[i,j], hcov[key][i,j] )
+        self.assertEqual( AverageDataParser( "test.txt" ).getFactoredCovariance(),
+                          None )
+        return
+
+    # Zero errors in "gpr" sources as in the dense covariance:
+    def test_getFactoredCovarianceZeroErrors( self ):
+        from StringIO import StringIO
+        parser= AverageDataParser( StringIO( zeroerrorinput ) )
+        hdiagonals, hfactors= parser.getFactoredCovariance()
+        hcov= parser.getCovariances()
+        for key in hdiagonals.keys():
+            cov= numpy.diag( hdiagonals[key] )
+            if key in hfactors:
+                cov+= numpy.outer( hfactors[key], hfactors[key] )
+            for i in range( 3 ):
+                for j in range( 3 ):
+                    self.assertAlmostEqual( cov[i,j], hcov[key][i,j] )
+        return
+
+    def test_getSourceFactorisations( self ):
+        parser= AverageDataParser( "test.txt" )
+        factorisations= parser.getSourceFactorisations()
+        self.assertEqual( sorted( factorisations.keys() ), [ '04err4' ] )
+        diagonal, factor= factorisations['04err4']
+        self.assertEqual( list( diagonal ), [ 0.0, 0.0, 0.0 ] )
+        self.assertEqual( list( factor ), [ 1.4, 2.9, 3.3 ] )
+        return
+
     def test_Errors( self ):
         errors= self.__parser.getErrors()
         expectederrors= { '00stat': [ 0.343, 0.38082, 0.5235 ], 
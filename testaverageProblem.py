@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+# unit tests for the shared averaging problem
+
+import unittest
+
+from averageProblem import AverageProblem
+from AverageDataParser import AverageDataParser
+from blue import Blue
+from lsqAverage import lsqAverage
+
+
+class averageProblemTest( unittest.TestCase ):
+
+    def setUp( self ):
+        self.__problem= AverageProblem( "test.txt" )
+        return
+
+    def test_shared( self ):
+        blue= Blue( self.__problem )
+        lsq= lsqAverage( self.__problem )
+        self.assertTrue( blue.dataparser is self.__problem.getParser() )
+        self.assertTrue( lsq._getDataparser() is self.__problem.getParser() )
+        self.assertTrue( blue.inv is self.__problem.getInverseCovariance() )
+        self.assertTrue( Blue( self.__problem ).cov is blue.cov )
+        return
+
+    def test_solution( self ):
+        self.assertEqual( self.__problem.getSolution( "blue" ), None )
+        blue= Blue( self.__problem )
+        average= blue.calcAverage()
+        self.assertAlmostEqual( float( self.__problem.getSolution( "blue" ) ),
+                                float( average ) )
+        lsq= lsqAverage( self.__problem )
+        self.assertAlmostEqual( lsq.getSolver().getPars()[0], float( average ) )
+        lsq.runSolver()
+        val, error= lsq.getAveragesAndErrors()
+        self.assertAlmostEqual( val[0], 170.70919692, places=5 )
+        return
+
+    def test_parser( self ):
+        parser= AverageDataParser( "valassi1.txt" )
+        blue= Blue( AverageProblem( parser ) )
+        self.assertTrue( blue.dataparser is parser )
+        self.assertEqual( blue.getComponents(), [ [ 0, 1 ], [ 2, 3 ] ] )
+        return
+
+    def test_woodbury( self ):
+        problem= AverageProblem( "testOptions.txt" )
+        woodbury= problem.getWoodbury()
+        self.assertTrue( woodbury is problem.getWoodbury() )
+        self.assertEqual( self.__problem.getWoodbury(), None )
+        averages= Blue( problem ).calcAverage()
+        self.assertAlmostEqual( float( averages ), 
+                                float( Blue( "testOptions.txt" ).calcAverage() ) )
+        return
+
+
+if __name__ == '__main__':
+    suite= unittest.TestLoader().loadTestsFromTestCase( averageProblemTest )
+    unittest.TextTestRunner( verbosity=2 ).run( suite )
+
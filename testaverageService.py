@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+# unit tests for the averaging service
+
+import unittest
+
+from StringIO import StringIO
+
+from blue import Blue
+from lsqAverage import lsqAverage
+from averageService import AverageService, AverageClient, ServiceError
+
+
+# Copies of test.txt with shifted values, same shape:
+def makeSpecs( nspecs ):
+    text= open( "test.txt" ).read()
+    specs= []
+    for ispec in range( nspecs ):
+        shifted= text.replace( "Values: 171.5",
+                               "Values: {0:.1f}".format( 171.5 + 0.1*ispec ) )
+        specs.append( { "text": shifted } )
+    return specs
+
+
+class averageServiceTest( unittest.TestCase ):
+
+    def setUp( self ):
+        self.__service= AverageService( nprocs=2, batchwindow=0.05 )
+        self.__client= AverageClient( self.__service )
+        return
+
+    def tearDown( self ):
+        self.__service.close()
+        return
+
+    def __compare( self, results, average ):
+        expected= average.getResults()
+        for value, expectedvalue in zip( results["averages"],
+                                         expected["averages"] ):
+            self.assertAlmostEqual( value, expectedvalue )
+        self.assertEqual( sorted( results["errors"].keys() ),
+                          sorted( expected["errors"].keys() ) )
+        for errorkey in expected["errors"].keys():
+            for error, expectederror in zip( results["errors"][errorkey],
+                                             expected["errors"][errorkey] ):
+                self.assertAlmostEqual( error, expectederror )
+        for weights, expectedweights in zip( results["weights"],
+                                             expected["weights"] ):
+            for weight, expectedweight in zip( weights, expectedweights ):
+                self.assertAlmostEqual( weight, expectedweight )
+        self.assertAlmostEqual( results["chisq"], expected["chisq"] )
+        self.assertEqual( results["ndof"], expected["ndof"] )
+        self.assertEqual( results["groups"], expected["groups"] )
+        return
+
+    def test_blue( self ):
+        for filename in [ "test.txt", "valassi1.txt", "valassi5.txt" ]:
+            results= self.__client.average( filename )
+            self.__compare( results, Blue( filename ) )
+        return
+
+    def test_coalescing( self ):
+        results= self.__client.averageMany( 5*[ "test.txt" ] )
+        for result in results[1:]:
+            self.assertTrue( result is results[0] )
+        metrics= self.__service.getMetrics()
+        self.assertEqual( metrics["requests"], 5 )
+        self.assertEqual( metrics["coalesced"], 4 )
+        self.assertEqual( metrics["completed"], 1 )
+        self.assertEqual( metrics["inflight"], 0 )
+        return
+
+    def test_batching( self ):
+        specs= makeSpecs( 8 ) + [ { "text": open( "valassi1.txt" ).read() } ]
+        results= self.__client.averageMany( specs )
+        metrics= self.__service.getMetrics()
+        self.assertEqual( metrics["batchedproblems"], 9 )
+        self.assertTrue( metrics["batches"] < 9 )
+        self.assertTrue( metrics["maxbatchsize"] > 1 )
+        self.__compare( results[0], Blue( "test.txt" ) )
+        self.__compare( results[3], Blue( StringIO( specs[3]["text"] ) ) )
+        self.__compare( results[-1], Blue( "valassi1.txt" ) )
+        return
+
+    def test_lsq( self ):
+        results= self.__client.average( "test.txt", "lsq" )
+        average= lsqAverage( "test.txt" )
+        average.runSolver()
+        self.__compare( results, average )
+        return
+
+    def test_failure( self ):
+        self.assertRaises( ServiceError, self.__client.average,
+                           { "text": "[Data]\nValues: x\n" } )
+        self.assertRaises( ServiceError, self.__client.average,
+                           "test.txt", "nomethod" )
+        metrics= self.__service.getMetrics()
+        self.assertEqual( metrics["failed"], 2 )
+        return
+
+    # Failures of the worker pool resolve the request with an error:
+    def test_poolFailure( self ):
+        self.assertRaises( ServiceError, self.__client.average,
+                           "test.txt", "lsq", timeout=10.0, 
+                           llognormal=lambda: False )
+        service= AverageService( nprocs=1, tasktimeout=1.0e-4, 
+                                 pollinterval=1.0e-3 )
+        try:
+            future= service.submit( "test.txt", "lsq" )
+            self.assertRaises( ServiceError, future.result, 10.0 )
+            metrics= service.getMetrics()
+            self.assertEqual( metrics["failed"], 1 )
+            self.assertEqual( metrics["inflight"], 0 )
+        finally:
+            service.close()
+        metrics= self.__service.getMetrics()
+        self.assertEqual( metrics["failed"], 1 )
+        self.assertEqual( metrics["inflight"], 0 )
+        return
+
+    # A singular covariance matrix fails only its own request in the
+    # batch:
+    def test_singularInBatch( self ):
+        text= open( "test.txt" ).read()
+        for line in [ "00Stat:   0.3   0.33  0.4 c", "01Err1:   1.1   1.3   1.5 m",
+                      "02Err2:   0.9   1.5   1.9 m", "03Err3:   2.4   3.1   3.5 p" ]:
+            text= text.replace( line, line[:7] + " 0. 0. 0. " + line[-1] )
+        futures= [ self.__service.submit( spec ) 
+                   for spec in makeSpecs( 2 ) + [ { "text": text } ] ]
+        self.assertRaises( ServiceError, futures[2].result, 10.0 )
+        self.__compare( futures[0].result( 10.0 ), Blue( "test.txt" ) )
+        self.__compare( futures[1].result( 10.0 ), 
+                        Blue( StringIO( makeSpecs( 2 )[1]["text"] ) ) )
+        metrics= self.__service.getMetrics()
+        self.assertEqual( metrics["failed"], 1 )
+        self.assertEqual( metrics["batches"], 1 )
+        return
+
+    # Exceptions in done callbacks do not stop the service:
+    def test_callbackFailure( self ):
+        import sys
+        from StringIO import StringIO as Output
+        def fail( future ):
+            raise RuntimeError( "callback failure" )
+        stderr= sys.stderr
+        sys.stderr= Output()
+        try:
+            for spec, method in [ ( makeSpecs( 1 )[0], "blue" ),
+                                  ( "test.txt", "lsq" ) ]:
+                future= self.__service.submit( spec, method )
+                future.addDoneCallback( fail )
+                future.result( 10.0 )
+            results= self.__client.average( makeSpecs( 2 )[1] )
+            output= sys.stderr.getvalue()
+        finally:
+            sys.stderr= stderr
+        self.assertTrue( "callback failure" in output )
+        self.__compare( results, Blue( StringIO( makeSpecs( 2 )[1]["text"] ) ) )
+        metrics= self.__service.getMetrics()
+        self.assertEqual( metrics["completed"], 3 )
+        self.assertEqual( metrics["inflight"], 0 )
+        return
+
+    def test_metrics( self ):
+        self.__client.averageMany( makeSpecs( 4 ) )
+        metrics= self.__service.getMetrics()
+        self.assertEqual( metrics["completed"], 4 )
+        latency= metrics["latency"]
+        self.assertTrue( 0.0 < latency["p50"] <= latency["p95"] <= latency["max"] )
+        self.assertTrue( metrics["throughput"] > 0.0 )
+        return
+
+
+if __name__ == '__main__':
+    suite= unittest.TestLoader().loadTestsFromTestCase( averageServiceTest )
+    unittest.TextTestRunner( verbosity=2 ).run( suite )
+
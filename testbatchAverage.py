@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+# unit tests for the batch runner
+
+import unittest
+
+import json
+import csv
+from StringIO import StringIO
+
+import batchAverage
+
+
+class batchAverageTest( unittest.TestCase ):
+
+    def test_averageFile( self ):
+        record= batchAverage.averageFile( "test.txt", "blue" )
+        self.assertEqual( record["file"], "test.txt" )
+        self.assertAlmostEqual( record["averages"][0], 170.70919692 )
+        self.assertAlmostEqual( record["errors"]["total"][0], 2.96686159836 )
+        self.assertAlmostEqual( record["chisq"], 0.770025093468 )
+        self.assertEqual( len( record["weights"][0] ), 3 )
+        self.assertTrue( record["time"] >= 0.0 )
+        json.dumps( record )
+        return
+
+    def test_failure( self ):
+        record= batchAverage.averageFile( "test.txt", "nomethod" )
+        self.assertTrue( "ValueError" in record["error"] )
+        return
+
+    def test_runBatch( self ):
+        files= [ "test.txt", "valassi1.txt", "valassi5.txt" ]
+        records= list( batchAverage.runBatch( files, [ "blue", "lsq" ], 
+                                              nprocs=2 ) )
+        self.assertEqual( [ ( record["file"], record["method"] ) 
+                            for record in records ],
+                          [ ( filename, method ) for filename in files
+                            for method in [ "blue", "lsq" ] ] )
+        for blue, lsq in zip( records[::2], records[1::2] ):
+            for average1, average2 in zip( blue["averages"], lsq["averages"] ):
+                self.assertAlmostEqual( average1, average2 )
+        return
+
+    def test_averageAllMethods( self ):
+        records= batchAverage.averageAllMethods( "test.txt", [ "lsq", "blue" ] )
+        self.assertEqual( [ record["method"] for record in records ], 
+                          [ "lsq", "blue" ] )
+        for record in records:
+            self.assertAlmostEqual( record["averages"][0], 170.70919692, 
+                                    places=5 )
+        records= batchAverage.averageAllMethods( "nofile.txt", [ "blue" ] )
+        self.assertTrue( "error" in records[0] )
+        return
+
+    def test_writeRecords( self ):
+        records= list( batchAverage.runBatch( [ "valassi1.txt" ], 
+                                              [ "blue", "nomethod" ] ) )
+        outfile= StringIO()
+        nrecords, nerrors= batchAverage.writeRecords( records, outfile )
+        self.assertEqual( ( nrecords, nerrors ), ( 2, 1 ) )
+        lines= outfile.getvalue().splitlines()
+        self.assertEqual( json.loads( lines[0] )["groups"], [ "a", "b" ] )
+        outfile= StringIO()
+        batchAverage.writeRecords( records, outfile, "csv" )
+        rows= list( csv.DictReader( StringIO( outfile.getvalue() ) ) )
+        self.assertEqual( [ row["group"] for row in rows ], [ "a", "b", "" ] )
+        self.assertTrue( "01stat" in json.loads( rows[0]["errors"] ) )
+        return
+
+
+if __name__ == '__main__':
+    suite= unittest.TestLoader().loadTestsFromTestCase( batchAverageTest )
+    unittest.TextTestRunner( verbosity=2 ).run( suite )
+
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+# unit tests for benchmarks with synthetic inputs
+
+import unittest
+
+import benchmark
+from AverageDataParser import AverageDataParser
+from blue import Blue
+from lsqAverage import lsqAverage
+
+
+class benchmarkTest( unittest.TestCase ):
+
+    def test_makeInput( self ):
+        parser= AverageDataParser( benchmark.makeProblem( 6, nsources=9, 
+                                                          ngroups=2 ) )
+        self.assertEqual( len( parser.getNames() ), 6 )
+        self.assertEqual( len( parser.getErrors() ), 9 )
+        self.assertEqual( sorted( set( parser.getGroups() ) ), [ "g0", "g1" ] )
+        covoptions= parser.getCovoption()
+        self.assertEqual( sorted( covoptions.values() ),
+                          sorted( [ "u" ] + benchmark.covoptionmix ) )
+        self.assertEqual( benchmark.makeInput( 6 ), benchmark.makeInput( 6 ) )
+        return
+
+    def test_backends( self ):
+        covoptions= [ "c", "m", "p", "%u" ]
+        blue= Blue( benchmark.makeProblem( 8, ngroups=2, 
+                                           covoptions=covoptions ) )
+        la= lsqAverage( benchmark.makeProblem( 8, ngroups=2, 
+                                               covoptions=covoptions ) )
+        la.runSolver()
+        bluevalues= blue.calcAverage()
+        lsqvalues, errors= la.getAveragesAndErrors()
+        for ivalue in range( 2 ):
+            self.assertAlmostEqual( bluevalues[ivalue,0], lsqvalues[ivalue] )
+        return
+
+    def test_runBenchmark( self ):
+        records= benchmark.runBenchmark( [ 4 ], backends=[ "blue", "lsq" ],
+                                         lisolate=False )
+        self.assertEqual( len( records ), 2 )
+        for record in records:
+            for stage in [ "parse" ] + benchmark.stages:
+                self.assertTrue( record[stage] >= 0.0 )
+            self.assertTrue( record["covariance"] > 0.0 )
+            self.assertTrue( record["inversion"] > 0.0 )
+        self.assertEqual( benchmark.compareBaseline( records, records ), [] )
+        baseline= [ dict( record ) for record in records ]
+        baseline[0]["solve"]= -1.0
+        regressions= benchmark.compareBaseline( records, baseline )
+        self.assertEqual( len( regressions ), 1 )
+        self.assertEqual( regressions[0]["stage"], "solve" )
+        return
+
+
+if __name__ == '__main__':
+    suite= unittest.TestLoader().loadTestsFromTestCase( benchmarkTest )
+    unittest.TextTestRunner( verbosity=2 ).run( suite )
+
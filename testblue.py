@@ -56,6 +56,51 @@ class blueTest( unittest.TestCase ):
             self.assertAlmostEqual( error, expectedherrors[key] )
         return
 
+    def test_getResults( self ):
+        results= self.__blue.getResults()
+        self.assertEqual( results["names"], [ "Val1", "Val2", "Val3" ] )
+        self.assertAlmostEqual( results["averages"][0], 170.70919692 )
+        self.assertAlmostEqual( results["errors"]["total"][0], 
+                                2.9668615983552984 )
+        self.assertAlmostEqual( results["chisq"], 0.770025093468 )
+        self.assertEqual( results["ndof"], 2 )
+        return
+
+    # Leave-one-out compared with averages of the remaining measurements:
+    def test_leaveOneOut( self ):
+        cov= self.__blue.cov
+        data= self.__blue.data
+        for k, ( name, results ) in enumerate( self.__blue.leaveOneOut() ):
+            self.assertEqual( name, [ "Val1", "Val2", "Val3" ][k] )
+            keep= [ i for i in range( 3 ) if i != k ]
+            inv= cov[keep][:,keep].getI()
+            average= inv.sum( axis=1 ).getT()*data[keep]/inv.sum()
+            self.assertAlmostEqual( results["averages"][0], float( average ) )
+            self.assertAlmostEqual( results["errors"][0], sqrt( 1.0/inv.sum() ) )
+            delta= data[keep] - float( average )
+            self.assertAlmostEqual( results["chisq"], 
+                                    float( delta.getT()*inv*delta ) )
+            self.assertEqual( results["ndof"], 1 )
+        return
+
+    def test_rankImpacts( self ):
+        rankedimpacts= self.__blue.rankImpacts()
+        self.assertEqual( [ key for key, impact in rankedimpacts ],
+                          [ "03err3", "04err4", "01err1", "02err2", "00stat" ] )
+        key, impact= rankedimpacts[0]
+        self.assertAlmostEqual( impact["removal"]["averages"][0], 169.88556368 )
+        self.assertAlmostEqual( impact["removal"]["errorchanges"][0], -1.5646, 4 )
+        self.assertAlmostEqual( impact["decorrelation"]["shifts"][0], 1.1360, 4 )
+        return
+
+    def test_lazyImports( self ):
+        import subprocess, sys
+        command= ( "import sys, blue; "
+                   "print 'ROOT' in sys.modules, 'ConstrainedFit' in sys.modules" )
+        output= subprocess.check_output( [ sys.executable, "-c", command ] )
+        self.assertEqual( output, "False False\n" )
+        return
+
     def test_printResults( self ):
         import StringIO, sys
         output= StringIO.StringIO()
@@ -114,6 +159,101 @@ Error composition:\n\
         return
 
 
+class blueFactoredTest( unittest.TestCase ):
+
+    # Woodbury results compared with the dense inverse:
+    def test_factored( self ):
+        blue= Blue( "testOptions.txt" )
+        self.assertTrue( blue.dataparser.getFactoredCovariance() is not None )
+        herrors, wm= blue.errorAnalysis()
+        inv= blue.cov.getI()
+        gm= blue.groupmatrix
+        densewm= ( gm.getT()*inv*gm ).getI()*gm.getT()*inv
+        for weight, denseweight in zip( wm.flat, densewm.flat ):
+            self.assertAlmostEqual( weight, denseweight )
+        delta= blue.data - gm*densewm*blue.data
+        self.assertAlmostEqual( float( blue.calcChisq() ), 
+                                float( delta.getT()*inv*delta ) )
+        for key in blue.hcov.keys() + [ "total" ]:
+            if key == "total":
+                cov= blue.cov
+            else:
+                cov= blue.hcov[key]
+            self.assertAlmostEqual( float( herrors[key] ), 
+                                    float( densewm*cov*densewm.getT() ) )
+        return
+
+    # Zero errors in "gpr" sources, Woodbury and dense inverse agree:
+    def test_factoredZeroErrors( self ):
+        from StringIO import StringIO
+        from testAverageDataParser import zeroerrorinput
+        blue= Blue( StringIO( zeroerrorinput ) )
+        self.assertTrue( blue.dataparser.getFactoredCovariance() is not None )
+        wm= blue.calcWeightsMatrix()
+        inv= blue.cov.getI()
+        gm= blue.groupmatrix
+        densewm= ( gm.getT()*inv*gm ).getI()*gm.getT()*inv
+        for weight, denseweight in zip( wm.flat, densewm.flat ):
+            self.assertAlmostEqual( weight, denseweight )
+        delta= blue.data - gm*densewm*blue.data
+        self.assertAlmostEqual( float( blue.calcChisq() ), 
+                                float( delta.getT()*inv*delta ) )
+        return
+
+    def test_large( self ):
+        import benchmark
+        blue= Blue( benchmark.makeProblem( 2000, ngroups=2, 
+                                           covoptions=[ "f", "gp", "gpr" ] ) )
+        herrors, wm= blue.errorAnalysis()
+        self.assertEqual( wm.shape, ( 2, 2000 ) )
+        for iavg in range( 2 ):
+            self.assertAlmostEqual( wm[iavg].sum(), 1.0 )
+        self.assertTrue( blue.dataparser._AverageDataParser__hcov is None )
+        return
+
+    # Independent sub-problems inverted blockwise:
+    def test_components( self ):
+        blue= Blue( "valassi2.txt", nprocs=2 )
+        self.assertEqual( blue.getComponents(), [ [ 0, 1 ], [ 2, 3 ] ] )
+        inv= blue.cov.getI()
+        for element, expected in zip( blue.inv.flat, inv.flat ):
+            self.assertAlmostEqual( element, expected )
+        self.assertEqual( blue.inv[0,2], 0.0 )
+        return
+
+    # Worker pools, impacts and downdates are imported when used:
+    def test_lazyImports( self ):
+        import subprocess, sys
+        command= ( "import sys; from blue import Blue; " +
+                   "Blue( 'test.txt' ).calcAverage(); " +
+                   "print sorted( set( [ 'multiprocessing', 'parallel', " +
+                   "'impacts', 'downdates' ] ) & set( sys.modules ) )" )
+        output= subprocess.check_output( [ sys.executable, "-c", command ] )
+        self.assertEqual( output.strip(), "[]" )
+        return
+
+    # Batch with dense inverses calculated together:
+    def test_makeBlueBatch( self ):
+        import benchmark
+        from numpy import allclose
+        from StringIO import StringIO
+        from blue import makeBlueBatch
+        from averageProblem import AverageProblem
+        texts= [ benchmark.makeInput( 6, ngroups=2, seed=seed ) 
+                 for seed in range( 3 ) ]
+        blues= makeBlueBatch( [ AverageProblem( StringIO( text ) ) 
+                                for text in texts ] )
+        for blue, text in zip( blues, texts ):
+            expected= Blue( StringIO( text ) ).getResults()
+            results= blue.getResults()
+            for key in [ "averages", "chisq", "weights" ]:
+                self.assertTrue( allclose( results[key], expected[key] ) )
+            for key in expected["errors"]:
+                self.assertTrue( allclose( results["errors"][key], 
+                                           expected["errors"][key] ) )
+        return
+
+
 class blueValassiTest( unittest.TestCase ):
 
     def __getprintResults( self, bluesolver ):
@@ -302,6 +442,8 @@ Error composition:\n\
 if __name__ == '__main__':
     suite1= unittest.TestLoader().loadTestsFromTestCase( blueTest )
     suite2= unittest.TestLoader().loadTestsFromTestCase( blueValassiTest )
+    suite3= unittest.TestLoader().loadTestsFromTestCase( blueFactoredTest )
     unittest.TextTestRunner( verbosity=2 ).run( suite1 )
     unittest.TextTestRunner( verbosity=2 ).run( suite2 )
+    unittest.TextTestRunner( verbosity=2 ).run( suite3 )
 
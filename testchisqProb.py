@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+
+# unit tests for chi^2 probability
+
+import unittest
+
+from chisqProb import chisqProb
+
+
+class chisqProbTest( unittest.TestCase ):
+
+    def test_twoDof( self ):
+        # For two degrees of freedom P(chi^2) = exp(-chi^2/2):
+        from math import exp
+        for chisq in [ 0.1, 0.77, 2.0, 6.07, 30.0 ]:
+            self.assertAlmostEqual( chisqProb( chisq, 2 ), exp( -chisq/2.0 ) )
+        return
+
+    def test_values( self ):
+        expectedvalues= [ ( 1.0, 1, 0.31731050786291115 ),
+                          ( 3.84, 1, 0.05004352124870519 ),
+                          ( 10.0, 5, 0.07523524614651217 ),
+                          ( 120.0, 100, 0.08440668109369177 ),
+                          ( 50.0, 100, 0.9999930466947524 ) ]
+        for chisq, ndof, expectedvalue in expectedvalues:
+            self.assertAlmostEqual( chisqProb( chisq, ndof ), expectedvalue )
+        return
+
+    def test_limits( self ):
+        self.assertEqual( chisqProb( 0.0, 3 ), 1.0 )
+        self.assertEqual( chisqProb( 1.0, 0 ), 0.0 )
+        self.assertEqual( chisqProb( -1.0, 3 ), 0.0 )
+        return
+
+
+if __name__ == '__main__':
+    suite= unittest.TestLoader().loadTestsFromTestCase( chisqProbTest )
+    unittest.TextTestRunner( verbosity=2 ).run( suite )
+
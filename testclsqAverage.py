@@ -5,13 +5,14 @@
 
 import unittest
 
-from clsqAverage import clsqAverage
+from clsqAverage import clsqAverage, NuisanceLoadings, FitAverageError
+from numpy import array
 
 
 class clsqAverageTest( unittest.TestCase ):
 
     def setUp( self ):
-        self.__ca= clsqAverage( "test.txt" )
+        self.__ca= clsqAverage( "test.txt", lfastlinear=False )
         self.__ca.runSolver()
         return
 
@@ -59,8 +60,152 @@ class clsqAverageTest( unittest.TestCase ):
             self.assertAlmostEqual( weight, expectedWeight )
         return
 
+    # Analytic Jacobians against finite differences of the constraints,
+    # with multiplicative errors:
+    def test_constraintJacobians( self ):
+        ca= clsqAverage( "testOptions.txt" )
+        mpar= array( [ 171.0, 173.5, 174.0, 0.5, -0.3, 0.8 ] )
+        upar= array( [ 172.0 ] )
+        mparjacobian, uparjacobian= ca.getConstraintJacobians( mpar, upar )
+        constraints= ca.calcConstraints( mpar, upar )
+        step= 1.0e-6
+        for ipar in range( len( mpar ) ):
+            mparstep= mpar.copy()
+            mparstep[ipar]+= step
+            derivatives= ( ca.calcConstraints( mparstep, upar ) - constraints )/step
+            for icon in range( len( constraints ) ):
+                self.assertAlmostEqual( mparjacobian[icon,ipar], 
+                                        derivatives[icon], places=5 )
+        derivatives= ( ca.calcConstraints( mpar, upar+step ) - constraints )/step
+        for icon in range( len( constraints ) ):
+            self.assertAlmostEqual( uparjacobian[icon,0], derivatives[icon],
+                                    places=5 )
+        return
+
+    # The solver uses the analytic Jacobians, one constraint evaluation
+    # per iteration:
+    def test_analyticConstraints( self ):
+        ca= clsqAverage( "testOptions.txt" )
+        solver= ca.getSolver()
+        mpar= solver.getDatav()
+        upar= array( [ [ 172.0 ] ] )
+        counter= ca.getEvaluationCounter()
+        ncalls= counter.getNcalls()
+        constraints, mparjacobian, uparjacobian= solver.constraints.derivatives( 
+            mpar, upar )
+        self.assertEqual( counter.getNcalls() - ncalls, 1 )
+        expected= ca.getConstraintJacobians( mpar, upar )
+        self.assertTrue( ( mparjacobian == expected[0] ).all() )
+        self.assertTrue( ( uparjacobian == expected[1] ).all() )
+        return
+
+    def test_fastLinear( self ):
+        ca= clsqAverage( "test.txt" )
+        ca.runSolver()
+        val, error= ca.getAveragesAndErrors()
+        self.assertAlmostEqual( val[0], 170.709196921 )
+        self.assertAlmostEqual( error[0], 2.9668615985 )
+        solver= ca.getSolver()
+        self.assertEqual( solver.getNiterations(), 1 )
+        expectedmpars= [ 171.51710348441537, 172.29268242120295, 
+                         172.55882080482172, 
+                         -0.24715555753633961, -0.41819040151052728 ]
+        expectedmparerrors= [ 2.6568482263780098, 2.9263187806182231, 
+                              3.1214377706098424, 
+                              0.95849417709990359, 0.81760662703871312 ]
+        for par, expectedpar in zip( solver.getMpars(), expectedmpars ):
+            self.assertAlmostEqual( par, expectedpar )
+        for err, expectederr in zip( solver.getMparErrors(), 
+                                     expectedmparerrors ):
+            self.assertAlmostEqual( err, expectederr )
+        self.assertAlmostEqual( ca.calcChisq(), 0.77002509362026528 )
+        self.assertEqual( solver.getNdof(), 2 )
+        expectedWeights= [ 1.3390306603764943, 
+                           -0.16163492965394771, 
+                           -0.17739573072419634 ]
+        for weight, expectedWeight in zip( ca.calcWeightsMatrix().flat, 
+                                           expectedWeights ):
+            self.assertAlmostEqual( weight, expectedWeight )
+        return
+
+    def test_minosErrorsAndScans( self ):
+        self.assertRaises( FitAverageError, self.__ca.calcMinosErrors )
+        self.assertRaises( FitAverageError, self.__ca.profileScan, 0,
+                           [ 170.0, 171.0 ] )
+        self.assertRaises( FitAverageError, self.__ca.profileScan2D, 0,
+                           [ 170.0, 171.0 ], 1, [ 0.0, 1.0 ] )
+        ca= clsqAverage( "test.txt" )
+        eminus, eplus= ca.calcMinosErrors()[0]
+        self.assertAlmostEqual( eplus, 2.9668615985 )
+        values, chisqs= ca.profileScan( 0, [ 170.709196921 + 2.9668615985 ] )
+        self.assertAlmostEqual( chisqs[0], 1.77002509362026528 )
+        return
+
+    def test_blueStart( self ):
+        ca= clsqAverage( "test.txt", lfastlinear=False, lbluestart=True )
+        startvalues= ca.getStartValues()
+        self.assertAlmostEqual( startvalues[0], 170.709196921 )
+        self.assertEqual( startvalues[1:], [ 0.0, 0.0 ] )
+        ca.runSolver()
+        val, error= ca.getAveragesAndErrors()
+        self.assertAlmostEqual( val[0], 170.709196921 )
+        return
+
+
+class NuisanceLoadingsTest( unittest.TestCase ):
+
+    def setUp( self ):
+        # Additive source 0 for all values, multiplicative source 1
+        # for the first two values:
+        parindxmaps= { 0: { 0: 0, 1: 0, 2: 0 }, 1: { 0: 1, 1: 1 } }
+        errorkeys= [ "01erra", "02errb" ]
+        hcovopt= { "01erra": "f", "02errb": "gpr" }
+        systerrormatrix= { 0: [ 1.0, 2.0, 3.0 ], 1: [ 0.5, 0.5 ] }
+        self.__loadings= NuisanceLoadings( parindxmaps, errorkeys, hcovopt,
+                                           systerrormatrix, 3, 2 )
+        return
+
+    def test_isLinear( self ):
+        self.assertFalse( self.__loadings.isLinear() )
+        return
+
+    def test_calcScaleAndShifts( self ):
+        extrapar= array( [ 0.2, 0.4 ] )
+        reference= array( [ 10.0, 20.0, 30.0 ] )
+        scale, shifts= self.__loadings.calcScaleAndShifts( extrapar, 
+                                                           reference )
+        expectedscale= [ 1.0/1.02, 1.0/1.01, 1.0 ]
+        expectedshifts= [ 0.2/1.02, 0.4/1.01, 0.6 ]
+        for value, expectedvalue in zip( scale, expectedscale ):
+            self.assertAlmostEqual( value, expectedvalue )
+        for value, expectedvalue in zip( shifts, expectedshifts ):
+            self.assertAlmostEqual( value, expectedvalue )
+        return
+
+    def test_calcDerivatives( self ):
+        extrapar= array( [ 0.2, 0.4 ] )
+        reference= array( [ 10.0, 20.0, 30.0 ] )
+        dscale, dshifts= self.__loadings.calcDerivatives( extrapar, 
+                                                          reference )
+        eps= 1.0e-7
+        scale, shifts= self.__loadings.calcScaleAndShifts( extrapar, 
+                                                           reference )
+        for ipar in range( 2 ):
+            shiftedpar= extrapar.copy()
+            shiftedpar[ipar]+= eps
+            scale2, shifts2= self.__loadings.calcScaleAndShifts( shiftedpar, 
+                                                                 reference )
+            for ival in range( 3 ):
+                self.assertAlmostEqual( dscale[ival,ipar], 
+                                        (scale2-scale)[ival]/eps, places=5 )
+                self.assertAlmostEqual( dshifts[ival,ipar], 
+                                        (shifts2-shifts)[ival]/eps, places=5 )
+        return
+
 
 if __name__ == '__main__':
-    suite= unittest.TestLoader().loadTestsFromTestCase( clsqAverageTest )
-    unittest.TextTestRunner( verbosity=2 ).run( suite )
+    suite1= unittest.TestLoader().loadTestsFromTestCase( clsqAverageTest )
+    suite2= unittest.TestLoader().loadTestsFromTestCase( NuisanceLoadingsTest )
+    unittest.TextTestRunner( verbosity=2 ).run( suite1 )
+    unittest.TextTestRunner( verbosity=2 ).run( suite2 )
 
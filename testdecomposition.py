@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+
+# unit tests for the decomposition into independent sub-problems
+
+import unittest
+
+from numpy import matrix, identity, linalg
+
+from decomposition import findComponents, invertBlockDiagonal
+from AverageDataParser import AverageDataParser
+
+
+class decompositionTest( unittest.TestCase ):
+
+    def test_findComponents( self ):
+        cov= matrix( identity( 5 ) )
+        cov[0,3]= cov[3,0]= 0.5
+        components= findComponents( { "stat": cov }, 
+                                    [ "a", "b", "c", "d", "b" ] )
+        self.assertEqual( components, [ [ 0, 3 ], [ 1, 4 ], [ 2 ] ] )
+        return
+
+    def test_valassi( self ):
+        for filename, expected in [ ( "valassi1.txt", [ [ 0, 1 ], [ 2, 3 ] ] ),
+                                    ( "valassi3.txt", [ [ 0, 1, 2, 3 ] ] ),
+                                    ( "test.txt", [ [ 0, 1, 2 ] ] ) ]:
+            parser= AverageDataParser( filename )
+            components= findComponents( parser.getCovariances(), 
+                                        parser.getGroups() )
+            self.assertEqual( components, expected )
+        return
+
+    def test_invertBlockDiagonal( self ):
+        parser= AverageDataParser( "valassi1.txt" )
+        cov= parser.getTotalCovariance()
+        components= findComponents( parser.getCovariances(), 
+                                    parser.getGroups() )
+        for nprocs in [ 1, 2 ]:
+            inv= invertBlockDiagonal( cov, components, nprocs )
+            for element, expected in zip( inv.flat, linalg.inv( cov ).flat ):
+                self.assertAlmostEqual( element, expected )
+        return
+
+
+if __name__ == '__main__':
+    suite= unittest.TestLoader().loadTestsFromTestCase( decompositionTest )
+    unittest.TextTestRunner( verbosity=2 ).run( suite )
+
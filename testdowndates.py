@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+# unit tests for leave-one-out with rank-one downdates
+
+import unittest
+
+from numpy import random, identity, zeros, delete, ix_, sqrt, diagonal, linalg
+
+from downdates import leaveOneOut
+
+
+class downdatesTest( unittest.TestCase ):
+
+    # Random problem with two averages, group b has one measurement:
+    def setUp( self ):
+        generator= random.RandomState( 1 )
+        ndata= 6
+        factors= generator.normal( size=(ndata,2) )
+        self.__cov= identity( ndata ) + factors.dot( factors.T )
+        self.__gm= zeros( shape=(ndata,2) )
+        self.__gm[:5,0]= 1.0
+        self.__gm[5,1]= 1.0
+        self.__values= generator.normal( size=ndata )
+        return
+
+    def __solve( self, cov, gm, values ):
+        pinv= linalg.inv( cov )
+        ainv= linalg.inv( gm.T.dot( pinv ).dot( gm ) )
+        weights= ainv.dot( gm.T ).dot( pinv )
+        averages= weights.dot( values )
+        residuals= values - gm.dot( averages )
+        return pinv, ainv, weights, averages, residuals, residuals.dot( pinv ).dot( residuals )
+
+    def test_leaveOneOut( self ):
+        cov, gm, values= self.__cov, self.__gm, self.__values
+        pinv, ainv, weights, averages, residuals, chisq= self.__solve( cov, gm, values )
+        resultslist= leaveOneOut( pinv, gm, residuals, averages, chisq )
+        self.assertEqual( len( resultslist ), 6 )
+        self.assertTrue( resultslist[5] is None )
+        for k, results in enumerate( resultslist[:5] ):
+            keep= [ i for i in range( 6 ) if i != k ]
+            solution= self.__solve( cov[ix_( keep, keep )], gm[keep], values[keep] )
+            pinvk, ainvk, weightsk, averagesk, residualsk, chisqk= solution
+            for average, expected in zip( results["averages"], averagesk ):
+                self.assertAlmostEqual( average, expected )
+            for error, expected in zip( results["errors"], sqrt( diagonal( ainvk ) ) ):
+                self.assertAlmostEqual( error, expected )
+            self.assertAlmostEqual( results["chisq"], chisqk )
+            self.assertEqual( results["ndof"], 3 )
+            self.assertEqual( list( results["weights"][:,k] ), [ 0.0, 0.0 ] )
+            for weight, expected in zip( delete( results["weights"], k, 1 ).flat,
+                                         weightsk.flat ):
+                self.assertAlmostEqual( weight, expected )
+        return
+
+
+if __name__ == '__main__':
+    suite= unittest.TestLoader().loadTestsFromTestCase( downdatesTest )
+    unittest.TextTestRunner( verbosity=2 ).run( suite )
+
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+# unit tests for the impacts of error sources
+
+import unittest
+
+from numpy import asarray, diag, linalg, sqrt, diagonal
+
+import impacts
+import benchmark
+from AverageDataParser import AverageDataParser
+
+
+class impactsTest( unittest.TestCase ):
+
+    # Solutions with the changed covariance matrices:
+    def __compare( self, parser, reference, himpacts ):
+        values= asarray( parser.getValues() )
+        gm= asarray( parser.getGroupMatrix(), dtype=float )
+        hcov= parser.getCovariances()
+        cov= asarray( parser.getTotalCovariance() )
+        self.assertEqual( sorted( himpacts.keys() ), sorted( hcov.keys() ) )
+        methods= set()
+        for key, sourceimpacts in himpacts.items():
+            sourcecov= asarray( hcov[key] )
+            for mode, newcov in [ ( "removal", cov - sourcecov ),
+                                  ( "decorrelation", cov - sourcecov + 
+                                    diag( diagonal( sourcecov ) ) ) ]:
+                impact= sourceimpacts[mode]
+                methods.add( impact["method"] )
+                vinv= linalg.inv( newcov )
+                ainv= linalg.inv( gm.T.dot( vinv ).dot( gm ) )
+                averages= ainv.dot( gm.T ).dot( vinv ).dot( values )
+                residuals= values - gm.dot( averages )
+                for average, expected in zip( impact["averages"], averages ):
+                    self.assertAlmostEqual( average, expected )
+                for error, expected in zip( impact["errors"], 
+                                            sqrt( diagonal( ainv ) ) ):
+                    self.assertAlmostEqual( error, expected )
+                self.assertAlmostEqual( impact["chisq"], 
+                                        residuals.dot( vinv ).dot( residuals ) )
+                for shift, average, refaverage in zip( impact["shifts"], 
+                                                       averages, reference[0] ):
+                    self.assertAlmostEqual( shift, average - refaverage )
+        return methods
+
+    def test_dense( self ):
+        problem= benchmark.makeProblem( 40, nsources=5, ngroups=2,
+                                        covoptions=[ "p", "f", "gp", "u" ] )
+        parser= AverageDataParser( problem )
+        cov= parser.getTotalCovariance()
+        factorisations= parser.getSourceFactorisations()
+        reference, himpacts= impacts.calcDenseImpacts( parser.getValues(),
+                                                       parser.getGroupMatrix(),
+                                                       cov, linalg.inv( cov ),
+                                                       parser.getCovariances(),
+                                                       factorisations )
+        methods= self.__compare( parser, reference, himpacts )
+        self.assertEqual( methods, set( [ "lowrank", "direct" ] ) )
+        return
+
+    def test_factored( self ):
+        problem= benchmark.makeProblem( 40, nsources=4,
+                                        covoptions=[ "f", "gp", "gpr" ] )
+        parser= AverageDataParser( problem )
+        hdiagonals, hfactors= parser.getFactoredCovariance()
+        reference, himpacts= impacts.calcFactoredImpacts( parser.getValues(),
+                                                          parser.getGroupMatrix(),
+                                                          hdiagonals, hfactors )
+        methods= self.__compare( parser, reference, himpacts )
+        self.assertEqual( methods, set( [ "woodbury" ] ) )
+        return
+
+    def test_sortImpacts( self ):
+        himpacts= {}
+        for key, shift in [ ( "a", 0.1 ), ( "b", -0.5 ), ( "c", 0.2 ) ]:
+            removal= { "shifts": asarray( [ shift ] ),
+                       "errorchanges": asarray( [ 0.0 ] ) }
+            himpacts[key]= { "removal": removal }
+        himpacts["d"]= { "removal": None }
+        keys= [ key for key, impact in impacts.sortImpacts( himpacts ) ]
+        self.assertEqual( keys, [ "d", "b", "c", "a" ] )
+        return
+
+
+if __name__ == '__main__':
+    suite= unittest.TestLoader().loadTestsFromTestCase( impactsTest )
+    unittest.TextTestRunner( verbosity=2 ).run( suite )
+
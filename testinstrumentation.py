@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+# unit tests for instrumentation of the averaging pipeline
+
+import unittest
+
+import instrumentation
+from blue import Blue
+
+
+class instrumentationTest( unittest.TestCase ):
+
+    def setUp( self ):
+        instrumentation.resetStats()
+        return
+
+    def tearDown( self ):
+        instrumentation.disable()
+        instrumentation.resetStats()
+        return
+
+    def test_disabled( self ):
+        self.assertFalse( instrumentation.isEnabled() )
+        Blue( "test.txt" ).errorAnalysis()
+        self.assertEqual( instrumentation.getStats(), {} )
+        return
+
+    def test_pipeline( self ):
+        instrumentation.enable()
+        blue= Blue( "test.txt" )
+        blue.errorAnalysis()
+        blue.calcAverage()
+        stats= instrumentation.getStats()
+        for name in [ "AverageDataParser.read", 
+                      "AverageDataParser.makeCovariances",
+                      "Blue.inversion", "Average.errorAnalysis" ]:
+            self.assertEqual( stats[name]["calls"], 1 )
+            self.assertTrue( stats[name]["time"] >= 0.0 )
+            self.assertTrue( stats[name]["memory"] >= 0 )
+        self.assertEqual( stats["Blue.calcWeightsMatrix"]["calls"], 2 )
+        stats["Blue.inversion"]["calls"]= 0
+        self.assertEqual( instrumentation.getStats()["Blue.inversion"]["calls"], 
+                          1 )
+        instrumentation.resetStats()
+        self.assertEqual( instrumentation.getStats(), {} )
+        return
+
+    def test_span( self ):
+        instrumentation.enable()
+        def fail():
+            with instrumentation.span( "fail" ):
+                raise ValueError( "test" )
+        self.assertRaises( ValueError, fail )
+        self.assertEqual( instrumentation.getStats()["fail"]["calls"], 1 )
+        return
+
+    def test_evaluationCounter( self ):
+        counter= instrumentation.EvaluationCounter()
+        function= counter.count( lambda x, y: x + y )
+        self.assertEqual( function( 1, 2 ), 3 )
+        counter.record( 2.0e-3 )
+        counter.record( 5.0 )
+        self.assertEqual( counter.getNcalls(), 3 )
+        self.assertTrue( counter.getTime() >= 5.002 )
+        histogram= counter.getHistogram()
+        self.assertEqual( histogram[4], ( 1.0e-2, 1 ) )
+        self.assertEqual( histogram[-1], ( None, 1 ) )
+        self.assertEqual( sum( [ ncalls for edge, ncalls in histogram ] ), 3 )
+        counter.reset()
+        self.assertEqual( counter.getNcalls(), 0 )
+        self.assertEqual( counter.getMeanTime(), 0.0 )
+        return
+
+
+if __name__ == '__main__':
+    suite= unittest.TestLoader().loadTestsFromTestCase( instrumentationTest )
+    unittest.TextTestRunner( verbosity=2 ).run( suite )
+
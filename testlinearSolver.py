@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+# unit tests for closed-form linear least squares solver
+
+import unittest
+
+from numpy import array, zeros, identity
+
+import linearSolver
+
+
+class linearSolverTest( unittest.TestCase ):
+
+    def setUp( self ):
+
+        mtop= array( [ 171.5, 173.1, 174.5 ] )
+        stat= array( [   0.3,   0.33,  0.4 ] )
+        errs= array( [ [ 1.1, 0.9, 2.4 ],
+                       [ 1.3, 1.5, 3.1 ],
+                       [ 1.5, 1.9, 3.5 ] ] )
+        self.__mtop= mtop
+
+        def resfun( par ):
+            terms= ( mtop - par[0] + errs.dot( par[1:] ) )/stat
+            return array( list( terms ) + list( par[1:] ) )
+
+        def jacfun( par ):
+            jacobian= array( 6*[ 4*[ 0.0 ] ] )
+            jacobian[:3,0]= -1.0/stat
+            jacobian[:3,1:]= errs/stat[:,None]
+            for ipar in range( 3 ):
+                jacobian[3+ipar,1+ipar]= 1.0
+            return jacobian
+        self.__resfun= resfun
+
+        datajacobian= zeros( shape=(6,3) )
+        datajacobian[:3]= identity( 3 )/stat[:,None]
+
+        pars= [ 172.0, 0.0, 0.0, 0.0 ]
+        parerrors= [ 2.0, 1.0, 1.0, 1.0 ]
+        parnames= [ "average", "pa", "pb", "pc" ]
+        ndof= 2
+        self.__solver= linearSolver.linearSolver( resfun, jacfun, datajacobian,
+                                                  pars, parerrors, parnames,
+                                                  ndof )
+        return
+
+    def test_solve( self ):
+        self.__solver.solve()
+        self.assertTrue( self.__solver.hasConverged() )
+        self.assertEqual( self.__solver.getNiterations(), 1 )
+        return
+
+    def test_getChisq( self ):
+        self.__solver.solve()
+        chisq= self.__solver.getChisq()
+        expectedchisq= 3.58037721
+        self.assertAlmostEqual( chisq, expectedchisq )
+        return
+
+    def test_getPar( self ):
+        self.__solver.solve()
+        pars= self.__solver.getPars()
+        expectedpars= [ 167.1022776, -0.48923998, -1.13417736, 
+                        -1.21202615 ]
+        for par, expectedpar in zip( pars, expectedpars ):
+            self.assertAlmostEqual( par, expectedpar, places=6 )
+        return
+
+    def test_getParErrors( self ):
+        self.__solver.solve()
+        parerrors= self.__solver.getParErrors()
+        expectedparerrors= [ 1.4395944, 0.96551507, 0.78581713, 0.72292831 ]
+        for parerror, expectedparerror in zip( parerrors, expectedparerrors ):
+            self.assertAlmostEqual( parerror, expectedparerror, places=6 )
+        eminus, eplus= self.__solver.getMinosErrors( 0 )
+        self.assertAlmostEqual( eminus, -expectedparerrors[0], places=6 )
+        self.assertAlmostEqual( eplus, expectedparerrors[0], places=6 )
+        return
+
+    def test_getWeightsMatrix( self ):
+        self.__solver.solve()
+        weights= self.__solver.getWeightsMatrix()
+        self.assertAlmostEqual( weights[0].sum(), 1.0 )
+        self.assertAlmostEqual( weights[0].dot( self.__mtop ),
+                                self.__solver.getPars()[0] )
+        return
+
+    def test_fixPar( self ):
+        self.__solver.solve()
+        chisq= self.__solver.getChisq()
+        average, error= self.__solver.getPars()[0], self.__solver.getParErrors()[0]
+        self.__solver.fixPar( 0, average + error )
+        self.__solver.solve()
+        self.assertAlmostEqual( self.__solver.getChisq() - chisq, 1.0 )
+        self.assertEqual( self.__solver.getParErrors()[0], 0.0 )
+        self.__solver.releasePar( 0 )
+        self.__solver.solve()
+        self.assertAlmostEqual( self.__solver.getChisq(), chisq )
+        return
+
+
+if __name__ == '__main__':
+    suite= unittest.TestLoader().loadTestsFromTestCase( linearSolverTest )
+    unittest.TextTestRunner( verbosity=2 ).run( suite )
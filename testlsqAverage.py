@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+
+# unit tests for numpy least squares averages
+
+import unittest
+
+from lsqAverage import lsqAverage
+from clsqAverage import profileInterval
+from numpy import linspace
+
+
+class lsqAverageTest( unittest.TestCase ):
+
+    def setUp( self ):
+        self.__la= lsqAverage( "test.txt", lfastlinear=False )
+        self.__la.runSolver()
+        return
+
+    def test_getAveragesAndErrors( self ):
+        val, error= self.__la.getAveragesAndErrors()
+        expectedval= 170.709196921
+        expectederror= 2.9668615985
+        self.assertAlmostEqual( val[0], expectedval )
+        self.assertAlmostEqual( error[0], expectederror )
+        return
+
+    def test_fitpars( self ):
+        solver= self.__la.getSolver()
+        chisq= solver.getChisq()
+        ndof= solver.getNdof()
+        expectedchisq= 0.77002509
+        expectedndof= 2
+        self.assertAlmostEqual( chisq, expectedchisq )
+        self.assertEqual( ndof, expectedndof )
+        return
+
+    def test_weights( self ):
+        weightsMatrix= self.__la.calcWeightsMatrix()
+        weightsList= [ weight for weight in weightsMatrix.flat ]
+        expectedWeights= [ 1.33903066, -0.16163493, -0.17739573 ]
+        for weight, expectedWeight in zip( weightsList, expectedWeights ):
+            self.assertAlmostEqual( weight, expectedWeight )
+        return
+
+    def test_solveHistory( self ):
+        history= self.__la.getSolveHistory()
+        self.assertEqual( len( history ), 1 )
+        record= history[0]
+        self.assertTrue( record["converged"] )
+        self.assertTrue( record["niterations"] > 0 )
+        counter= self.__la.getEvaluationCounter()
+        self.assertTrue( 0 < record["nevaluations"] <= counter.getNcalls() )
+        self.__la.calcWeightsMatrix()
+        self.assertEqual( len( self.__la.getSolveHistory() ), 7 )
+        return
+
+    def test_minosErrors( self ):
+        minoserrors= self.__la.calcMinosErrors( nprocs=2 )
+        eminus, eplus= minoserrors[0]
+        self.assertAlmostEqual( eminus, -2.9668615985, places=3 )
+        self.assertAlmostEqual( eplus, 2.9668615985, places=3 )
+        val, error= self.__la.getAveragesAndErrors()
+        self.assertAlmostEqual( val[0], 170.709196921 )
+        results= self.__la.getResults()
+        self.assertEqual( results["minoserrors"].keys(), [ "Average" ] )
+        return
+
+    def test_profileScan( self ):
+        values, chisqs= self.__la.profileScan( 0, linspace( 160.0, 180.0, 41 ),
+                                               nprocs=2 )
+        self.assertEqual( chisqs.shape, ( 41, ) )
+        self.assertAlmostEqual( min( chisqs ), 0.77002509, places=1 )
+        lower, upper= profileInterval( values, chisqs )
+        self.assertAlmostEqual( lower, 170.709196921 - 2.9668615985, places=1 )
+        self.assertAlmostEqual( upper, 170.709196921 + 2.9668615985, places=1 )
+        values1, chisqs1= self.__la.profileScan( 0, values[::4] )
+        for chisq1, chisq in zip( chisqs1, chisqs[::4] ):
+            self.assertAlmostEqual( chisq1, chisq )
+        self.assertEqual( profileInterval( values[19:24], chisqs[19:24] ), 
+                          ( None, None ) )
+        val, error= self.__la.getAveragesAndErrors()
+        self.assertAlmostEqual( val[0], 170.709196921 )
+        return
+
+    def test_profileScan2D( self ):
+        values1, values2, chisqm= self.__la.profileScan2D( 0, [ 168.0, 172.0 ],
+                                                           1, [ -1.0, 0.0, 1.0 ],
+                                                           nprocs=2 )
+        self.assertEqual( chisqm.shape, ( 2, 3 ) )
+        self.assertTrue( chisqm.min() > 0.77002509 )
+        values, chisqs= self.__la.profileScan( 1, values2 )
+        self.assertTrue( all( chisqs <= chisqm.min( axis=0 ) + 1.0e-6 ) )
+        return
+
+    # Linear response of the fit same as BLUE without "r" errors:
+    def test_leaveOneOut( self ):
+        from blue import Blue
+        expected= Blue( "test.txt" ).leaveOneOut()
+        for ( name, results ), ( expectedname, expectedresults ) in zip( 
+            self.__la.leaveOneOut(), expected ):
+            self.assertEqual( name, expectedname )
+            for key in [ "averages", "errors" ]:
+                self.assertAlmostEqual( results[key][0], 
+                                        expectedresults[key][0], places=5 )
+            self.assertAlmostEqual( results["chisq"], expectedresults["chisq"],
+                                    places=5 )
+        return
+
+    def test_fastLinear( self ):
+        self.assertFalse( hasattr( self.__la.getSolver(), "getWeightsMatrix" ) )
+        la= lsqAverage( "test.txt" )
+        la.runSolver()
+        val, error= la.getAveragesAndErrors()
+        self.assertAlmostEqual( val[0], 170.709196921 )
+        self.assertAlmostEqual( error[0], 2.9668615985 )
+        self.assertAlmostEqual( la.calcChisq(), 0.77002509 )
+        weightsMatrix= la.calcWeightsMatrix()
+        expectedWeights= [ 1.33903066, -0.16163493, -0.17739573 ]
+        for weight, expectedWeight in zip( weightsMatrix.flat, expectedWeights ):
+            self.assertAlmostEqual( weight, expectedWeight )
+        self.assertEqual( len( la.getSolveHistory() ), 1 )
+        eminus, eplus= la.calcMinosErrors()[0]
+        self.assertAlmostEqual( eplus, 2.9668615985 )
+        values, chisqs= la.profileScan( 0, [ val[0] - error[0], val[0], 
+                                             val[0] + error[0] ] )
+        for chisq, expectedchisq in zip( chisqs, [ 1.77002509, 0.77002509,
+                                                   1.77002509 ] ):
+            self.assertAlmostEqual( chisq, expectedchisq )
+        return
+
+    def test_blueStart( self ):
+        la= lsqAverage( "test.txt", lfastlinear=False, lbluestart=True )
+        startvalues= la.getStartValues()
+        self.assertAlmostEqual( startvalues[0], 170.709196921 )
+        la.runSolver()
+        for startvalue, par in zip( startvalues, la.getSolver().getPars() ):
+            self.assertAlmostEqual( startvalue, par )
+        self.assertEqual( la.getSolveHistory()[-1]["niterations"], 1 )
+        comparison= la.compareStartValues()
+        self.assertEqual( comparison["measure"], "niterations" )
+        self.assertEqual( comparison["blue"], 1 )
+        self.assertEqual( comparison["saved"], comparison["plain"] - 1 )
+        self.assertTrue( comparison["saved"] > 0 )
+        return
+
+
+class lsqAverageOptionsTest( unittest.TestCase ):
+
+    def test_multiplicative( self ):
+        la= lsqAverage( "testOptions.txt" )
+        la.runSolver()
+        solver= la.getSolver()
+        self.assertTrue( solver.hasConverged() )
+        val, error= la.getAveragesAndErrors()
+        self.assertTrue( 165.0 < val[0] < 175.0 )
+        return
+
+    def test_blueStartMultiplicative( self ):
+        la= lsqAverage( "testOptions.txt", lbluestart=True )
+        la.runSolver()
+        self.assertTrue( la.getSolver().hasConverged() )
+        val, error= la.getAveragesAndErrors()
+        reference= lsqAverage( "testOptions.txt" )
+        reference.runSolver()
+        expectedval, expectederror= reference.getAveragesAndErrors()
+        self.assertAlmostEqual( val[0], expectedval[0], places=5 )
+        self.assertAlmostEqual( error[0], expectederror[0], places=5 )
+        return
+
+    def test_fastLinearFallback( self ):
+        la= lsqAverage( "testOptions.txt" )
+        self.assertFalse( hasattr( la.getSolver(), "getWeightsMatrix" ) )
+        la.runSolver()
+        val, error= la.getAveragesAndErrors()
+        reference= lsqAverage( "testOptions.txt" )
+        reference.runSolver()
+        expectedval, expectederror= reference.getAveragesAndErrors()
+        self.assertAlmostEqual( val[0], expectedval[0] )
+        self.assertAlmostEqual( error[0], expectederror[0] )
+        return
+
+    def test_minosErrorsMultiplicative( self ):
+        la= lsqAverage( "testOptions.txt" )
+        la.runSolver()
+        val, error= la.getAveragesAndErrors()
+        chisq= la.calcChisq()
+        eminus, eplus= la.calcMinosErrors()[0]
+        self.assertTrue( eminus < 0.0 < eplus )
+        self.assertNotAlmostEqual( -eminus, eplus, places=4 )
+        self.assertAlmostEqual( -eminus, error[0], delta=0.01*error[0] )
+        solver= la.getSolver()
+        solver.fixPar( 0, val[0] + eplus )
+        solver.solve()
+        self.assertAlmostEqual( solver.getChisq() - chisq, 1.0, places=4 )
+        return
+
+
+if __name__ == '__main__':
+    suite1= unittest.TestLoader().loadTestsFromTestCase( lsqAverageTest )
+    suite2= unittest.TestLoader().loadTestsFromTestCase( lsqAverageOptionsTest )
+    unittest.TextTestRunner( verbosity=2 ).run( suite1 )
+    unittest.TextTestRunner( verbosity=2 ).run( suite2 )
+
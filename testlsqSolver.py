@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+# unit tests for numpy least squares solver
+
+import unittest
+
+from numpy import array
+
+import lsqSolver
+
+
+class lsqSolverTest( unittest.TestCase ):
+
+    def setUp( self ):
+
+        mtop= array( [ 171.5, 173.1, 174.5 ] )
+        stat= array( [   0.3,   0.33,  0.4 ] )
+        errs= array( [ [ 1.1, 0.9, 2.4 ],
+                       [ 1.3, 1.5, 3.1 ],
+                       [ 1.5, 1.9, 3.5 ] ] )
+
+        def resfun( par ):
+            terms= ( mtop - par[0] + errs.dot( par[1:] ) )/stat
+            return array( list( terms ) + list( par[1:] ) )
+
+        def jacfun( par ):
+            jacobian= array( 6*[ 4*[ 0.0 ] ] )
+            jacobian[:3,0]= -1.0/stat
+            jacobian[:3,1:]= errs/stat[:,None]
+            for ipar in range( 3 ):
+                jacobian[3+ipar,1+ipar]= 1.0
+            return jacobian
+
+        pars= [ 172.0, 0.0, 0.0, 0.0 ]
+        parerrors= [ 2.0, 1.0, 1.0, 1.0 ]
+        parnames= [ "average", "pa", "pb", "pc" ]
+        ndof= 2
+
+        self.__solver= lsqSolver.lsqSolver( resfun, jacfun, pars, parerrors,
+                                            parnames, ndof )
+
+        return
+
+    def test_solve( self ):
+        self.__solver.solve()
+        self.assertTrue( self.__solver.hasConverged() )
+        self.assertTrue( self.__solver.getNiterations() < 10 )
+        return
+
+    def test_getChisq( self ):
+        self.__solver.solve()
+        chisq= self.__solver.getChisq()
+        expectedchisq= 3.58037721
+        self.assertAlmostEqual( chisq, expectedchisq )
+        return
+
+    def test_getNdof( self ):
+        ndof= self.__solver.getNdof()
+        expectedNdof= 2
+        self.assertEqual( ndof, expectedNdof )
+        return
+
+    def test_getPar( self ):
+        self.__solver.solve()
+        pars= self.__solver.getPars()
+        expectedpars= [ 167.1022776, -0.48923998, -1.13417736, 
+                        -1.21202615 ]
+        for par, expectedpar in zip( pars, expectedpars ):
+            self.assertAlmostEqual( par, expectedpar, places=6 )
+        return
+
+    def test_getParErrors( self ):
+        self.__solver.solve()
+        parerrors= self.__solver.getParErrors()
+        expectedparerrors= [ 1.4395944, 0.96551507, 0.78581713, 0.72292831 ]
+        for parerror, expectedparerror in zip( parerrors, expectedparerrors ):
+            self.assertAlmostEqual( parerror, expectedparerror, places=6 )
+        return
+
+    def test_getCorrelationmatrix( self ):
+        self.__solver.solve()
+        corrm= self.__solver.getCorrelationmatrix()
+        for ipar in range( 4 ):
+            self.assertAlmostEqual( corrm[ipar,ipar], 1.0 )
+        return
+
+
+if __name__ == '__main__':
+    suite= unittest.TestLoader().loadTestsFromTestCase( lsqSolverTest )
+    unittest.TextTestRunner( verbosity=2 ).run( suite )
+
@@ -11,7 +11,7 @@ from minuitAverage import minuitAverage
 class minuitAverageTest( unittest.TestCase ):
 
     def setUp( self ):
-        self.__ma= minuitAverage( "test.txt" )
+        self.__ma= minuitAverage( "test.txt", lfastlinear=False )
         self.__ma.runSolver()
         return
 
@@ -41,8 +41,84 @@ class minuitAverageTest( unittest.TestCase ):
             self.assertAlmostEqual( weight, expectedWeight )
         return
 
+    def test_checkGradient( self ):
+        solver= self.__ma.getSolver()
+        self.assertTrue( solver.checkGradient() < 1.0e-6 )
+        return
+
+    def test_checkGradientMultiplicative( self ):
+        ma= minuitAverage( "testOptions.txt" )
+        solver= ma.getSolver()
+        pars= solver.getPars()
+        pars[1:]= [ 0.5, -0.3, 0.8 ]
+        solver.setStartValues( pars )
+        self.assertTrue( solver.checkGradient() < 1.0e-6 )
+        return
+
+    def test_gradientOptions( self ):
+        for options in [ { "lgradient": False }, { "lgradcheck": True } ]:
+            ma= minuitAverage( "test.txt", lfastlinear=False, **options )
+            ma.runSolver()
+            val, error= ma.getAveragesAndErrors()
+            self.assertAlmostEqual( val[0], 170.709196921, places=5 )
+            self.assertAlmostEqual( error[0], 2.9668615985, places=5 )
+        return
+
+    def test_solveCache( self ):
+        self.__ma.calcWeightsMatrix()
+        stats= self.__ma.getSolveStats()
+        self.assertEqual( stats["solves"], 7 )
+        self.assertEqual( stats["warmstarts"], 6 )
+        weightsMatrix= self.__ma.calcWeightsMatrix()
+        stats= self.__ma.getSolveStats()
+        self.assertEqual( stats["solves"], 7 )
+        self.assertEqual( stats["cachehits"], 6 )
+        expectedWeights= [ 1.33903066, -0.16163493, -0.17739573 ]
+        for weight, expectedWeight in zip( weightsMatrix.flat, expectedWeights ):
+            self.assertAlmostEqual( weight, expectedWeight )
+        return
+
+    def test_solveHistory( self ):
+        record= self.__ma.getSolveHistory()[-1]
+        self.assertEqual( record["status"], 3 )
+        self.assertTrue( record["nfcn"] > 0 )
+        self.assertTrue( record["nevaluations"] >= record["nfcn"] )
+        return
+
+    def test_minosErrors( self ):
+        minoserrors= self.__ma.calcMinosErrors()
+        eminus, eplus= minoserrors[0]
+        self.assertAlmostEqual( eminus, -2.9668615985, places=4 )
+        self.assertAlmostEqual( eplus, 2.9668615985, places=4 )
+        return
+
+    def test_profileScan( self ):
+        values, chisqs= self.__ma.profileScan( 0, [ 167.742335, 170.709197,
+                                                    173.676059 ] )
+        self.assertAlmostEqual( chisqs[0] - chisqs[1], 1.0, places=4 )
+        self.assertAlmostEqual( chisqs[2] - chisqs[1], 1.0, places=4 )
+        return
+
+
+class minuitAverageReuseTest( unittest.TestCase ):
+
+    def test_reuse( self ):
+        averages= [ minuitAverage( filename, lreuse=True )
+                    for filename in [ "test.txt", "test.txt", "valassi5.txt" ] ]
+        for average in averages:
+            average.runSolver()
+        val, error= averages[0].getAveragesAndErrors()
+        self.assertAlmostEqual( val[0], 170.709196921 )
+        self.assertAlmostEqual( error[0], 2.9668615985 )
+        val, error= averages[2].getAveragesAndErrors()
+        self.assertAlmostEqual( val[0], 10.6377, places=4 )
+        self.assertAlmostEqual( val[1], 11.1358, places=4 )
+        return
+
 
 if __name__ == '__main__':
-    suite= unittest.TestLoader().loadTestsFromTestCase( minuitAverageTest )
-    unittest.TextTestRunner( verbosity=2 ).run( suite )
+    suite1= unittest.TestLoader().loadTestsFromTestCase( minuitAverageTest )
+    suite2= unittest.TestLoader().loadTestsFromTestCase( minuitAverageReuseTest )
+    unittest.TextTestRunner( verbosity=2 ).run( suite1 )
+    unittest.TextTestRunner( verbosity=2 ).run( suite2 )
 
@@ -83,8 +83,141 @@ class minuitSolverTest( unittest.TestCase ):
             self.assertAlmostEqual( parerror, expectedparerror, places=6 )
         return
 
+    def test_setStartValues( self ):
+        self.__solver.solve()
+        pars= self.__solver.getPars()
+        parerrors= self.__solver.getParErrors()
+        self.__solver.setStartValues( pars, parerrors )
+        self.__solver.solve()
+        expectedchisq= 3.58037721
+        self.assertAlmostEqual( self.__solver.getChisq(), expectedchisq )
+        self.assertRaises( minuitSolver.MinuitError, 
+                           self.__solver.setStartValues, pars[1:] )
+        return
+
+    def test_snapshot( self ):
+        self.__solver.solve()
+        snapshot= self.__solver._minuitSolver__snapshot
+        self.assertTrue( snapshot is not None )
+        pars= self.__solver.getPars()
+        pars[0]= 0.0
+        self.assertEqual( self.__solver.getPars()[0], snapshot["pars"][0] )
+        covm= self.__solver.getCovariancematrix()
+        corrm= self.__solver.getCorrelationmatrix()
+        parerrors= self.__solver.getParErrors()
+        for ipar in range( 4 ):
+            self.assertAlmostEqual( covm[ipar,ipar], parerrors[ipar]**2, 
+                                    places=4 )
+            self.assertAlmostEqual( corrm[ipar,ipar], 1.0 )
+        self.__solver.minuitCommand( "SET PRI -1" )
+        self.assertTrue( self.__solver._minuitSolver__snapshot is None )
+        return
+
+    def test_fixPar( self ):
+        self.__solver.fixPar( 0, 167.1022776 )
+        self.__solver.solve()
+        self.assertAlmostEqual( self.__solver.getPars()[0], 167.1022776 )
+        self.assertAlmostEqual( self.__solver.getChisq(), 3.58037721 )
+        self.__solver.releasePar( 0 )
+        self.__solver.solve()
+        self.assertAlmostEqual( self.__solver.getChisq(), 3.58037721 )
+        return
+
+    # Fixed parameters have zero rows and columns in the covariance
+    # matrix, the free parameters keep their errors:
+    def test_fixParCovariance( self ):
+        self.__solver.fixPar( 1, 0.0 )
+        self.__solver.solve()
+        covm= self.__solver.getCovariancematrix()
+        parerrors= self.__solver.getParErrors()
+        self.assertEqual( covm.shape, ( 4, 4 ) )
+        for ipar in range( 4 ):
+            self.assertEqual( covm[1,ipar], 0.0 )
+            self.assertEqual( covm[ipar,1], 0.0 )
+        for ipar in [ 0, 2, 3 ]:
+            self.assertAlmostEqual( covm[ipar,ipar], parerrors[ipar]**2, 
+                                    places=4 )
+        self.assertAlmostEqual( self.__solver.getCorrelationmatrix()[0,0], 1.0 )
+        return
+
+    def test_getMinosErrors( self ):
+        self.__solver.solve()
+        eminus, eplus= self.__solver.getMinosErrors( 0 )
+        self.assertAlmostEqual( eminus, -1.4395944, places=4 )
+        self.assertAlmostEqual( eplus, 1.4395944, places=4 )
+        return
+
+    def test_estimateCost( self ):
+        hcost= self.__solver.estimateCost()
+        self.assertEqual( hcost["npar"], 4 )
+        self.assertEqual( hcost["ncallsgradient"], 8 )
+        self.assertTrue( hcost["ncalls"] > 0 )
+        return
+
+
+class minuitSolverReuseTest( unittest.TestCase ):
+
+    def __makeSolver( self, values ):
+        def fcn( n, grad, fval, par, iflag ):
+            fval[0]= sum( [ ( par[i] - values[i] )**2 for i in range( 3 ) ] )
+            return
+        return minuitSolver.minuitSolver( fcn, 3*[ 0.0 ], 3*[ 1.0 ], 
+                                          [ "a", "b", "c" ], 1, lreuse=True )
+
+    def tearDown( self ):
+        minuitSolver.minuitSolver.clearPool()
+        return
+
+    def test_solve( self ):
+        solver1= self.__makeSolver( [ 1.0, 2.0, 3.0 ] )
+        solver2= self.__makeSolver( [ -1.0, -2.0, -3.0 ] )
+        self.assertTrue( solver1._minuitSolver__minuit is 
+                         solver2._minuitSolver__minuit )
+        solver1.solve()
+        solver2.solve()
+        for par, expectedpar in zip( solver1.getPars(), [ 1.0, 2.0, 3.0 ] ):
+            self.assertAlmostEqual( par, expectedpar, places=4 )
+        solver1.solve()
+        for par, expectedpar in zip( solver1.getPars(), [ 1.0, 2.0, 3.0 ] ):
+            self.assertAlmostEqual( par, expectedpar, places=4 )
+        for par, expectedpar in zip( solver2.getPars(), [ -1.0, -2.0, -3.0 ] ):
+            self.assertAlmostEqual( par, expectedpar, places=4 )
+        return
+
+    def test_reset( self ):
+        solver= self.__makeSolver( [ 1.0, 2.0, 3.0 ] )
+        solver.setStartValues( [ 5.0, 5.0, 5.0 ] )
+        solver.solve()
+        solver.reset()
+        self.assertEqual( solver.getPars(), [ 0.0, 0.0, 0.0 ] )
+        return
+
+
+class minuitSolverManyParametersTest( unittest.TestCase ):
+
+    def test_solve( self ):
+        npar= 60
+        def fcn( n, grad, fval, par, iflag ):
+            fval[0]= sum( [ ( par[i] - float(i) )**2 for i in range( npar ) ] )
+            return
+        pars= npar*[ 0.0 ]
+        parerrors= npar*[ 1.0 ]
+        parnames= [ "p"+str(i) for i in range( npar ) ]
+        solver= minuitSolver.minuitSolver( fcn, pars, parerrors, parnames, 1 )
+        solver.solve()
+        for i, par in enumerate( solver.getPars() ):
+            self.assertAlmostEqual( par, float(i), places=4 )
+        self.assertRaises( minuitSolver.MinuitError, minuitSolver.minuitSolver,
+                           fcn, pars, parerrors, parnames, 1, 50 )
+        return
+
 
 if __name__ == '__main__':
-    suite= unittest.TestLoader().loadTestsFromTestCase( minuitSolverTest )
-    unittest.TextTestRunner( verbosity=2 ).run( suite )
+    suite1= unittest.TestLoader().loadTestsFromTestCase( minuitSolverTest )
+    suite2= unittest.TestLoader().loadTestsFromTestCase( minuitSolverReuseTest )
+    suite3= unittest.TestLoader().loadTestsFromTestCase( 
+        minuitSolverManyParametersTest )
+    unittest.TextTestRunner( verbosity=2 ).run( suite1 )
+    unittest.TextTestRunner( verbosity=2 ).run( suite2 )
+    unittest.TextTestRunner( verbosity=2 ).run( suite3 )
 
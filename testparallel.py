@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+
+# unit tests for parallel evaluation in worker processes
+
+import unittest
+
+from parallel import parallelMap, splitContiguous
+
+
+class parallelTest( unittest.TestCase ):
+
+    def test_parallelMap( self ):
+        offset= 10
+        def function( arg ):
+            return arg**2 + offset
+        results= parallelMap( function, range( 5 ), nprocs=2 )
+        self.assertEqual( results, [ 10, 11, 14, 19, 26 ] )
+        return
+
+    def test_serial( self ):
+        results= parallelMap( abs, [ -1, -2 ], nprocs=1 )
+        self.assertEqual( results, [ 1, 2 ] )
+        self.assertEqual( parallelMap( abs, [], nprocs=4 ), [] )
+        return
+
+    def test_splitContiguous( self ):
+        chunks= splitContiguous( range( 7 ), 3 )
+        self.assertEqual( chunks, [ [ 0, 1, 2 ], [ 3, 4 ], [ 5, 6 ] ] )
+        self.assertEqual( splitContiguous( range( 2 ), 4 ), [ [ 0 ], [ 1 ] ] )
+        return
+
+
+if __name__ == '__main__':
+    suite= unittest.TestLoader().loadTestsFromTestCase( parallelTest )
+    unittest.TextTestRunner( verbosity=2 ).run( suite )
+
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+# unit tests for the result cache
+
+import unittest
+
+import os
+import time
+import shutil
+import tempfile
+
+from resultCache import ResultCache, getLibraryVersion, getLibraryModules
+import batchAverage
+
+
+class resultCacheTest( unittest.TestCase ):
+
+    def setUp( self ):
+        self.__directory= tempfile.mkdtemp()
+        self.__cache= ResultCache( self.__directory )
+        return
+
+    def tearDown( self ):
+        shutil.rmtree( self.__directory )
+        return
+
+    def test_makeKey( self ):
+        cache= self.__cache
+        key= cache.makeKey( "test.txt", "blue", { "llognormal": False } )
+        self.assertEqual( len( key ), 64 )
+        self.assertEqual( key, cache.makeKey( "test.txt", "blue", 
+                                              { "llognormal": False } ) )
+        self.assertNotEqual( key, cache.makeKey( "test.txt", "blue", 
+                                                 { "llognormal": True } ) )
+        self.assertNotEqual( key, cache.makeKey( "test.txt", "lsq", 
+                                                 { "llognormal": False } ) )
+        self.assertNotEqual( key, cache.makeKey( "valassi1.txt", "blue", 
+                                                 { "llognormal": False } ) )
+        self.assertEqual( len( getLibraryVersion() ), 64 )
+        return
+
+    def test_getLibraryModules( self ):
+        modules= getLibraryModules()
+        for modulename in [ "AverageDataParser.py", "blue.py", 
+                            "clsqAverage.py", "linearSolver.py",
+                            "decomposition.py", "downdates.py", 
+                            "impacts.py", "parallel.py" ]:
+            self.assertTrue( modulename in modules )
+        for modulename in modules:
+            self.assertFalse( modulename.startswith( "test" ) )
+        return
+
+    def test_getPut( self ):
+        cache= self.__cache
+        self.assertEqual( cache.get( "abc" ), None )
+        cache.put( "abc", { "averages": [ 1.0 ] } )
+        self.assertEqual( cache.get( "abc" ), { "averages": [ 1.0 ] } )
+        self.assertEqual( cache.getStats()["hits"], 1 )
+        self.assertEqual( cache.getStats()["misses"], 1 )
+        self.assertEqual( [ filename for filename in os.listdir( self.__directory )
+                            if filename.endswith( ".tmp" ) ], [] )
+        cache.clear()
+        self.assertEqual( cache.get( "abc" ), None )
+        return
+
+    def test_evict( self ):
+        results= { "values": 10*[ 1.0 ] }
+        for key in [ "a", "b", "c" ]:
+            self.__cache.put( key, results )
+            os.utime( os.path.join( self.__directory, key + ".json" ),
+                      ( time.time(), time.time() - 100 + ord( key ) ) )
+        self.__cache.get( "a" )
+        size= self.__cache.getSize()/3
+        cache= ResultCache( self.__directory, maxbytes=int( 2.5*size ) )
+        cache.put( "d", results )
+        self.assertEqual( cache.getStats()["evictions"], 2 )
+        self.assertEqual( cache.get( "b" ), None )
+        self.assertEqual( cache.get( "c" ), None )
+        self.assertEqual( cache.get( "a" ), results )
+        self.assertEqual( cache.get( "d" ), results )
+        return
+
+    def test_batch( self ):
+        record1= batchAverage.averageFile( "test.txt", "lsq", 
+                                           cachedir=self.__directory )
+        record2= batchAverage.averageFile( "test.txt", "lsq", 
+                                           cachedir=self.__directory )
+        self.assertFalse( record1["cached"] )
+        self.assertTrue( record2["cached"] )
+        self.assertEqual( record1["averages"], record2["averages"] )
+        self.assertEqual( record1["weights"], record2["weights"] )
+        return
+
+
+if __name__ == '__main__':
+    suite= unittest.TestLoader().loadTestsFromTestCase( resultCacheTest )
+    unittest.TextTestRunner( verbosity=2 ).run( suite )
+